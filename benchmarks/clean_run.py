@@ -0,0 +1,87 @@
+"""
+clean run benchmark
+
+Time to run a module from a clean state:
+- in a new kernel process (what restarting the kernel costs: start of the
+  interpreter, imports of the module, run)
+- in a process forked from the zygote, which already imported the
+  dependencies of the module (zygote.Zygote, the "c" key)
+
+The module only imports heavy modules and prints a line.
+numpy and pandas are added to the imports when they are installed.
+
+usage (from the repository root):
+    python3 benchmarks/clean_run.py [--runs 10] [--imports asyncio,json,...]
+"""
+
+import argparse
+import ast
+import importlib.util
+import os
+import statistics
+import tempfile
+import time
+
+import corpus  # untext sources in sys.path
+from untext import kernel, zygote
+
+
+DEFAULT_IMPORTS = [
+    "asyncio", "decimal", "email.mime.multipart", "http.server",
+    "json", "logging.handlers", "unittest", "xml.dom.minidom",
+]
+
+
+def quiet(run, stream, text):
+    pass
+
+
+def timed_run(process, *args):
+    start = time.perf_counter()
+    run = process.run(*args)
+    run.finished.wait()
+    assert not run.failed
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="number of runs of each kind")
+    parser.add_argument("--imports", help="comma-separated modules imported by the module")
+    args = parser.parse_args()
+
+    if args.imports:
+        imports = args.imports.split(",")
+    else:
+        imports = DEFAULT_IMPORTS + [name for name in ["numpy", "pandas"] if importlib.util.find_spec(name)]
+    source = "".join([f"import {name}\n" for name in imports]) + "print('done')\n"
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "module.py")
+        code = compile(source, filename, "exec")
+        dependencies = zygote.dependencies(ast.parse(source), directory)
+        print(f"imports: {', '.join(dependencies)}")
+
+        fresh = []
+        for i in range(args.runs):
+            start = time.perf_counter()
+            process = kernel.Kernel(directory, on_output=quiet)
+            process.start()
+            timed_run(process, "module", filename, code)
+            fresh.append(time.perf_counter() - start)
+            process.stop()
+
+        process = zygote.Zygote(directory, on_output=quiet)
+        start = time.perf_counter()
+        process.start()
+        first = timed_run(process, "module", filename, code, dependencies) + time.perf_counter() - start
+        forked = [timed_run(process, "module", filename, code, dependencies) for i in range(args.runs)]
+        process.stop()
+
+    print(f"new kernel process:      {statistics.median(fresh) * 1000:8.1f} ms (median of {args.runs})")
+    print(f"zygote, first run:       {first * 1000:8.1f} ms (start and imports)")
+    print(f"zygote, next clean runs: {statistics.median(forked) * 1000:8.1f} ms (median of {args.runs})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+benchmark corpus
+
+A fixed set of python files to render:
+- the standard library modules supported by the static renderer
+- the untext sources
+- synthetic files (large, deeply nested, long expressions)
+
+Files the renderer does not support are skipped, so the corpus grows with
+the renderer. Compare results file by file (see render.py --compare).
+"""
+
+import ast
+import os
+import sys
+import sysconfig
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+# run against the untext source tree, not an installed untext
+sys.path.insert(0, SRC_DIR)
+
+from untext.rendering import mapping
+from untext.rendering.static import html, statement
+
+
+def render_html(tree: ast.Module) -> str:
+    "render a module with the static renderer (in a new registry, like a new window)"
+    return html.render(statement.render_module(tree), mapping.Registry())
+
+
+"""
+file sources
+"""
+
+def stdlib_sources():
+    stdlib = sysconfig.get_paths()["stdlib"]
+    for root, dirs, files in os.walk(stdlib):
+        dirs[:] = sorted(d for d in dirs if d not in ("test", "tests", "idle_test", "site-packages"))
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                yield "stdlib/" + os.path.relpath(path, stdlib), path
+
+
+def untext_sources():
+    root = os.path.join(SRC_DIR, "untext")
+    for dirpath, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(dirpath, name)
+                yield "untext/" + os.path.relpath(path, root), path
+
+
+def synthetic_large(functions=1000) -> str:
+    "many medium-sized functions, like a big generated module"
+    parts = ["import os\nfrom . import helpers\n"]
+    for i in range(functions):
+        parts.append(f'''
+def function_{i}(a, b=1, *args, flag=None):
+    total = a + b * {i}
+    for x in args:
+        if x == {i}:
+            total = total + helpers.compute(x, key="k{i}")
+        elif x > total:
+            total = total - x
+        else:
+            return [y for y in range(x) if y != a]
+    while total > 100:
+        total = total - {i + 1}
+    data = {{"name": f"item {{a}}", "values": [a, b, total]}}
+    assert total is not None
+    return data["values"][1:2]
+''')
+    return "".join(parts)
+
+
+def synthetic_deep(depth=60) -> str:
+    "deeply nested blocks"
+    lines = ["def nested(x):"]
+    for i in range(depth):
+        lines.append("    " * (i + 1) + f"if x > {i}:")
+    lines.append("    " * (depth + 1) + "return x")
+    lines.append("    return None")
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_long_expressions(count=100, length=50) -> str:
+    "long binary operation chains and calls (deep expression trees)"
+    lines = []
+    for i in range(count):
+        operands = " + ".join(f"v{j}" for j in range(length))
+        lines.append(f"result_{i} = f({operands}, g(a.b.c[{i}]))")
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_sources():
+    yield "synthetic/large.py", synthetic_large()
+    yield "synthetic/deep.py", synthetic_deep()
+    yield "synthetic/long_expressions.py", synthetic_long_expressions()
+
+
+def load_corpus(stdlib=True, untext=True, synthetic=True):
+    "return [(name, source)] for every file of the corpus that the renderer supports"
+    sources = []
+    files = []
+    if stdlib:
+        files.extend(stdlib_sources())
+    if untext:
+        files.extend(untext_sources())
+    for name, path in files:
+        with open(path, encoding="utf-8") as f:
+            sources.append((name, f.read()))
+    if synthetic:
+        sources.extend(synthetic_sources())
+
+    corpus = []
+    for name, source in sources:
+        try:
+            render_html(ast.parse(source))
+        except (NotImplementedError, ValueError, AssertionError, TypeError, SyntaxError, RecursionError):
+            continue
+        corpus.append((name, source))
+    return corpus
@@ -0,0 +1,109 @@
+"""
+renderer dispatch micro-benchmark
+
+Measures the cost of finding the renderer of a node, for every statement
+and expression of a (large) python file:
+- before: a chain of type(node) == ... comparisons, in the order used by
+  the renderers before the dispatch table (generated below)
+- after: a Dispatcher.lookup() in the static renderer tables
+
+usage (from the repository root):
+    python3 benchmarks/dispatch.py [file.py] [--repeat N]
+
+The default file is the largest module of the standard library.
+"""
+
+import argparse
+import ast
+import os
+import sys
+import sysconfig
+import time
+
+# run against the untext source tree, not an installed untext
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from untext.rendering.static import statement, expression
+
+
+# order of the type(node) == ... chains, as they were written in the renderers
+STATEMENT_CHAIN = [
+    "FunctionDef", "AsyncFunctionDef", "ClassDef", "Return", "Delete",
+    "Assign", "AugAssign", "AnnAssign", "For", "AsyncFor", "While", "If",
+    "With", "AsyncWith", "Match", "Raise", "Try", "TryStar", "Assert",
+    "Import", "ImportFrom", "Global", "Nonlocal", "Expr", "Pass", "Break",
+    "Continue",
+]
+EXPRESSION_CHAIN = [
+    "BoolOp", "NamedExpr", "BinOp", "UnaryOp", "Lambda", "IfExp", "Dict",
+    "Set", "ListComp", "SetComp", "DictComp", "GeneratorExp", "Await",
+    "Yield", "YieldFrom", "Compare", "Call", "FormattedValue", "JoinedStr",
+    "Constant", "Attribute", "Subscript", "Starred", "Name", "List", "Tuple",
+    "Slice",
+]
+
+
+def make_chain(name, node_types, table):
+    "generate an unrolled if/elif chain returning the renderer of a node"
+    lines = [f"def {name}(node):"]
+    for i, node_type in enumerate(node_types):
+        keyword = "if" if i == 0 else "elif"
+        lines.append(f"    {keyword} type(node) == ast.{node_type}:")
+        lines.append(f"        return table.get(ast.{node_type})")
+    lines.append("    else:")
+    lines.append("        raise ValueError(type(node))")
+    namespace = {"ast": ast, "table": table}
+    exec("\n".join(lines), namespace)
+    return namespace[name]
+
+
+def largest_stdlib_module():
+    stdlib = sysconfig.get_paths()["stdlib"]
+    paths = [os.path.join(stdlib, f) for f in os.listdir(stdlib) if f.endswith(".py")]
+    return max(paths, key=os.path.getsize)
+
+
+def measure(dispatch, nodes, repeat):
+    "return the best time per node (in ns) over `repeat` runs"
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for node in nodes:
+            dispatch(node)
+        elapsed = time.perf_counter_ns() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?", default=None)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = args.file or largest_stdlib_module()
+    with open(path) as f:
+        tree = ast.parse(f.read())
+
+    cases = [
+        ("statement", STATEMENT_CHAIN, statement.renderers),
+        ("expression", EXPRESSION_CHAIN, expression.renderers),
+    ]
+    print(f"{path}")
+    print(f"{'kind':>10} {'nodes':>8} {'chain (ns)':>11} {'table (ns)':>11} {'speedup':>8}")
+    for name, chain_types, dispatcher in cases:
+        # only nodes with a renderer are measured
+        # (both versions raise on the others)
+        nodes = [n for n in ast.walk(tree)
+                 if isinstance(n, dispatcher.base) and type(n) in dispatcher]
+        if not nodes:
+            continue
+        chain = make_chain(f"{name}_chain", chain_types, dispatcher.renderers)
+        before = measure(chain, nodes, args.repeat)
+        after = measure(dispatcher.lookup, nodes, args.repeat)
+        print(f"{name:>10} {len(nodes):>8} {before:>11.1f} {after:>11.1f} {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+DOM operation batching benchmark
+
+Renders a ~2000 line module with the dynamic renderer, and counts the
+evaluate_js calls (bridge round trips) it makes:
+- one call per DOM operation, like pywebview elements did before the
+  operation queue (Batch with limit=1)
+- batched operations (rendering/dynamic/dom.py): one call per frame of
+  rendering, or every BATCH_LIMIT operations
+
+The window is replaced by a counter (no pywebview needed): the times are
+the python side of the rendering (renderers, JSON encoding), and the
+estimated time adds --latency milliseconds per bridge call.
+
+usage (from the repository root):
+    python3 benchmarks/dom_ops.py [--lines 2000] [--latency 0.5] [--runs 5]
+"""
+
+import argparse
+import ast
+import statistics
+import time
+
+import corpus  # untext sources in sys.path
+from untext.rendering import mapping
+from untext.rendering.dynamic import dom, statement
+
+
+def synthetic_module(lines: int) -> str:
+    "functions using the statements and expressions of the dynamic renderer"
+    parts = ["import os\nfrom . import helpers\n"]
+    i = 0
+    while sum(part.count("\n") for part in parts) < lines:
+        parts.append(f'''
+def function_{i}(a, b):
+    total = a + b * {i}
+    for x in helpers.values(a):
+        if x == {i}:
+            total = total + helpers.compute(x, "k{i}")
+        elif x > total:
+            total -= x
+        else:
+            return [y for y in range(x)]
+    while total > 100:
+        total = total - {i + 1}
+    data = {{"name": f"item {{a}}", "values": [a, b, total]}}
+    assert total is not None
+    return data["values"][1:2]
+''')
+        i += 1
+    return "".join(parts)
+
+
+class Bridge:
+    def __init__(self):
+        self.calls = 0
+        self.size = 0
+
+    def evaluate_js(self, js: str):
+        self.calls += 1
+        self.size += len(js)
+
+
+def render(tree: ast.Module, limit: int) -> tuple:
+    "return (seconds, bridge)"
+    bridge = Bridge()
+    start = time.perf_counter()
+    with dom.Batch(bridge.evaluate_js, limit=limit) as batch, mapping.use(mapping.Registry()):
+        statement.render_module(batch.root("body"), tree)
+    return time.perf_counter() - start, bridge
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2000, help="size of the rendered module")
+    parser.add_argument("--latency", type=float, default=0.5, help="milliseconds per bridge call, for the estimated time")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    source = synthetic_module(args.lines)
+    tree = ast.parse(source)
+    print(f"{source.count(chr(10))} lines, {sum(1 for node in ast.walk(tree))} nodes")
+    print(f"{'mode':<12} {'bridge calls':>12} {'JS (KB)':>9} {'python (ms)':>12} {'estimated (ms)':>15}")
+    for mode, limit in [("per op", 1), ("batched", dom.BATCH_LIMIT)]:
+        times = []
+        for run in range(args.runs):
+            seconds, bridge = render(tree, limit)
+            times.append(seconds)
+        python_ms = statistics.median(times) * 1000
+        estimated = python_ms + bridge.calls * args.latency
+        print(f"{mode:<12} {bridge.calls:>12} {bridge.size / 1024:>9.0f} {python_ms:>12.1f} {estimated:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+structural hash benchmark
+
+For every file of the corpus, compares the two ways of finding the
+top-level statements that did not change between two versions of a file
+(the same file parsed twice):
+- dumping the statements of both versions with ast.dump(), like before
+- computing the structural hashes of both trees (see untext/hashes.py)
+The hashes are computed for every node, so finding the unchanged functions
+or methods (hotswap.py) or nested statements (rendering/static/diff.py)
+needs no more work.
+
+usage (from the repository root):
+    python3 benchmarks/hashes.py [--no-stdlib]
+"""
+
+import argparse
+import ast
+import time
+
+import corpus
+from untext import hashes
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def dumps(tree: ast.Module) -> list:
+    return [ast.dump(stmt) for stmt in tree.body]
+
+
+def digests(tree: ast.Module) -> list:
+    known = hashes.compute(tree)
+    return [known[stmt] for stmt in tree.body]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--no-stdlib", action="store_true", help="skip standard library modules")
+    args = parser.parse_args()
+
+    files = 0
+    nodes = 0
+    dump_time = 0
+    hash_time = 0
+    for name, source in corpus.load_corpus(stdlib=not args.no_stdlib):
+        old = ast.parse(source)
+        new = ast.parse(source)
+        files += 1
+        nodes += sum(1 for node in ast.walk(new))
+        old_dumps, seconds = timed(dumps, old)
+        new_dumps, more = timed(dumps, new)
+        dump_time += seconds + more
+        old_digests, seconds = timed(digests, old)
+        new_digests, more = timed(digests, new)
+        hash_time += seconds + more
+        assert old_dumps == new_dumps and old_digests == new_digests
+    print(f"{files} files, {nodes} nodes")
+    print(f"statement dumps: {dump_time:.2f}s, structural hashes: {hash_time:.2f}s ({nodes * 2 / hash_time:.0f} nodes/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+node table benchmark
+
+Builds the NodeTable (see untext/nodetable.py) of every file of the corpus,
+and compares its memory with the memory of the parsed AST.
+
+usage (from the repository root):
+    python3 benchmarks/node_table.py [--no-stdlib]
+"""
+
+import argparse
+import ast
+import time
+import tracemalloc
+
+import corpus
+from untext.nodetable import NodeTable
+
+
+def traced(function, *args):
+    "return the result of function(*args) and the memory it allocated"
+    tracemalloc.start()
+    result = function(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--no-stdlib", action="store_true", help="skip standard library modules")
+    args = parser.parse_args()
+
+    nodes = 0
+    build_time = 0
+    tree_memory = 0
+    table_memory = 0
+    for name, source in corpus.load_corpus(stdlib=not args.no_stdlib):
+        tree, memory = traced(ast.parse, source)
+        tree_memory += memory
+        start = time.perf_counter()
+        table = NodeTable(tree)
+        build_time += time.perf_counter() - start
+        nodes += len(table)
+        # the columns only (the node list references the existing tree)
+        table, memory = traced(NodeTable, tree)
+        table_memory += memory - len(table.nodes) * 8
+
+    print(f"{nodes} nodes, built in {build_time:.3f} s ({nodes / build_time:,.0f} nodes/s)")
+    print(f"AST:        {tree_memory / nodes:.0f} bytes/node")
+    print(f"node table: {table_memory / nodes:.0f} bytes/node")
+
+
+if __name__ == "__main__":
+    main()
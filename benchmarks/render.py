@@ -0,0 +1,166 @@
+"""
+static renderer benchmark
+
+Renders every file of the corpus (see corpus.py) and reports:
+- rendering speed, in AST nodes per second
+- size of the html output
+- peak memory during a rendering (tracemalloc)
+- per-file latency percentiles
+
+usage (from the repository root):
+    python3 benchmarks/render.py [--repeat N] [--json results.json]
+    python3 benchmarks/render.py --compare before.json after.json
+
+Results saved with --json can be compared across commits with --compare.
+"""
+
+import argparse
+import ast
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import corpus
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, round(p / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def git_commit():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                            capture_output=True, text=True, cwd=corpus.SRC_DIR)
+    return result.stdout.strip() or None
+
+
+def bench_file(source, repeat):
+    tree = ast.parse(source)
+    nodes = sum(1 for _ in ast.walk(tree))
+
+    # latency: best of `repeat` renderings (gc disabled, like timeit)
+    times = []
+    gc.disable()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        html = corpus.render_html(tree)
+        times.append(time.perf_counter() - start)
+    gc.enable()
+
+    # memory, in a separate rendering (tracemalloc slows everything down)
+    tracemalloc.start()
+    corpus.render_html(tree)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "nodes": nodes,
+        "html_bytes": len(html.encode()),
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "peak_memory": peak,
+    }
+
+
+def summarize(files):
+    seconds = [f["seconds"] for f in files.values()]
+    total_seconds = sum(seconds)
+    total_nodes = sum(f["nodes"] for f in files.values())
+    return {
+        "files": len(files),
+        "nodes": total_nodes,
+        "html_bytes": sum(f["html_bytes"] for f in files.values()),
+        "seconds": total_seconds,
+        "nodes_per_second": total_nodes / total_seconds if total_seconds else 0,
+        "latency_p50": percentile(seconds, 50),
+        "latency_p90": percentile(seconds, 90),
+        "latency_p99": percentile(seconds, 99),
+        "latency_max": max(seconds),
+        "peak_memory_max": max(f["peak_memory"] for f in files.values()),
+    }
+
+
+def print_summary(summary):
+    print(f"files:          {summary['files']}")
+    print(f"nodes:          {summary['nodes']}")
+    print(f"html:           {summary['html_bytes'] / 1e6:.2f} MB")
+    print(f"total time:     {summary['seconds']:.3f} s")
+    print(f"speed:          {summary['nodes_per_second']:,.0f} nodes/s")
+    print(f"latency p50:    {summary['latency_p50'] * 1000:.2f} ms")
+    print(f"latency p90:    {summary['latency_p90'] * 1000:.2f} ms")
+    print(f"latency p99:    {summary['latency_p99'] * 1000:.2f} ms")
+    print(f"latency max:    {summary['latency_max'] * 1000:.2f} ms")
+    print(f"peak memory:    {summary['peak_memory_max'] / 1e6:.2f} MB (largest file)")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    # only files rendered in both runs are comparable
+    common = sorted(set(before["files"]) & set(after["files"]))
+    if not common:
+        print("no file in common")
+        return
+    before_files = {name: before["files"][name] for name in common}
+    after_files = {name: after["files"][name] for name in common}
+    b, a = summarize(before_files), summarize(after_files)
+    print(f"{len(common)} files in common ({before.get('commit')} -> {after.get('commit')})")
+    for key in ["seconds", "nodes_per_second", "html_bytes", "latency_p50",
+                "latency_p90", "latency_p99", "latency_max", "peak_memory_max"]:
+        change = (a[key] - b[key]) / b[key] * 100 if b[key] else 0
+        print(f"{key:<18} {b[key]:>14.6g} {a[key]:>14.6g} {change:>+8.1f}%")
+    slowest = sorted(common, key=lambda n: after_files[n]["seconds"] / before_files[n]["seconds"])
+    print("largest per-file changes:")
+    for name in slowest[:3] + slowest[-3:]:
+        ratio = after_files[name]["seconds"] / before_files[name]["seconds"]
+        print(f"  {ratio:6.2f}x {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="renderings per file")
+    parser.add_argument("--json", help="save the results to a json file")
+    parser.add_argument("--no-stdlib", action="store_true", help="skip standard library modules")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two json results")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # deep trees are rendered with recursive generators
+    sys.setrecursionlimit(10000)
+    print("loading corpus...", file=sys.stderr)
+    files = corpus.load_corpus(stdlib=not args.no_stdlib)
+
+    results = {}
+    for i, (name, source) in enumerate(files):
+        print(f"[{i + 1}/{len(files)}] {name}", file=sys.stderr)
+        results[name] = bench_file(source, args.repeat)
+
+    summary = summarize(results)
+    print_summary(summary)
+
+    if args.json:
+        output = {
+            "commit": git_commit(),
+            "python": sys.version,
+            "implementation": platform.python_implementation(),
+            "repeat": args.repeat,
+            "summary": summary,
+            "files": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
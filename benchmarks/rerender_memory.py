@@ -0,0 +1,82 @@
+"""
+memory check for repeated re-renderings
+
+Re-renders a large module after an edit, like CodeWindow.rerender(),
+many times: memory must stay flat, since each re-rendering starts a new
+registry and releases the previous tree with its registry.
+
+Exits with status 1 if memory grows by more than --tolerance between the
+first iterations and the last one. Memory is counted in allocated python
+objects (sys.getallocatedblocks(), tracemalloc is too slow for 1000
+re-renderings of a large module). tests/test_rerender_memory.py runs the
+same check with tracemalloc, on a small module.
+
+usage (from the repository root):
+    python3 benchmarks/rerender_memory.py [--iterations 1000] [--functions 200]
+"""
+
+import argparse
+import ast
+import gc
+import sys
+import time
+
+import corpus
+from untext.rendering import mapping
+from untext.rendering.static import html, statement, diff
+
+
+# the source of the module, with an edited function
+def edit(source: str, iteration: int, functions: int) -> str:
+    i = iteration % functions
+    return source.replace(f"total = a + b * {i}\n", f"total = a + b * {i} + {iteration}\n", 1)
+
+
+def used_memory() -> int:
+    gc.collect()
+    return sys.getallocatedblocks()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000, help="number of re-renderings")
+    parser.add_argument("--functions", type=int, default=50, help="size of the module (in functions)")
+    parser.add_argument("--lazy", action="store_true", help="render function bodies as placeholders")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed memory growth (ratio)")
+    args = parser.parse_args()
+
+    source = corpus.synthetic_large(args.functions)
+    start = time.perf_counter()
+
+    # open the file
+    registry = mapping.Registry()
+    tree = ast.parse(source)
+    with html.render_settings(lazy_bodies=args.lazy):
+        html.render(statement.render_module(tree), registry)
+
+    baseline = None
+    for iteration in range(args.iterations):
+        new_tree = ast.parse(edit(source, iteration, args.functions))
+        with html.render_settings(lazy_bodies=args.lazy):
+            registry, patch = diff.patch(registry, tree, new_tree)
+        tree = new_tree
+        del patch, new_tree
+        # the first iterations warm up caches (ast, html tags,...)
+        if iteration == 10:
+            baseline = used_memory()
+            baseline_nodes = len(registry)
+        if iteration % 100 == 99:
+            print(f"{iteration + 1} re-renderings: {used_memory()} blocks, {len(registry)} registered nodes", file=sys.stderr)
+
+    final = used_memory()
+    growth = (final - baseline) / baseline
+    print(f"{args.iterations} re-renderings in {time.perf_counter() - start:.1f} s")
+    print(f"memory: {baseline} blocks after 10 re-renderings, {final} blocks at the end ({growth * 100:+.1f}%)")
+    print(f"registered nodes: {baseline_nodes} -> {len(registry)}")
+    if growth > args.tolerance or len(registry) != baseline_nodes:
+        print("memory is not bounded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
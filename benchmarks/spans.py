@@ -0,0 +1,75 @@
+"""
+source span index benchmark
+
+On the large synthetic module of the corpus, compares:
+- the source of nodes: ast.get_source_segment() vs LineTable.segment()
+- the nodes at a line: a walk over the node table vs SpanIndex.at()
+(both checked to give the same results), and the build time of the index.
+
+usage (from the repository root):
+    python3 benchmarks/spans.py [--functions 1000] [--queries 1000]
+"""
+
+import argparse
+import ast
+import random
+import time
+
+import corpus
+from untext.nodetable import NodeTable
+from untext.spans import LineTable, SpanIndex
+
+
+def positioned(table: NodeTable, row: int) -> bool:
+    return table.lineno[row] != -1 and table.end_lineno[row] != -1
+
+
+def scan(table: NodeTable, lines: LineTable, lineno: int) -> list:
+    "rows at the start of a line, without the index"
+    offset = lines.offset(lineno, 0)
+    return sorted(
+        row for row in range(len(table))
+        if positioned(table, row)
+        and lines.offset(table.lineno[row], table.col_offset[row]) <= offset
+        and offset < lines.offset(table.end_lineno[row], table.end_col_offset[row])
+    )
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=1000, help="size of the synthetic module")
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    source = corpus.synthetic_large(args.functions)
+    tree = ast.parse(source)
+    table = NodeTable(tree)
+    lines, lines_time = timed(LineTable, source)
+    index, index_time = timed(SpanIndex, table, lines)
+    print(f"{len(lines)} lines, {len(table)} nodes")
+    print(f"build: line table {lines_time * 1000:.1f}ms, span index {index_time * 1000:.1f}ms")
+
+    random.seed(0)
+    rows = random.sample([row for row in range(len(table)) if positioned(table, row)], args.queries)
+    # the slow versions only run a part of the queries
+    scans = max(1, args.queries // 100)
+    segments, segment_time = timed(lambda: [ast.get_source_segment(source, table.nodes[row]) for row in rows[:scans]])
+    sliced, slice_time = timed(lambda: [lines.segment(*table.span(row)) for row in rows])
+    assert segments == sliced[:scans]
+    print(f"source of a node: get_source_segment {segment_time / scans * 1e6:.0f}us, line table {slice_time / args.queries * 1e6:.1f}us")
+
+    queries = [random.randrange(1, len(lines)) for query in range(args.queries)]
+    scanned, scan_time = timed(lambda: [scan(table, lines, lineno) for lineno in queries[:scans]])
+    found, index_time = timed(lambda: [sorted(index.at(lineno, 0)) for lineno in queries])
+    assert scanned == found[:scans]
+    print(f"nodes at a line: scan {scan_time / scans * 1e6:.0f}us, span index {index_time / args.queries * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
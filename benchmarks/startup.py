@@ -0,0 +1,70 @@
+"""
+startup benchmark
+
+Time to parse and render the files opened at startup, one after the other
+(like before) or in a process pool (prerender.render_parallel(), which
+prerender.render_files() only uses for big enough projects),
+for a growing number of files taken from the corpus.
+
+The render cache is disabled (a new empty cache directory for each run).
+
+usage (from the repository root):
+    python3 benchmarks/startup.py [--max-files 64] [--workers N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import corpus
+from untext import prerender
+
+
+def write_files(directory, files):
+    paths = []
+    for i, (name, source) in enumerate(files):
+        path = os.path.join(directory, f"file_{i}.py")
+        with open(path, "w") as f:
+            f.write(source)
+        paths.append(path)
+    return paths
+
+
+def timed(function, *args, **kwargs):
+    # empty render cache
+    os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp()
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def sequential(paths, lazy):
+    return [prerender.render_file(path, lazy) for path in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-files", type=int, default=64, help="largest number of files")
+    parser.add_argument("--workers", type=int, help="size of the process pool (default: number of cpus)")
+    parser.add_argument("--lazy", action="store_true", help="render function bodies as placeholders")
+    args = parser.parse_args()
+
+    # files of a few hundred lines, like the files of a project
+    files = [(name, source) for name, source in corpus.load_corpus(synthetic=False)
+             if 5000 < len(source) < 50000]
+    print(f"{os.cpu_count()} cpus, {len(files)} files")
+    print(f"{'files':>6} {'sequential':>12} {'parallel':>12} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        n = 1
+        while n <= args.max_files:
+            paths = write_files(directory, [files[i % len(files)] for i in range(n)])
+            seq = timed(sequential, paths, args.lazy)
+            workers = min(args.workers or os.cpu_count(), n)
+            par = timed(prerender.render_parallel, paths, args.lazy, workers)
+            print(f"{n:>6} {seq:>11.3f}s {par:>11.3f}s {seq / par:>7.2f}x")
+            n *= 2
+
+
+if __name__ == "__main__":
+    main()
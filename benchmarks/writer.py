@@ -0,0 +1,81 @@
+"""
+html backends benchmark
+
+Static renderers return html fragments, which can be turned into html by:
+- html.write(), an iterative writer appending to a shared buffer
+- html.generate(), a recursive generator (one frame per nesting level)
+
+Checks that both backends produce the same html for every file of the corpus
+(exit status 1 otherwise), then compares their speed. Both render the same
+fragment trees: the html itself is checked against the renderer they
+replaced by tests/test_writer.py (golden files).
+
+usage (from the repository root):
+    python3 benchmarks/writer.py [--repeat N] [--no-stdlib]
+"""
+
+import argparse
+import ast
+import sys
+import time
+
+import corpus
+from untext.rendering import mapping
+from untext.rendering.static import html, statement
+
+
+def render_with(backend, tree):
+    # new registries: same ids for both backends
+    fragment = statement.render_module(tree)
+    if backend == "write":
+        return html.render(fragment, mapping.Registry())
+    return "".join(html.generate(fragment, mapping.Registry()))
+
+
+def best_time(backend, tree, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render_with(backend, tree)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="renderings per file and backend")
+    parser.add_argument("--no-stdlib", action="store_true", help="skip standard library modules")
+    args = parser.parse_args()
+
+    # deep trees are rendered with recursive generators
+    sys.setrecursionlimit(10000)
+    files = corpus.load_corpus(stdlib=not args.no_stdlib)
+
+    mismatches = []
+    totals = {"generate": 0, "write": 0}
+    rows = []
+    for name, source in files:
+        tree = ast.parse(source)
+        # parity
+        if render_with("generate", tree) != render_with("write", tree):
+            mismatches.append(name)
+        # speed
+        times = {backend: best_time(backend, tree, args.repeat) for backend in totals}
+        for backend, seconds in times.items():
+            totals[backend] += seconds
+        rows.append((times["generate"] / times["write"], name, times))
+
+    print(f"{len(files)} files, {len(mismatches)} mismatches")
+    for name in mismatches:
+        print(f"  different html: {name}")
+    print(f"generate: {totals['generate']:.3f} s")
+    print(f"write:    {totals['write']:.3f} s ({totals['generate'] / totals['write']:.2f}x faster)")
+    print("largest speedups:")
+    for speedup, name, times in sorted(rows, key=lambda row: row[0], reverse=True)[:5]:
+        print(f"  {speedup:6.2f}x {name} ({times['generate'] * 1000:.1f} -> {times['write'] * 1000:.1f} ms)")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
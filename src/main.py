@@ -11,10 +11,15 @@ main entrypoint when built with pyinstaller
 import webview
 import webview
 import code
+import multiprocessing
 import untext.rendering.dynamic
 import untext.rendering.static
 
 
 from untext.main import main
 
+# files are rendered in child processes (see untext/prerender.py),
+# and modules run in a kernel process (see untext/kernel.py),
+# which run this script again in frozen builds
+multiprocessing.freeze_support()
 main()
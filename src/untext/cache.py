@@ -0,0 +1,272 @@
+"""
+persistent render and code caches
+
+The html of every top-level statement of a file is stored on disk, along
+with the ids of the rendered AST nodes, so that reopening an unchanged file
+skips both ast.parse() and the rendering.
+
+Entries are keyed by the hash of the source code, the python version
+(the AST can change between versions) and the untext version.
+The cache is size-bounded: the least recently used entries are removed
+when it grows over CACHE_SIZE.
+
+Compiled modules are cached as well (see the code cache below).
+
+location: $XDG_CACHE_HOME/untext (~/.cache/untext by default)
+"""
+
+import ast
+import functools
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import re
+import sys
+import types
+from importlib import metadata
+
+from untext.rendering import mapping
+
+
+CACHE_SIZE = 256 * 1024 * 1024
+CODE_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def cache_dir(name: str) -> str:
+    root = os.environ.get("XDG_CACHE_HOME")
+    if not root:
+        root = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(root, "untext", name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@functools.cache
+def untext_version() -> str:
+    # pip installs
+    for dist in metadata.distributions(name="untext"):
+        return dist.version
+    # source tree or bundled app: the renderer code is the version
+    # (editing the renderers invalidates the cache)
+    rendering_dir = os.path.dirname(mapping.__file__)
+    sources = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(rendering_dir)):
+        for name in sorted(files):
+            if name.endswith(".py") or name.endswith(".so") or name.endswith(".pyd"):
+                with open(os.path.join(root, name), "rb") as f:
+                    sources.update(f.read())
+    return "src-" + sources.hexdigest()[:16]
+
+
+def key(source: str, lazy: bool) -> str:
+    h = hashlib.sha256()
+    h.update(sys.version.encode())
+    h.update(untext_version().encode())
+    # lazy renderings contain placeholders instead of function bodies
+    h.update(b"lazy" if lazy else b"full")
+    h.update(source.encode())
+    return h.hexdigest()
+
+
+"""
+cache entries
+
+{
+  "chunks": [html of each top-level statement],
+  "node_ids": [id of each node in ast.walk() order, 0 if not rendered],
+  "toplevel_ids": [id of the wrapper div of each top-level statement],
+  "first_id": lowest id in the html,
+  "last_id": highest id in the html,
+}
+"""
+
+def make_entry(tree: ast.Module, chunks: list, registry: mapping.Registry) -> dict:
+    node_ids = [registry.ids.get(node, 0) for node in ast.walk(tree)]
+    toplevel_ids = [registry.toplevel_ids[stmt] for stmt in tree.body]
+    ids = [i for i in node_ids + toplevel_ids if i]
+    return {
+        "chunks": chunks,
+        "node_ids": node_ids,
+        "toplevel_ids": toplevel_ids,
+        "first_id": min(ids) if ids else 0,
+        "last_id": max(ids) if ids else 0,
+    }
+
+
+def load(entry_key: str, registry: mapping.Registry) -> dict | None:
+    path = entry_path("render", f"{entry_key}.json")
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+        # mark the entry as recently used
+        os.utime(path)
+        return rebase(entry, registry)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError):
+        # unreadable, truncated or corrupt entry: a miss
+        discard(path)
+        return None
+
+
+def store(entry_key: str, entry: dict):
+    write("render", f"{entry_key}.json", json.dumps(entry).encode(), CACHE_SIZE)
+
+
+"""
+cache files
+
+The cache never keeps a file from opening: a cache directory that cannot
+be created (read-only home, bad XDG_CACHE_HOME,...) is a miss, and entries
+that cannot be written (full disk,...) are not stored. The errors are
+reported on stderr.
+"""
+
+# path of an entry, None if the cache directory is not available
+def entry_path(name: str, filename: str) -> str | None:
+    try:
+        directory = cache_dir(name)
+    except OSError as error:
+        report(error)
+        return None
+    return os.path.join(directory, filename)
+
+
+def write(name: str, filename: str, data: bytes, max_size: int):
+    path = entry_path(name, filename)
+    if path is None:
+        return
+    # write and rename, to never leave a partial entry behind
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        evict(os.path.dirname(path), max_size)
+    except OSError as error:
+        report(error)
+        discard(tmp_path)
+
+
+def report(error: OSError):
+    print(f"untext cache: {error}", file=sys.stderr)
+
+
+# remove the least recently used entries until the cache fits in CACHE_SIZE
+def evict(directory: str, max_size=CACHE_SIZE):
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        # entries being written by store()
+        if entry.name.endswith(".tmp"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            # removed by another window
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= max_size:
+            return
+        discard(path)
+        total -= size
+
+
+# (already removed by another window, or not removable: ignored)
+def discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+"""
+node ids
+
+Ids are unique in a window, but the ids of a cached entry come from the
+registry that rendered it. They are moved to a block of unused ids.
+"""
+
+ID_PATTERN = re.compile(r"(id='|data-node=')(\d+)'")
+
+def rebase(entry: dict, registry: mapping.Registry) -> dict:
+    if not entry["first_id"]:
+        return entry
+    first = registry.reserve(entry["last_id"] - entry["first_id"] + 1)
+    shift = first - entry["first_id"]
+    if shift == 0:
+        return entry
+
+    def shift_id(match):
+        return f"{match.group(1)}{int(match.group(2)) + shift}'"
+
+    entry["chunks"] = [ID_PATTERN.sub(shift_id, chunk) for chunk in entry["chunks"]]
+    entry["node_ids"] = [i + shift if i else 0 for i in entry["node_ids"]]
+    entry["toplevel_ids"] = [i + shift for i in entry["toplevel_ids"]]
+    entry["first_id"] += shift
+    entry["last_id"] += shift
+    return entry
+
+
+# link a freshly parsed tree to the DOM of a cached entry
+def restore_ids(tree: ast.Module, entry: dict, registry: mapping.Registry):
+    for node, node_id in zip(ast.walk(tree), entry["node_ids"]):
+        if node_id:
+            registry.add(node, node_id)
+    for stmt, toplevel_id in zip(tree.body, entry["toplevel_ids"]):
+        registry.toplevel_ids[stmt] = toplevel_id
+
+
+"""
+code cache
+
+Code objects of compiled modules (the "r" key of a CodeWindow), stored
+with marshal like .pyc files.
+
+Entries are keyed by the interpreter bytecode version (MAGIC_NUMBER),
+the optimization level, the compile flags, the file path (stored in the
+code objects for tracebacks) and the source the tree was parsed from: hashing the source
+is much faster than dumping the AST (which is slower than compiling it),
+and it includes the positions stored in the code objects.
+"""
+
+def code_key(source: str, filename: str, flags=0) -> str:
+    h = hashlib.sha256()
+    h.update(importlib.util.MAGIC_NUMBER)
+    h.update(str(sys.flags.optimize).encode())
+    h.update(str(flags).encode())
+    h.update(filename.encode())
+    h.update(b"\0")
+    h.update(source.encode())
+    return h.hexdigest()
+
+
+def load_code(entry_key: str):
+    path = entry_path("code", f"{entry_key}.bin")
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            code = marshal.load(f)
+        if not isinstance(code, types.CodeType):
+            raise TypeError(f"not a code object: {type(code)}")
+        # mark the entry as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, TypeError):
+        # unreadable, truncated or corrupt entry: a miss (like load())
+        discard(path)
+        return None
+    return code
+
+
+def store_code(entry_key: str, code):
+    write("code", f"{entry_key}.bin", marshal.dumps(code), CODE_CACHE_SIZE)
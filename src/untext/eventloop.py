@@ -0,0 +1,63 @@
+"""
+asyncio integration
+
+Each project has a persistent asyncio loop, running in its own thread
+(see Project.loop), where the coroutines of the modules are scheduled:
+tasks and servers started by a run keep running after it, without
+blocking the windows, and the next runs share the same loop.
+
+Modules are compiled with COMPILE_FLAGS, which allows top-level await:
+the code of a module with top-level await statements is a coroutine code
+(see is_coroutine()), which eval() turns into a coroutine object instead of
+running it. The same goes for the lines of the REPL.
+"""
+
+import ast
+import asyncio
+import concurrent.futures
+import inspect
+import sys
+import threading
+import traceback
+
+
+COMPILE_FLAGS = ast.PyCF_ALLOW_TOP_LEVEL_AWAIT
+
+
+def is_coroutine(code) -> bool:
+    "return True if the code has top-level await statements"
+    return bool(code.co_flags & inspect.CO_COROUTINE)
+
+
+class EventLoop:
+    def __init__(self, name="asyncio loop"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True, name=name)
+        self.thread.start()
+
+    # schedule a coroutine from another thread
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    # the pending tasks are dropped
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+# done callback of scheduled modules, nobody waits for them
+def report(future: concurrent.futures.Future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        traceback.print_exception(error, file=sys.stderr)
+
+
+# run code in a namespace, and wait for it if it is a coroutine code
+# return the exception raised by the coroutine (None if there is none)
+# (errors of plain code are raised by eval())
+def run(loop: EventLoop, code, namespace: dict):
+    result = eval(code, namespace)
+    if not is_coroutine(code):
+        return None
+    return loop.submit(result).exception()
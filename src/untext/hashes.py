@@ -0,0 +1,84 @@
+"""
+structural hashes
+
+Every node of a parsed tree gets a hash of its structure (a Merkle hash):
+its type, its scalar fields (names, constants, operators,...) and the hashes
+of its children, computed bottom-up in one pass over the tree (see
+compute()). Positions are ignored, like in ast.dump(): two subtrees have
+the same hash when they have the same dump, in any file or version of a
+file, and comparing two subtrees is then O(1) instead of dumping both.
+
+The hashes of a window tree are computed once per version of the file (see
+CodeWindow.node_hashes), and used to find what did not change between two
+versions: the statements kept by a DOM patch (rendering/static/diff.py), the
+statements not run again (reactive.py), the functions not hot-swapped
+(hotswap.py).
+
+The hashes are 16 byte blake2b digests: they do not depend on the process
+(unlike hash()), and can be stored.
+"""
+
+import ast
+import hashlib
+
+# the fields of a node are encoded with a tag, and a size or a fixed size
+# (digests): the encodings of two different nodes cannot be the same
+NONE = b"-"
+
+
+# {node: digest} for the nodes of tree
+# (nodes are hashed by identity, like in mapping.Registry)
+def compute(tree: ast.AST) -> dict:
+    # pre-order: the descendants of a node come after it,
+    # and before it once reversed
+    order = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        for name in node._fields:
+            value = getattr(node, name, None)
+            if isinstance(value, ast.AST):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend([item for item in value if isinstance(item, ast.AST)])
+    order.reverse()
+    known = {}
+    for node in order:
+        # contexts (Load, Store,...) are shared by the nodes of a tree
+        if node not in known:
+            known[node] = digest(node, known)
+    return known
+
+
+# hash of a node, from the hashes of its children
+def digest(node: ast.AST, known: dict) -> bytes:
+    parts = [type(node).__name__.encode(), b":"]
+    for name in node._fields:
+        value = getattr(node, name, None)
+        # (most fields)
+        if isinstance(value, ast.AST):
+            parts.append(b"n")
+            parts.append(known[value])
+        else:
+            parts.append(field(value, known))
+    return hashlib.blake2b(b"".join(parts), digest_size=16).digest()
+
+
+def field(value, known: dict) -> bytes:
+    if isinstance(value, ast.AST):
+        return b"n" + known[value]
+    if isinstance(value, list):
+        items = [field(item, known) for item in value]
+        return f"l{len(items)}:".encode() + b"".join(items)
+    # missing names, defaults, else branches,...
+    if value is None:
+        return NONE
+    # the type separates 1, 1.0, True and "1"
+    text = repr(value).encode("utf-8", "surrogatepass")
+    return f"s{type(value).__name__}:{len(text)}:".encode() + text
+
+
+# hash of a single subtree
+def of(node: ast.AST) -> bytes:
+    return compute(node)[node]
@@ -0,0 +1,161 @@
+"""
+hot-swap reload
+
+Updates the functions of a running module in place, instead of running the
+whole module again: the code (and default values) of the changed functions
+and methods is replaced on the existing function objects, so that the
+top-level code does not run again, and threads, callbacks and instances
+holding the functions use the new code.
+
+Only top-level functions and the methods of top-level classes are swapped.
+Other changes (new classes, top-level statements, closures with different
+free variables,...) need a full run, and are listed in the report.
+
+The code objects come from the compiled module (see CodeWindow.code):
+functions cannot be compiled alone, since methods need the __class__ cell
+of their class for super().
+"""
+
+import ast
+import inspect
+import types
+
+from untext import hashes
+
+
+class Report:
+    def __init__(self):
+        # qualified names
+        self.swapped = []
+        self.added = []
+        # (qualified name, reason)
+        self.skipped = []
+
+    def __str__(self):
+        lines = [f"swapped: {', '.join(self.swapped) or '-'}"]
+        if self.added:
+            lines.append(f"added: {', '.join(self.added)}")
+        for name, reason in self.skipped:
+            lines.append(f"not swapped: {name} ({reason})")
+        return "\n".join(lines)
+
+
+# top-level functions and methods of top-level classes
+# {qualified name: (FunctionDef, ClassDef or None)}
+def definitions(tree: ast.Module) -> dict:
+    found = {}
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            found[stmt.name] = (stmt, None)
+        elif isinstance(stmt, ast.ClassDef):
+            for item in stmt.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    found[f"{stmt.name}.{item.name}"] = (item, stmt)
+    return found
+
+
+# the code of a definition is a constant of the code of its parent,
+# with the line of its first decorator
+def find_code(parent: types.CodeType, node: ast.FunctionDef | ast.ClassDef):
+    if node.decorator_list:
+        lineno = node.decorator_list[0].lineno
+    else:
+        lineno = node.lineno
+    for const in parent.co_consts:
+        if isinstance(const, types.CodeType) and const.co_name == node.name and const.co_firstlineno == lineno:
+            return const
+    return None
+
+
+# function object of a definition in the running module
+def live_function(namespace: dict, node: ast.FunctionDef, class_node: ast.ClassDef | None):
+    if class_node is None:
+        obj = namespace.get(node.name)
+    else:
+        owner = namespace.get(class_node.name)
+        if not inspect.isclass(owner):
+            return None
+        obj = owner.__dict__.get(node.name)
+    # staticmethod and classmethod
+    obj = getattr(obj, "__func__", obj)
+    # functools.wraps() decorators
+    obj = inspect.unwrap(obj)
+    if not isinstance(obj, types.FunctionType) or obj.__code__.co_name != node.name:
+        return None
+    return obj
+
+
+def same_defaults(old: ast.FunctionDef, new: ast.FunctionDef, old_hashes: dict, new_hashes: dict) -> bool:
+    old_defaults = [old_hashes[d] for d in old.args.defaults + old.args.kw_defaults if d is not None]
+    new_defaults = [new_hashes[d] for d in new.args.defaults + new.args.kw_defaults if d is not None]
+    return old_defaults == new_defaults
+
+
+# evaluate the default values of a definition (in its class namespace for methods)
+# return (__defaults__, __kwdefaults__)
+def evaluate_defaults(node: ast.FunctionDef, namespace: dict, class_namespace: dict | None, filename: str):
+    args = node.args
+    kw_names = [arg.arg for arg, default in zip(args.kwonlyargs, args.kw_defaults) if default is not None]
+    kw_values = [default for default in args.kw_defaults if default is not None]
+    values = ast.copy_location(ast.Tuple([*args.defaults, *kw_values], ast.Load()), node)
+    expression = ast.fix_missing_locations(ast.Expression(values))
+    values = eval(compile(expression, filename, "eval"), namespace, class_namespace)
+    n = len(args.defaults)
+    defaults = tuple(values[:n]) or None
+    kwdefaults = dict(zip(kw_names, values[n:])) or None
+    return defaults, kwdefaults
+
+
+# swap the functions that changed between old_tree (the running version)
+# and new_tree (compiled to code)
+# the structural hashes of the trees are computed if they are not given
+def swap(namespace: dict, old_tree: ast.Module, new_tree: ast.Module, code: types.CodeType, old_hashes=None, new_hashes=None) -> Report:
+    if old_hashes is None:
+        old_hashes = hashes.compute(old_tree)
+    if new_hashes is None:
+        new_hashes = hashes.compute(new_tree)
+    report = Report()
+    old = definitions(old_tree)
+    for name, (node, class_node) in definitions(new_tree).items():
+        old_node, old_class = old.get(name, (None, None))
+        # the hashes ignore positions: moved functions are swapped
+        # as well, for the line numbers of tracebacks
+        if old_node is not None and old_hashes[old_node] == new_hashes[node] and old_node.lineno == node.lineno:
+            continue
+
+        parent = code
+        if class_node is not None:
+            parent = find_code(code, class_node)
+        new_code = None
+        if parent is not None:
+            new_code = find_code(parent, node)
+        if new_code is None:
+            report.skipped.append((name, "code not found"))
+            continue
+
+        function = live_function(namespace, node, class_node)
+        if function is None:
+            # new plain functions can be defined without running the module
+            if old_node is None and class_node is None and not node.decorator_list and not new_code.co_freevars:
+                defaults, kwdefaults = evaluate_defaults(node, namespace, None, code.co_filename)
+                function = types.FunctionType(new_code, namespace, node.name, defaults)
+                function.__kwdefaults__ = kwdefaults
+                namespace[node.name] = function
+                report.added.append(name)
+            else:
+                report.skipped.append((name, "not found in the running module"))
+            continue
+        # the closure of a function object cannot change
+        if new_code.co_freevars != function.__code__.co_freevars:
+            report.skipped.append((name, "different free variables"))
+            continue
+
+        function.__code__ = new_code
+        # keep the default values (and their identity) when they did not change
+        if old_node is None or not same_defaults(old_node, node, old_hashes, new_hashes):
+            class_namespace = None
+            if class_node is not None:
+                class_namespace = dict(namespace[class_node.name].__dict__)
+            function.__defaults__, function.__kwdefaults__ = evaluate_defaults(node, namespace, class_namespace, code.co_filename)
+        report.swapped.append(name)
+    return report
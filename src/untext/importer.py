@@ -0,0 +1,91 @@
+"""
+project imports
+
+The modules of the project that are open in a window are imported from
+their window (see ProjectFinder, installed in sys.meta_path by Project),
+instead of the file on disk:
+- the code is the code object of the window (see CodeWindow.code): an
+  open file is not parsed or compiled again when another module imports it
+- the source is the source of the window, even if it was not saved yet
+- the module is the module of the window: a window run after the import
+  runs in the imported module, and an import after a run gets the module
+  of the run from sys.modules, like before
+
+The other modules (closed files, the standard library, installed packages)
+are found by the next finders of sys.meta_path, on disk.
+A package is imported from the window of its __init__.py file. Namespace
+packages (directories without __init__.py) have no window: they are still
+created by the path finder, and their open modules are imported from here.
+
+Modules with top-level await (see eventloop.py) cannot be imported, like
+in python: they only run from their window.
+"""
+
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import sys
+
+from untext import eventloop
+
+
+# "package.module" for package/module.py, "package" for package/__init__.py
+def import_name(path_parts: list) -> str:
+    if len(path_parts) > 1 and path_parts[-1] == "__init__":
+        return ".".join(path_parts[:-1])
+    return ".".join(path_parts)
+
+
+# spec of the module of a window, with __file__, __path__ (for packages),...
+def spec(window) -> importlib.machinery.ModuleSpec:
+    return importlib.util.spec_from_file_location(window.module_name, window.filepath, loader=WindowLoader(window))
+
+
+def new_module(window):
+    return importlib.util.module_from_spec(spec(window))
+
+
+class ProjectFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, project):
+        self.project = project
+
+    def find_spec(self, fullname: str, path, target=None):
+        window = self.project.modules.get(fullname)
+        if window is None:
+            return None
+        return spec(window)
+
+
+class WindowLoader(importlib.abc.InspectLoader):
+    def __init__(self, window):
+        self.window = window
+
+    def is_package(self, fullname: str) -> bool:
+        return self.window.is_package
+
+    def get_source(self, fullname: str) -> str:
+        return self.window.source
+
+    def get_code(self, fullname: str):
+        return self.window.code
+
+    def exec_module(self, module):
+        code = self.window.code
+        if eventloop.is_coroutine(code):
+            raise ImportError(f"cannot import {module.__name__}: it awaits at the top level", name=module.__name__)
+        self.window.module = module
+        self.window.loaded = True
+        exec(code, module.__dict__)
+
+
+# the finder of the last project replaces the previous one
+# it comes before the path finder: open files take precedence over the
+# files on disk, but not over the builtin modules
+def install(project):
+    for finder in list(sys.meta_path):
+        if isinstance(finder, ProjectFinder):
+            sys.meta_path.remove(finder)
+    index = len(sys.meta_path)
+    if importlib.machinery.PathFinder in sys.meta_path:
+        index = sys.meta_path.index(importlib.machinery.PathFinder)
+    sys.meta_path.insert(index, ProjectFinder(project))
@@ -0,0 +1,311 @@
+"""
+execution kernel
+
+Runs the modules of a project in another process, so that a slow or hung
+module does not freeze the IDE (the webview APIs run user code in their
+own threads otherwise).
+
+The kernel is a child process of the IDE, connected with a pipe:
+- the IDE sends marshalled code objects (see CodeWindow.code)
+- the kernel runs them in its own modules, which stay in memory between
+  runs (like modules run in the IDE process with "r"), and the modules
+  with top-level await in its own asyncio loop (see eventloop.py)
+- the output of the kernel (stdout and stderr) is sent back while the code
+  runs, along with the end of each run
+
+A kernel can be restarted (or killed) without closing the windows.
+It only uses the standard library.
+
+messages (tuples):
+IDE -> kernel: ("run", run id, module name, file path, marshalled code)
+kernel -> IDE: ("started", run id, pid of the process running it)
+               ("output", run id, "stdout" or "stderr", text)
+               ("done", run id, True if the run raised an exception)
+
+Runs are cancelled (see runs.py) with a KeyboardInterrupt (SIGINT), which
+keeps the modules of the kernel. The kernel is restarted if the run does
+not stop after KILL_DELAY seconds.
+"""
+
+import code
+import contextlib
+import functools
+import io
+import marshal
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import traceback
+from types import ModuleType
+
+from untext import eventloop, runs
+
+
+# seconds given to an interrupted run before the kernel is restarted
+KILL_DELAY = 1.0
+
+
+"""
+kernel process
+"""
+
+# sys.stdout and sys.stderr of the kernel
+class Output(io.TextIOBase):
+    def __init__(self, connection, name: str, lock: threading.Lock):
+        self.connection = connection
+        self.name = name
+        # user threads can print at the same time
+        self.lock = lock
+        # run of the code writing (the last one for threads started by a previous run)
+        self.run_id = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            self.connection.send(("output", self.run_id, self.name, text))
+        return len(text)
+
+
+# runs code in a module namespace, and prints tracebacks instead of raising
+class Runner(code.InteractiveInterpreter):
+    def __init__(self, module: ModuleType):
+        super().__init__(locals=module.__dict__)
+        self.failed = False
+
+    def showtraceback(self):
+        self.failed = True
+        super().showtraceback()
+
+    def showsyntaxerror(self, filename=None):
+        self.failed = True
+        super().showsyntaxerror(filename)
+
+    # modules with top-level await run in the loop of the process
+    def runcode(self, code):
+        if not eventloop.is_coroutine(code):
+            return super().runcode(code)
+        error = eventloop.run(process_loop(), code, self.locals)
+        if error is not None:
+            self.failed = True
+            traceback.print_exception(error)
+
+
+# asyncio loop of the process, started by the first module with top-level await
+# (the tasks started by a run keep running between runs)
+@functools.cache
+def process_loop() -> eventloop.EventLoop:
+    return eventloop.EventLoop()
+
+
+# main loop of the kernel process
+def serve(connection, project_path: str):
+    lock = setup(connection, project_path)
+    # the IDE closed the pipe: stop
+    with contextlib.suppress(EOFError, OSError):
+        while True:
+            message = connection.recv()
+            if message[0] == "run":
+                run(connection, lock, *message[1:])
+
+
+# environment of the modules, sent output included
+# return the lock of the connection
+def setup(connection, project_path: str) -> threading.Lock:
+    # imports of the project modules that are not run from a window
+    sys.path.insert(0, project_path)
+    os.chdir(project_path)
+    lock = threading.Lock()
+    sys.stdout = Output(connection, "stdout", lock)
+    sys.stderr = Output(connection, "stderr", lock)
+    sys.stdin = open(os.devnull)
+    # SIGINT only interrupts runs (see run())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    return lock
+
+
+def run(connection, lock: threading.Lock, run_id: int, module_name: str, filename: str, marshalled: bytes):
+    with lock:
+        connection.send(("started", run_id, os.getpid()))
+    failed = True
+    try:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        failed = execute(run_id, module_name, filename, marshalled)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    except KeyboardInterrupt:
+        # interrupted just before or after the module code:
+        # the run is cancelled, not the kernel
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with lock:
+        connection.send(("done", run_id, failed))
+
+
+# run code in a module (kept in sys.modules)
+# return True if the code raised an exception
+def execute(run_id: int, module_name: str, filename: str, marshalled: bytes) -> bool:
+    sys.stdout.run_id = run_id
+    sys.stderr.run_id = run_id
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = ModuleType(module_name)
+        module.__file__ = filename
+    runner = Runner(module)
+    runner.runcode(marshal.loads(marshalled))
+    sys.modules[module_name] = module
+    sys.stdout.flush()
+    return runner.failed
+
+
+"""
+IDE side
+"""
+
+class Run(runs.Run):
+    # output: write(stream, text) for the output of the run (see print_output)
+    def __init__(self, id: int, module_name: str, kernel: "Kernel", budget=None, output=None):
+        super().__init__(module_name, budget)
+        self.id = id
+        self.module_name = module_name
+        self.kernel = kernel
+        self.output = output
+        # process running the code, once it started
+        self.pid = None
+
+    def interrupt(self):
+        self.kernel.interrupt(self)
+
+
+# default output handler: the output of the run (like the panel of its window),
+# or the IDE terminal
+def print_output(run: Run, stream: str, text: str):
+    if run.output is not None:
+        run.output(stream, text)
+    elif stream == "stderr":
+        sys.stderr.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+class Kernel:
+    # target: main loop of the process
+    def __init__(self, project_path: str, on_output=print_output, target=serve):
+        self.project_path = project_path
+        self.target = target
+        # on_output(run, "stdout" or "stderr", text)
+        self.on_output = on_output
+        self.process = None
+        self.connection = None
+        self.reader = None
+        # unfinished runs, by id
+        self.runs = {}
+        self.last_id = 0
+        # process, connection and runs
+        self.lock = threading.RLock()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        # spawn: a clean interpreter, without the IDE state and threads
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=self.target, args=(child_connection, self.project_path), daemon=True)
+        self.process.start()
+        # the kernel keeps its own end
+        child_connection.close()
+        self.reader = threading.Thread(target=self.read, args=[self.connection], daemon=True)
+        self.reader.start()
+
+    def stop(self):
+        with self.lock:
+            self.kill_process()
+        self.abort_runs()
+
+    def kill_process(self):
+        if self.process is None:
+            return
+        self.connection.close()
+        self.process.kill()
+        self.process.join()
+        self.process = None
+        self.connection = None
+
+    # runs that will never finish
+    def abort_runs(self):
+        with self.lock:
+            aborted = list(self.runs.values())
+            self.runs.clear()
+        for run in aborted:
+            run.finish(True)
+
+    # the modules of the kernel are lost
+    def restart(self):
+        with self.lock:
+            aborted = list(self.runs.values())
+            self.runs.clear()
+            self.kill_process()
+            self.start()
+        for run in aborted:
+            run.finish(True)
+
+    # budget: seconds before the run is stopped (None: no limit)
+    # output: write(stream, text), see print_output()
+    def run(self, module_name: str, filename: str, code_object, budget=None, output=None) -> Run:
+        with self.lock:
+            if not self.alive:
+                self.restart()
+            self.last_id += 1
+            run = Run(self.last_id, module_name, self, budget, output)
+            self.runs[run.id] = run
+            self.connection.send(("run", run.id, module_name, filename, marshal.dumps(code_object)))
+        run.start_budget()
+        return run
+
+    # runs waiting for their turn are interrupted when they start
+    def interrupt(self, run: Run):
+        if run.pid is None:
+            return
+        os.kill(run.pid, signal.SIGINT)
+        timer = threading.Timer(KILL_DELAY, self.kill, [run])
+        timer.daemon = True
+        timer.start()
+
+    def kill(self, run: Run):
+        if not run.finished.is_set():
+            self.restart()
+
+    # thread reading the messages of the kernel
+    def read(self, connection):
+        # the kernel stopped or was killed
+        with contextlib.suppress(EOFError, OSError):
+            while True:
+                message = connection.recv()
+                if message[0] == "output":
+                    kind, run_id, stream, text = message
+                    run = self.runs.get(run_id) or Run(run_id, "", self)
+                    self.on_output(run, stream, text)
+                elif message[0] == "started":
+                    kind, run_id, pid = message
+                    run = self.runs.get(run_id)
+                    if run is not None:
+                        run.pid = pid
+                        # cancelled before it started
+                        if run.stop_state is not None:
+                            self.interrupt(run)
+                elif message[0] == "done":
+                    kind, run_id, failed = message
+                    run = self.runs.pop(run_id, None)
+                    # (already aborted by restart())
+                    if run is not None:
+                        run.finish(failed)
+        # the kernel exited by itself (sys.exit() in a module,...):
+        # the next run starts a new one
+        with self.lock:
+            if connection is not self.connection:
+                return
+            self.kill_process()
+        self.abort_runs()
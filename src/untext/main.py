@@ -13,9 +13,10 @@ import webview
 import html
 import ast
 import sys
-import code
 import os
 import json
+import time
+import functools
 
 # used to load css files in the python import path
 from importlib import resources
@@ -46,17 +47,53 @@ from untext.rendering.dynamic.dom import div_old as div, block
 from untext.rendering.dynamic import statement, expression
 
 
-from untext.rendering import static
+from untext.rendering import static, mapping
+from untext import cache, prerender, hotswap, kernel, zygote, repl, eventloop, runs, output, importer, reactive, hashes
+from untext.nodetable import NodeTable
+from untext.spans import LineTable, SpanIndex
 
 
 def test_command(window):
     print("test_command")
 
+def reload_command(window):
+    window.rerender()
+
+def hotswap_command(window):
+    window.hotswap()
+
+def kernel_run_command(window):
+    window.run_in_kernel()
+
+def clean_run_command(window):
+    window.clean_run()
+
+def cancel_run_command(window):
+    window.cancel_run()
+
+def restart_kernel_command(window):
+    window.project.restart_kernel()
+
+def rerun_command(window):
+    window.rerun()
+
 commands = {
     "test": test_command,
+    "reload": reload_command,
+    "hotswap": hotswap_command,
+    "kernel run": kernel_run_command,
+    "clean run": clean_run_command,
+    "cancel run": cancel_run_command,
+    "restart kernel": restart_kernel_command,
+    "rerun changes": rerun_command,
 }
 
 
+# size bounds (in characters) of the html chunks sent by CodeWindow.stream_module()
+STREAM_CHUNK_MIN = 4 * 1024
+STREAM_CHUNK_MAX = 256 * 1024
+
+
 
 """
 helpers to create DOM from an AST
@@ -680,13 +717,73 @@ def render_comprehension(node):
 
 
 class Project:
-    def __init__(self, project_root):
+    # budget: wall-clock time limit of the runs, in seconds (None: no limit)
+    def __init__(self, project_root, budget=None):
         self.path = os.path.abspath(project_root)
+        self.budget = budget
 
         self.windows = []
+        # import name -> window of the module, imported from the window
+        # instead of the disk (see importer.py)
+        self.modules = {}
+        importer.install(self)
+        # started by the first run in the kernel (see kernel.py)
+        self._kernel = None
+        # started by the first clean run (see zygote.py)
+        self._zygote = None
+        # started by the first module or REPL session that needs it
+        self._loop = None
+
+    # asyncio loop of the modules run in the IDE process (see eventloop.py)
+    @property
+    def loop(self):
+        if self._loop is None:
+            self._loop = eventloop.EventLoop()
+        return self._loop
+
+    # process running the modules of the project, outside of the IDE
+    @property
+    def kernel(self):
+        if self._kernel is None:
+            self._kernel = kernel.Kernel(self.path)
+            self._kernel.start()
+        return self._kernel
+
+    # process forking a fresh process for each clean run
+    @property
+    def zygote(self):
+        if self._zygote is None:
+            self._zygote = zygote.Zygote(self.path)
+            self._zygote.start()
+        return self._zygote
+
+    # start over with fresh modules, the windows stay open
+    # (the zygote forgets its imports as well)
+    def restart_kernel(self):
+        if self._kernel is not None:
+            self._kernel.restart()
+        if self._zygote is not None:
+            self._zygote.restart()
 
     # TODO: (someday) remove the load parameter and CodeWindow.load ?
-    def open(self, filepath, load=True):
+    def open(self, filepath, load=True, stream=False, lazy=False, prerendered=None, started=None):
+        path_parts = self.module_parts(filepath)
+        window = CodeWindow(self, path_parts, load=load, stream=stream, lazy=lazy, prerendered=prerendered, started=started)
+        self.windows.append(window)
+        self.modules[window.module_name] = window
+
+    # open several files at once, parsed and rendered in parallel
+    # (see prerender.py)
+    def open_many(self, filepaths, load=True, stream=False, lazy=False):
+        paths = ["/".join(self.module_parts(filepath)) + ".py" for filepath in filepaths]
+        # the rendering times of the windows include the prerendering
+        started = time.perf_counter()
+        results = prerender.render_files(paths, lazy=lazy)
+        for filepath, result in zip(filepaths, results):
+            self.open(filepath, load=load, stream=stream, lazy=lazy, prerendered=result, started=started)
+
+    # ["package", "subpackage", "module"] for package/subpackage/module.py
+    def module_parts(self, filepath):
         # parse and check the file path
         absolute_path = os.path.abspath(filepath)
         common_part = os.path.commonpath([self.path, absolute_path])
@@ -701,23 +798,54 @@ class Project:
         if ext != ".py":
             raise ValueError(f"Cannot open {filepath}, as the file is not a python script")
         path_parts[-1] = module_name
-
-        self.windows.append(CodeWindow(self, path_parts, load=load))
+        return path_parts
 
 
 
 
 class CodeWindow:
-    def __init__(self, project, path_parts, load=True):
+    # stream: create the window with an empty module,
+    # and send the rendered statements in chunks when loading the window
+    # (the top of the file is displayed before the whole file is rendered)
+    # lazy: render function and class bodies only when they become visible
+    # prerendered: source and html rendered by prerender.render_files()
+    # started: time.perf_counter() when the file started to be opened
+    # (before the prerendering)
+    def __init__(self, project, path_parts, load=True, stream=False, lazy=False, prerendered=None, started=None):
+        # start of the rendering times (see CodeWindow.metrics)
+        self.started = time.perf_counter() if started is None else started
         self.project = project
         self.parent_packages = path_parts[:-1]
         self.filename = path_parts[-1]
         self.path = "/".join(path_parts)
-        with open(f"{self.path}.py") as f:
-            self.source = f.read()
+        # absolute path, given to compiled code for tracebacks
+        self.filepath = os.path.join(project.path, f"{self.path}.py")
+        if prerendered is not None:
+            self.source = prerendered.source
+        else:
+            with open(f"{self.path}.py") as f:
+                self.source = f.read()
         self.module_path = ".".join(path_parts)
+        # name of the module in sys.modules (the package for __init__.py)
+        self.module_name = importer.import_name(path_parts)
+        self.is_package = path_parts[-1] == "__init__"
         self.loaded = False
         self.module = None
+        # REPL session of the window, see open_repl()
+        self.repl = None
+        # handle of the last run (see runs.py)
+        self.current_run = None
+        # output of the runs and key bindings, sent to the output panel
+        self.output = output.WindowOutput(self.send_output)
+        # source of the last run, see hotswap()
+        self.running_source = None
+        # statements of the last successful run, see rerun()
+        self.executed = None
+        self.stream = stream
+        self.lazy = lazy
+        # rendering times (in seconds) since the file started to be opened,
+        # see stream_module() (read with pywebview.api.metrics())
+        self.metrics = {}
         
         # create namespaces and packages to allow non-root imports without
         # requiring actual directories on disk:
@@ -757,9 +885,33 @@ class CodeWindow:
         #            print(pkg)
         ##sys.modules[self.module_path] = self.module
 
-        # TODO: update the static renderer and skip the initial DOM rendering
-        self.tree = ast.parse(self.source)
-        ast_html = "".join(static.statement.render_module(self.tree))
+        # ids of the rendered nodes, replaced on each rerender()
+        self.registry = mapping.Registry()
+        # unchanged files are displayed from the render cache,
+        # and only parsed when the tree is needed (see CodeWindow.tree)
+        # pre-rendered files are loaded the same way
+        if prerendered is not None:
+            self.cache_key = prerendered.key
+            self.cached = cache.rebase(prerendered.entry, self.registry)
+            if not prerendered.cached:
+                cache.store(self.cache_key, self.cached)
+        else:
+            self.cache_key = cache.key(self.source, lazy)
+            self.cached = cache.load(self.cache_key, self.registry)
+        self._tree = None
+        # see CodeWindow.node_table, CodeWindow.span_index and CodeWindow.node_hashes
+        self._node_table = None
+        self._span_index = None
+        self._node_hashes = None
+        # see CodeWindow.code
+        self._code = None
+
+        if stream:
+            # filled by stream_module()
+            ast_html = static.html.render(static.html.element("module"), self.registry)
+        else:
+            toplevel_html = "".join(self.toplevel_html())
+            ast_html = static.html.render(static.html.element("module", static.html.text(toplevel_html)), self.registry)
         palette_section = """
         <div id="palette-section">
             <command-palette id='palette'></command-palette>
@@ -782,8 +934,193 @@ class CodeWindow:
         class CodeWindowAPI:
             js_init = """
             document.body.addEventListener("keydown", (e) => {
+              // typing in the REPL panel
+              if (e.target.closest("#repl")) {
+                return
+              }
               pywebview.api.keydown(e.key)
             })
+
+            // state of the last run (see CodeWindow.show_run_state)
+            window.setRunState = (name, state) => {
+              let status = document.getElementById("run-state")
+              if (!status) {
+                status = document.createElement("div")
+                status.id = "run-state"
+                document.body.append(status)
+              }
+              status.textContent = `${name}: ${state}`
+              status.dataset.state = state
+            }
+
+            // bottom panels: output and REPL
+            const panels = () => {
+              let container = document.getElementById("panels")
+              if (!container) {
+                container = document.createElement("div")
+                container.id = "panels"
+                document.body.append(container)
+              }
+              return container
+            }
+            // panels keep the last characters only (like output.OUTPUT_LIMIT)
+            const outputLimit = 1024 * 1024
+            const appendText = (element, node) => {
+              element.textLength = (element.textLength || 0) + node.textContent.length
+              element.append(node)
+              while (element.textLength > outputLimit && element.firstChild) {
+                element.textLength -= element.firstChild.textContent.length
+                element.firstChild.remove()
+              }
+              element.scrollTop = element.scrollHeight
+            }
+
+            // output panel (see CodeWindow.output)
+            // batches are added once per animation frame
+            let outputBatches = []
+            let outputFrame = null
+            window.appendOutput = (chunks, dropped) => {
+              outputBatches.push([chunks, dropped])
+              if (outputFrame === null) {
+                outputFrame = requestAnimationFrame(flushOutput)
+              }
+            }
+            const flushOutput = () => {
+              outputFrame = null
+              let panel = document.getElementById("output")
+              if (!panel) {
+                panel = document.createElement("pre")
+                panel.id = "output"
+                panels().prepend(panel)
+              }
+              for (const [chunks, dropped] of outputBatches) {
+                if (dropped) {
+                  const notice = document.createElement("span")
+                  notice.className = "output-dropped"
+                  notice.textContent = `[${dropped} writes dropped]\n`
+                  appendText(panel, notice)
+                }
+                for (const [stream, text] of chunks) {
+                  const span = document.createElement("span")
+                  span.className = stream
+                  span.textContent = text
+                  appendText(panel, span)
+                }
+              }
+              outputBatches = []
+            }
+            window.toggleOutput = () => {
+              const panel = document.getElementById("output")
+              if (panel) {
+                panel.hidden = !panel.hidden
+              }
+            }
+
+            // REPL panel (see CodeWindow.open_repl)
+            window.openRepl = () => {
+              let panel = document.getElementById("repl")
+              if (!panel) {
+                panel = document.createElement("div")
+                panel.id = "repl"
+                panel.innerHTML = `
+                  <pre class="repl-output"></pre>
+                  <div class="row"><span class="repl-prompt">&gt;&gt;&gt; </span><input class="repl-input"></div>
+                `
+                panels().append(panel)
+                const input = panel.querySelector(".repl-input")
+                input.addEventListener("keydown", (e) => {
+                  if (e.key === "Enter") {
+                    pywebview.api.repl_input(input.value)
+                    input.value = ""
+                  } else if (e.key === "Escape") {
+                    panel.hidden = true
+                  }
+                })
+              }
+              panel.hidden = false
+              panel.querySelector(".repl-input").focus()
+            }
+            window.replOutput = (text, prompt) => {
+              appendText(document.querySelector("#repl .repl-output"), document.createTextNode(text))
+              document.querySelector("#repl .repl-prompt").textContent = prompt
+            }
+
+            // apply the DOM operations of a re-rendering
+            // (see CodeWindow.rerender and rendering/static/diff.py)
+            window.applyPatch = (ops) => {
+              const parse = (html) => {
+                const template = document.createElement("template")
+                template.innerHTML = html
+                return template.content
+              }
+              // the removed and replaced elements leave the document first:
+              // their ids can be given to the new elements (see diff.py)
+              const slots = {}
+              for (const op of ops) {
+                if (op[0] === "remove") {
+                  document.getElementById(op[1]).remove()
+                } else if (op[0] === "replace") {
+                  slots[op[1]] = document.createComment("")
+                  document.getElementById(op[1]).replaceWith(slots[op[1]])
+                }
+              }
+              for (const op of ops) {
+                if (op[0] === "replace") {
+                  slots[op[1]].replaceWith(parse(op[2]))
+                } else if (op[0] === "insert") {
+                  const element = op[1] === null ? null : document.getElementById(op[1])
+                  if (op[2] === "before") {
+                    element.before(parse(op[3]))
+                  } else if (op[2] === "after") {
+                    element.after(parse(op[3]))
+                  } else {
+                    document.querySelector(".module").append(parse(op[3]))
+                  }
+                } else if (op[0] === "text") {
+                  document.getElementById(op[1]).querySelector(op[2]).textContent = op[3]
+                }
+              }
+            }
+
+            // lazy rendering of function and class bodies
+            // (see CodeWindow.render_body)
+            // placeholders are given the height of the body,
+            // and filled by python when they scroll into view
+            const lazyBodies = new IntersectionObserver((entries) => {
+              for (const entry of entries) {
+                if (!entry.isIntersecting) {
+                  continue
+                }
+                const placeholder = entry.target
+                lazyBodies.unobserve(placeholder)
+                pywebview.api.render_body(placeholder.dataset.node).then((html) => {
+                  placeholder.innerHTML = html
+                  placeholder.classList.remove("lazy-body")
+                  placeholder.style.minHeight = ""
+                })
+              }
+            }, {rootMargin: "100%"})
+            const observeLazyBodies = (root) => {
+              if (!root.querySelectorAll) {
+                return
+              }
+              const placeholders = [...root.querySelectorAll(".lazy-body")]
+              if (root.classList.contains("lazy-body")) {
+                placeholders.push(root)
+              }
+              for (const placeholder of placeholders) {
+                placeholder.style.minHeight = `${placeholder.dataset.lines * 1.2}em`
+                lazyBodies.observe(placeholder)
+              }
+            }
+            // placeholders are added by the initial html, streaming,
+            // module patches and lazily rendered bodies
+            new MutationObserver((mutations) => {
+              for (const mutation of mutations) {
+                mutation.addedNodes.forEach(observeLazyBodies)
+              }
+            }).observe(document.body, {childList: true, subtree: true})
+            observeLazyBodies(document.body)
             """
             #js_init = """
             #document.querySelector("#ast-section").addEventListener("keydown", (e) => {
@@ -792,46 +1129,93 @@ class CodeWindow:
             #"""
 
             def keydown(_, key):
-                if key == "r":
-                    if not self.loaded:
-                        if self.module_path in sys.modules:
-                            self.module = sys.modules[self.module_path]
-                        else:
-                            self.module = ModuleType(self.module_path)
-                        self.loaded = True
-                    bytecode = compile(self.tree, "<ast>", "exec")
-                    exec(bytecode, self.module.__dict__)
-                    sys.modules[self.module_path] = self.module
-                    # multiprocessing attempt
-                    # breaks too much to be useful,
-                    # even if some codes like pywebview only work in the main thread
-                    #def f():
-                    #    print(os.getpid())
-                    #    print(os.getppid())
-                    #    exec(bytecode, self.module.__dict__)
-                    #encoded = marshal.dumps(bytecode)
-                    #p = multiprocessing.Process(target=run_code, args=(encoded, self.module.__dict__))
-                    #p.start()
-                    #p.join()
-                    #exec(bytecode, self.module.__dict__)
-                elif key == "s":
-                    self.refresh_module()
-                    # start an REPL in the current module
-                    code.InteractiveConsole(locals=self.module.__dict__).interact()
-                elif key == "t":
-                    self.show_palette()
-                print(key)
+                with self.output.capture():
+                    self.on_key(key)
+
+            def render_body(_, node_id: str):
+                return self.render_body(int(node_id))
+
+            # source of a node (copy as source)
+            def node_source(_, node_id: str):
+                return self.span_index.source(int(node_id))
+
+            # id of the element of the statement at a line (0 if none)
+            def line_element(_, lineno: int):
+                return self.span_index.statement_element(int(lineno))
+
+            # rendering times of the window, in seconds (see stream_module())
+            def metrics(_):
+                return self.metrics
+
+            def repl_input(_, line: str):
+                self.repl.push(line)
 
             def run_command(_, command: str):
                 assert command in commands
-                commands[command](self)
+                with self.output.capture():
+                    commands[command](self)
 
         self.api = CodeWindowAPI()
         self.window = webview.create_window(self.module_path, html=self.html, js_api=self.api)
+        self.window.events.closed += self.close
 
         if load:
             self.load()
 
+    # key bindings of the window (output captured by CodeWindowAPI.keydown)
+    def on_key(self, key):
+        if key == "r":
+            self.run()
+            # multiprocessing attempt
+            # breaks too much to be useful,
+            # even if some codes like pywebview only work in the main thread
+            # (modules run in a separate process with "k", see kernel.py)
+            #def f():
+            #    print(os.getpid())
+            #    print(os.getppid())
+            #    exec(bytecode, self.module.__dict__)
+            #encoded = marshal.dumps(bytecode)
+            #p = multiprocessing.Process(target=run_code, args=(encoded, self.module.__dict__))
+            #p.start()
+            #p.join()
+            #exec(bytecode, self.module.__dict__)
+        elif key == "k":
+            self.run_in_kernel()
+        elif key == "c":
+            self.clean_run()
+        elif key == "x":
+            self.cancel_run()
+        elif key == "u":
+            self.rerun()
+        elif key == "h":
+            self.hotswap()
+        elif key == "s":
+            # start an REPL in the current module
+            self.open_repl()
+        elif key == "t":
+            self.show_palette()
+        elif key == "o":
+            self.window.evaluate_js("toggleOutput()")
+        print(key)
+
+    # release the AST and its DOM links with the window
+    def close(self):
+        self.registry = mapping.Registry()
+        self._tree = None
+        self._node_table = None
+        self._span_index = None
+        self._node_hashes = None
+        self._code = None
+        self.cached = None
+        if self.repl is not None:
+            self.repl.close()
+            self.repl = None
+        self.cancel_run()
+        if self in self.project.windows:
+            self.project.windows.remove(self)
+        if self.project.modules.get(self.module_name) is self:
+            del self.project.modules[self.module_name]
+
     def show_palette(self):
         dom = self.window.dom
         print(dom)
@@ -850,15 +1234,274 @@ class CodeWindow:
         self.window.evaluate_js(js)
 
 
+    # run the whole module
+    # (in its own thread, the window is not blocked)
+    # return the handle of the run, see runs.py
+    def run(self):
+        if self.running():
+            return self.current_run
+        # (from the code cache, the file is not parsed)
+        return self.start(self.code, reactive.Snapshot(source=self.source))
+
+    # reload the file, and only run the top-level statements affected by
+    # the changes since the last successful run (see reactive.py)
+    # the module runs normally the first time
+    def rerun(self):
+        if self.running():
+            return self.current_run
+        self.rerender()
+        if self.executed is None:
+            return self.run()
+        indices, stale = reactive.plan(self.executed, self.tree.body, self.node_hashes)
+        print(f"{self.module_path}: running {len(indices)} of {len(self.tree.body)} statements")
+        for name in stale:
+            self.module.__dict__.pop(name, None)
+        statements = [self.tree.body[index] for index in indices]
+        code = compile(ast.Module(body=statements, type_ignores=[]), self.filepath, "exec", eventloop.COMPILE_FLAGS)
+        return self.start(code, reactive.Snapshot(self.tree.body, self.node_hashes))
+
+    # run code in the module of the window
+    # snapshot: top-level statements of the module once the code ran
+    # (see reactive.Snapshot)
+    def start(self, code, snapshot):
+        if not self.loaded:
+            if self.module_name in sys.modules:
+                self.module = sys.modules[self.module_name]
+            else:
+                self.module = importer.new_module(self)
+            self.loaded = True
+        sys.modules[self.module_name] = self.module
+        # version of the running functions, see hotswap()
+        self.running_source = self.source
+        if eventloop.is_coroutine(code):
+            # top-level await: the module runs in the loop of the project
+            # (its task keeps the capture of the window, see output.py)
+            with self.output.capture():
+                future = self.project.loop.submit(eval(code, self.module.__dict__))
+            future.add_done_callback(eventloop.report)
+            run = runs.FutureRun(self.module_path, future, self.project.budget)
+        else:
+            run = runs.ThreadRun(self.module_path, functools.partial(self.execute, code), self.project.budget)
+        self.track(run)
+        run.listeners.append(functools.partial(self.record, snapshot))
+        run.start()
+        return run
+
+    # failed and cancelled runs are not recorded: their statements run again
+    def record(self, snapshot, run):
+        if run.state == runs.DONE:
+            self.executed = snapshot
+
+    # in the thread of the run, return True if the module raised an exception
+    def execute(self, code):
+        runner = kernel.Runner(self.module)
+        with self.output.capture():
+            runner.runcode(code)
+        return runner.failed
+
+    # run the whole module in the project kernel
+    # (the module state is kept in the kernel, not in self.module)
+    def run_in_kernel(self):
+        if self.running():
+            return self.current_run
+        run = self.project.kernel.run(self.module_path, self.filepath, self.code, self.project.budget, self.output.write)
+        return self.track(run)
+
+    # run the module from a clean state, in a process forked from the project
+    # zygote, which imports the dependencies of the module beforehand
+    def clean_run(self):
+        if self.running():
+            return self.current_run
+        imports = zygote.dependencies(self.tree, self.project.path)
+        run = self.project.zygote.run(self.module_path, self.filepath, self.code, imports, self.project.budget, self.output.write)
+        return self.track(run)
+
+    # runs of a window are sequential: the last one must finish (or be cancelled) first
+    def running(self):
+        if self.current_run is None or self.current_run.finished.is_set():
+            return False
+        print(f"{self.module_path} is already running")
+        return True
+
+    def track(self, run):
+        self.current_run = run
+        run.listeners.append(self.show_run_state)
+        self.show_run_state(run)
+        return run
+
+    def cancel_run(self):
+        if self.current_run is not None:
+            self.current_run.cancel()
+
+    def show_run_state(self, run):
+        self.window.evaluate_js(f"setRunState({json.dumps(run.name)}, {json.dumps(run.state)})")
+
+    # reload the file, and only replace the code of the changed functions
+    # in the running module (see hotswap.py)
+    # the module runs normally the first time
+    def hotswap(self):
+        self.rerender()
+        if self.running_source is None:
+            self.run()
+            return
+        running_tree = ast.parse(self.running_source)
+        report = hotswap.swap(self.module.__dict__, running_tree, self.tree, self.code, new_hashes=self.node_hashes)
+        self.running_source = self.source
+        print(f"{self.module_path} hot-swapped")
+        print(report)
+
+    # interactive session in the module, in a panel of the window
+    # (see repl.py: lines are evaluated in another thread, the window stays responsive)
+    def open_repl(self):
+        self.refresh_module()
+        if self.module is None:
+            # the file never ran: start in an empty module
+            self.module = importer.new_module(self)
+            self.loaded = True
+        if self.repl is None:
+            self.repl = repl.Session(self.module.__dict__, self.repl_output, filename=f"<{self.module_path}>", loop=self.project.loop)
+        self.window.evaluate_js("openRepl()")
+
+    def send_output(self, chunks, dropped):
+        self.window.evaluate_js(f"appendOutput({json.dumps(chunks)}, {dropped})")
+
+    def repl_output(self, text, prompt):
+        self.window.evaluate_js(f"replOutput({json.dumps(text)}, {json.dumps(prompt)})")
+
     # if the module was already imported in other places,
     # but never reloaded by the user,
     # pull the sys.modules entry and use it as the module
     def refresh_module(self):
-        if not self.loaded and self.module_path in sys.modules:
-            self.module = sys.modules[self.module_path]
+        if not self.loaded and self.module_name in sys.modules:
+            self.module = sys.modules[self.module_name]
             self.loaded = True
 
 
+    # render the top-level statements one by one, and append them to the
+    # (empty) module element in chunks of growing size:
+    # the first chunk is small to be displayed as soon as possible,
+    # the next ones are bigger to limit the number of evaluate_js calls
+    # (the metrics count from CodeWindow.started: they include the
+    # prerendering and the start of the window)
+    def stream_module(self):
+        start = self.started
+        chunk = []
+        chunk_size = 0
+        max_size = STREAM_CHUNK_MIN
+        for stmt_html in self.toplevel_html():
+            chunk.append(stmt_html)
+            chunk_size += len(stmt_html)
+            if chunk_size >= max_size:
+                self.append_html("".join(chunk))
+                if "first_paint" not in self.metrics:
+                    self.metrics["first_paint"] = time.perf_counter() - start
+                chunk = []
+                chunk_size = 0
+                max_size = min(max_size * 2, STREAM_CHUNK_MAX)
+        if chunk:
+            self.append_html("".join(chunk))
+        self.metrics["complete"] = time.perf_counter() - start
+        self.metrics.setdefault("first_paint", self.metrics["complete"])
+
+    def append_html(self, html_chunk):
+        js = f'document.querySelector(".module").insertAdjacentHTML("beforeend", {json.dumps(html_chunk)})'
+        self.window.evaluate_js(js)
+
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = ast.parse(self.source)
+            if self.cached is not None:
+                cache.restore_ids(self._tree, self.cached, self.registry)
+        return self._tree
+
+    # compiled tree, compiled once per version of the file
+    # (and only parsed if it is not in the code cache)
+    @property
+    def code(self):
+        if self._code is None:
+            key = cache.code_key(self.source, self.filepath, eventloop.COMPILE_FLAGS)
+            self._code = cache.load_code(key)
+            if self._code is None:
+                self._code = compile(self.tree, self.filepath, "exec", eventloop.COMPILE_FLAGS)
+                cache.store_code(key, self._code)
+        return self._code
+
+    # array-backed structure of the tree, for navigation and selection
+    # (parent, siblings, ancestors,... of a DOM id)
+    @property
+    def node_table(self):
+        if self._node_table is None:
+            self._node_table = NodeTable(self.tree, self.registry)
+        return self._node_table
+
+    # source positions of the DOM ids, and DOM ids at a source position
+    # (traceback highlighting, copying the source of a node, jumping to a line)
+    @property
+    def span_index(self):
+        if self._span_index is None:
+            self._span_index = SpanIndex(self.node_table, LineTable(self.source))
+        return self._span_index
+
+    # structural hashes of the nodes of the tree (see hashes.py),
+    # computed once per version of the file
+    @property
+    def node_hashes(self):
+        if self._node_hashes is None:
+            self._node_hashes = hashes.compute(self.tree)
+        return self._node_hashes
+
+    # html of each top-level statement, from the render cache if possible
+    # (freshly rendered statements are added to the cache)
+    def toplevel_html(self):
+        if self.cached is not None:
+            yield from self.cached["chunks"]
+            return
+        chunks = []
+        for stmt in self.tree.body:
+            with static.html.render_settings(lazy_bodies=self.lazy):
+                stmt_html = static.html.render(static.statement.render_toplevel(stmt), self.registry)
+            chunks.append(stmt_html)
+            yield stmt_html
+        cache.store(self.cache_key, cache.make_entry(self.tree, chunks, self.registry))
+
+
+    # html of a function or class body, rendered lazily
+    # (nested bodies are placeholders as well)
+    def render_body(self, node_id):
+        # parse the file if it was loaded from the cache
+        self.tree
+        node = self.registry.nodes[node_id]
+        with static.html.render_settings(lazy_bodies=True):
+            body_html = static.html.render(static.statement.render_body(node), self.registry)
+        # new DOM ids
+        if self._node_table is not None:
+            self._node_table.link(self.registry)
+        return body_html
+
+
+    # re-read the file from disk, and only patch the DOM where the tree
+    # changed since the last rendering (see rendering/static/diff.py)
+    def rerender(self):
+        with open(f"{self.path}.py") as f:
+            source = f.read()
+        tree = ast.parse(source)
+        node_hashes = hashes.compute(tree)
+        with static.html.render_settings(lazy_bodies=self.lazy):
+            registry, patch = static.diff.patch(self.registry, self.tree, tree, self.node_hashes, node_hashes)
+
+        # the previous tree and registry are released here
+        self.source = source
+        self._tree = tree
+        self.registry = registry
+        self._node_table = None
+        self._span_index = None
+        self._node_hashes = node_hashes
+        self._code = None
+        self.window.evaluate_js(f"applyPatch({json.dumps(patch)})")
+
+
     # must be called after webview.start()
     # (load_css, evaluate_js and dom manipulation cannot be done before opening the window)
     def load(self):
@@ -872,23 +1515,32 @@ class CodeWindow:
         components_js = resources.files("untext.js").joinpath("components.js").read_text()
         self.window.evaluate_js(components_js)
         self.window.evaluate_js(self.api.js_init)
+        self.window.evaluate_js(dom.APPLY_JS)
         self.show_palette()
+        if self.stream:
+            self.stream_module()
 
         # DOM-based rendering of the whole file
-        # (very slow on longer files, not worth using it here)
-        #self.root = self.window.dom.create_element("<div id='root'></div>")
-        #statement.render_module(self.root, self.tree)
+        # (DOM operations are batched, see rendering/dynamic/dom.py,
+        # but the static renderer is still faster)
+        #with dom.Batch(self.window.evaluate_js) as batch, mapping.use(self.registry):
+        #    statement.render_module(batch.root("body"), self.tree)
 
 
 def main():
     # open files listed in sys.argv
-    main_project = Project(os.getcwd())
+    budget = os.environ.get("UNTEXT_RUN_BUDGET")
+    if budget:
+        budget = float(budget)
+    else:
+        budget = None
+    main_project = Project(os.getcwd(), budget=budget)
     for path in sys.argv[1:]:
         if not os.path.exists(path):
             # create the file only if it doesn't exist
             with open(path, "x"):
                 pass
-        main_project.open(path, load=False)
+    main_project.open_many(sys.argv[1:], load=False, stream=True, lazy=True)
 
     def on_load():
         # TODO: get rid of this step by starting pywebview before opening CodeWindows (with a ProjectWindow for example) or by using the static renderer first
@@ -0,0 +1,186 @@
+"""
+compact node table
+
+Array-backed description of an AST, built in one pass over the tree:
+one row per node (depth-first, pre-order), with int columns
+instead of python objects:
+- type: code of the node class (see NODE_TYPES)
+- parent, first_child, next_sibling: rows (-1 if none)
+- end: last row of the subtree (rows of a subtree are contiguous)
+- lineno, col_offset, end_lineno, end_col_offset: source span
+  (-1 for nodes without a position, like operators and contexts)
+
+Parent, sibling and ancestor queries are O(1) array reads, and a table
+takes ~40 bytes per node.
+
+Rows are linked to the DOM ids of a window registry (see mapping.Registry):
+not every node is rendered with its own element, and the ids are generated
+in document order, so the table keeps an id -> row dict on the side.
+"""
+
+import ast
+from array import array
+
+from untext.rendering import mapping
+
+
+# all the AST node classes, with a stable code for a given python version
+def node_types() -> list:
+    types = []
+    stack = [ast.AST]
+    while stack:
+        cls = stack.pop()
+        types.append(cls)
+        stack.extend(cls.__subclasses__())
+    return sorted(set(types), key=type_name)
+
+def type_name(cls: type) -> str:
+    return cls.__module__ + "." + cls.__qualname__
+
+NODE_TYPES = node_types()
+TYPE_CODES = dict(zip(NODE_TYPES, range(len(NODE_TYPES))))
+
+
+# end positions can be None
+def position(node: ast.AST, attribute: str) -> int:
+    value = getattr(node, attribute, None)
+    if value is None:
+        return -1
+    return value
+
+
+class NodeTable:
+    def __init__(self, tree: ast.AST, registry: mapping.Registry | None = None):
+        # row -> AST node (the tree is kept alive by its window anyway)
+        self.nodes = []
+        self.type = array("i")
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.end = array("i")
+        self.lineno = array("i")
+        self.col_offset = array("i")
+        self.end_lineno = array("i")
+        self.end_col_offset = array("i")
+        self.build(tree)
+        # DOM ids
+        # (a dict: the ids of a window keep growing with its re-renders,
+        # and the ids of a tree are sparse after a few patches)
+        self.row_by_id = {}
+        self.id_by_row = array("i")
+        if registry is not None:
+            self.link(registry)
+
+    def build(self, tree: ast.AST):
+        # last child added to each row, to link the next one as its sibling
+        last_child = array("i")
+        # (node, parent row), the next one last
+        stack = [(tree, -1)]
+        while stack:
+            node, parent = stack.pop()
+            row = len(self.nodes)
+            self.nodes.append(node)
+            self.type.append(TYPE_CODES[type(node)])
+            self.parent.append(parent)
+            self.first_child.append(-1)
+            self.next_sibling.append(-1)
+            self.end.append(row)
+            last_child.append(-1)
+            self.lineno.append(position(node, "lineno"))
+            self.col_offset.append(position(node, "col_offset"))
+            self.end_lineno.append(position(node, "end_lineno"))
+            self.end_col_offset.append(position(node, "end_col_offset"))
+            if parent != -1:
+                previous = last_child[parent]
+                if previous == -1:
+                    self.first_child[parent] = row
+                else:
+                    self.next_sibling[previous] = row
+                last_child[parent] = row
+            children = list(ast.iter_child_nodes(node))
+            children.reverse()
+            stack.extend([(child, row) for child in children])
+
+        # children come after their parent: one backward pass is enough
+        for row in range(len(self.nodes) - 1, 0, -1):
+            parent = self.parent[row]
+            if self.end[row] > self.end[parent]:
+                self.end[parent] = self.end[row]
+
+    # (re)link rows to the ids of a registry
+    # (needed again when new nodes are rendered, like lazy bodies)
+    def link(self, registry: mapping.Registry):
+        ids = [registry.ids.get(node, 0) for node in self.nodes]
+        self.id_by_row = array("i", ids)
+        self.row_by_id = {}
+        for row, id in enumerate(ids):
+            if id:
+                self.row_by_id[id] = row
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+    # row queries
+
+    def type_of(self, row: int) -> type:
+        return NODE_TYPES[self.type[row]]
+
+    def span(self, row: int) -> tuple:
+        "return (lineno, col_offset, end_lineno, end_col_offset)"
+        return (self.lineno[row], self.col_offset[row], self.end_lineno[row], self.end_col_offset[row])
+
+    def children(self, row: int) -> list:
+        children = []
+        child = self.first_child[row]
+        while child != -1:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def ancestors(self, row: int) -> list:
+        ancestors = []
+        row = self.parent[row]
+        while row != -1:
+            ancestors.append(row)
+            row = self.parent[row]
+        return ancestors
+
+    def is_ancestor(self, ancestor: int, row: int) -> bool:
+        "return True if ancestor is row or one of its ancestors"
+        return ancestor <= row and row <= self.end[ancestor]
+
+    def subtree(self, row: int) -> range:
+        return range(row, self.end[row] + 1)
+
+
+    # DOM id queries
+
+    def row(self, id: int) -> int:
+        "return the row of a DOM id, -1 if the id is not in the table"
+        return self.row_by_id.get(id, -1)
+
+    def id(self, row: int) -> int:
+        "return the DOM id of a row, 0 if the node has no element"
+        return self.id_by_row[row]
+
+    # closest ancestor displayed with its own element
+    # (0 if none, or if id is not in the table)
+    def parent_id(self, id: int) -> int:
+        row = self.row(id)
+        if row == -1:
+            return 0
+        row = self.parent[row]
+        while row != -1 and not self.id_by_row[row]:
+            row = self.parent[row]
+        if row == -1:
+            return 0
+        return self.id_by_row[row]
+
+    # ids of the elements inside the element of id
+    # (only the nodes with an element, nested elements included)
+    def descendant_ids(self, id: int) -> list:
+        row = self.row(id)
+        if row == -1:
+            return []
+        return [self.id_by_row[r] for r in range(row + 1, self.end[row] + 1) if self.id_by_row[r]]
@@ -0,0 +1,184 @@
+"""
+output capture
+
+The modules, REPL sessions and the IDE itself run in the same process,
+and print to the same sys.stdout and sys.stderr.
+They are replaced (once, see install()) by streams that send the output of
+captured code somewhere else (like the output panel of a window), and the
+output of the rest to the original streams (the terminal).
+
+with output.capture(write_stdout, write_stderr):
+    # print() calls write_stdout(text) here
+    ...
+
+The capture is a context variable: it applies to the current thread, and
+to the asyncio tasks scheduled from it (tasks copy the context of the code
+scheduling them), but not to the threads started by the captured code.
+"""
+
+import collections
+import contextvars
+import itertools
+import sys
+import threading
+
+
+# (stdout write function, stderr write function) of the current context
+sink = contextvars.ContextVar("sink", default=None)
+
+
+class RoutedStream:
+    # index: 0 for stdout, 1 for stderr (see sink)
+    def __init__(self, stream, index: int):
+        # original stream
+        self.stream = stream
+        self.index = index
+
+    def write(self, text: str) -> int:
+        writers = sink.get()
+        if writers is None:
+            return self.stream.write(text)
+        writers[self.index](text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    # encoding, fileno(), isatty(),... of the original stream
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+def install():
+    if not isinstance(sys.stdout, RoutedStream):
+        sys.stdout = RoutedStream(sys.stdout, 0)
+    if not isinstance(sys.stderr, RoutedStream):
+        sys.stderr = RoutedStream(sys.stderr, 1)
+
+
+# send stdout and stderr of the current context to write_stdout(text)
+# and write_stderr(text) (stderr to write_stdout as well by default)
+class capture:
+    def __init__(self, write_stdout, write_stderr=None):
+        self.writers = (write_stdout, write_stderr or write_stdout)
+        self.token = None
+
+    def __enter__(self):
+        install()
+        self.token = sink.set(self.writers)
+        return self
+
+    def __exit__(self, *exc_info):
+        sink.reset(self.token)
+
+
+"""
+window output
+
+The output of a window (its runs, and the IDE code running for it, like
+key bindings) is kept in a bounded ring buffer: only the last OUTPUT_LIMIT
+characters are kept in memory.
+
+It is sent to the output panel of the window in batches, at most once per
+frame (FRAME_INTERVAL), whatever the number of writes: a module printing
+100k lines sends a few dozen updates, and only the output that is still in
+the buffer when the batch is sent.
+The panel adds the batches in an animation frame, and keeps the same number
+of characters.
+"""
+
+OUTPUT_LIMIT = 1024 * 1024
+
+# seconds (60 fps)
+FRAME_INTERVAL = 0.016
+
+
+class RingBuffer:
+    def __init__(self, limit=OUTPUT_LIMIT):
+        # in characters
+        self.limit = limit
+        self.size = 0
+        # (stream, text), the oldest ones are dropped
+        self.chunks = collections.deque()
+        # number of chunks ever appended
+        self.count = 0
+
+    def append(self, stream: str, text: str):
+        if len(text) > self.limit:
+            text = text[len(text) - self.limit:]
+        self.chunks.append((stream, text))
+        self.count += 1
+        self.size += len(text)
+        while self.size > self.limit:
+            old_stream, old_text = self.chunks.popleft()
+            self.size -= len(old_text)
+
+    # chunks appended since the first count chunks
+    # return (number of chunks dropped before they were read, chunks)
+    def since(self, count: int) -> tuple:
+        new = self.count - count
+        kept = min(new, len(self.chunks))
+        chunks = list(itertools.islice(reversed(self.chunks), kept))
+        chunks.reverse()
+        return new - kept, chunks
+
+    def text(self) -> str:
+        return "".join([text for stream, text in self.chunks])
+
+
+# consecutive chunks of the same stream, joined
+def merge(chunks: list) -> list:
+    merged = []
+    for stream, text in chunks:
+        if merged and merged[-1][0] == stream:
+            merged[-1][1] += text
+        else:
+            merged.append([stream, text])
+    return merged
+
+
+class WindowOutput:
+    # send(chunks, dropped): update the panel with [[stream, text]] chunks,
+    # after dropped chunks that were never sent
+    def __init__(self, send, limit=OUTPUT_LIMIT, interval=FRAME_INTERVAL):
+        self.buffer = RingBuffer(limit)
+        self.send = send
+        self.interval = interval
+        # number of chunks sent
+        self.sent = 0
+        self.lock = threading.Lock()
+        # flushes are sent in order
+        self.flushing = threading.Lock()
+        # started by the first write after a flush
+        self.timer = None
+
+    def write(self, stream: str, text: str):
+        if not text:
+            return
+        with self.lock:
+            self.buffer.append(stream, text)
+            if self.timer is None:
+                self.timer = threading.Timer(self.interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def stdout(self, text: str):
+        self.write("stdout", text)
+
+    def stderr(self, text: str):
+        self.write("stderr", text)
+
+    # capture the output of the current context (see capture)
+    def capture(self) -> capture:
+        return capture(self.stdout, self.stderr)
+
+    def flush(self):
+        with self.flushing:
+            with self.lock:
+                dropped, chunks = self.buffer.since(self.sent)
+                self.sent = self.buffer.count
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            if chunks:
+                self.send(merge(chunks), dropped)
@@ -0,0 +1,75 @@
+"""
+parallel pre-rendering
+
+When untext opens many files at once (untext a.py b.py c.py ...),
+they are parsed and rendered in a process pool before the windows are
+created, instead of one after the other in CodeWindow.__init__.
+
+Workers send back the same data as the render cache (html of the top-level
+statements and the ids of the rendered nodes, see cache.py), which the
+windows load like a cache hit: the tree is parsed again only when needed.
+
+This module does not import pywebview: workers are spawned processes,
+which only import what they need to render.
+"""
+
+import ast
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from untext import cache
+from untext.rendering import mapping
+from untext.rendering.static import html, statement
+
+
+# starting the workers takes ~0.2s: smaller projects (in bytes of source)
+# are rendered faster in the current process
+PARALLEL_MIN_SIZE = 512 * 1024
+
+
+class Prerendered:
+    def __init__(self, source: str, key: str, entry: dict, cached: bool):
+        self.source = source
+        # render cache key and entry
+        self.key = key
+        self.entry = entry
+        # True if the entry was read from the render cache
+        # (new entries are stored by the main process, see CodeWindow)
+        self.cached = cached
+
+
+# parse and render a file, in a worker
+def render_file(path: str, lazy: bool) -> Prerendered:
+    with open(path) as f:
+        source = f.read()
+    key = cache.key(source, lazy)
+    registry = mapping.Registry()
+    entry = cache.load(key, registry)
+    if entry is not None:
+        return Prerendered(source, key, entry, True)
+
+    tree = ast.parse(source)
+    chunks = []
+    with html.render_settings(lazy_bodies=lazy):
+        for stmt in tree.body:
+            chunks.append(html.render(statement.render_toplevel(stmt), registry))
+    return Prerendered(source, key, cache.make_entry(tree, chunks, registry), False)
+
+
+# render files, in parallel if it is worth it
+# results are in the same order as paths
+def render_files(paths: list, lazy=False, workers=None) -> list:
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    size = sum([os.path.getsize(path) for path in paths])
+    if workers < 2 or size < PARALLEL_MIN_SIZE:
+        return [render_file(path, lazy) for path in paths]
+    return render_parallel(paths, lazy, workers)
+
+
+def render_parallel(paths: list, lazy: bool, workers: int) -> list:
+    # spawn (the default on windows and macos) instead of fork on linux:
+    # the main process may already have started GUI threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(render_file, paths, [lazy] * len(paths)))
@@ -0,0 +1,179 @@
+"""
+reactive runs
+
+Runs again only the top-level statements of a module affected by an edit
+(see CodeWindow.rerun), like a notebook where the cells are the statements:
+the expensive statements at the top of a file (loading data,...) do not run
+again when the code below them changes.
+
+The statements are linked by the names they define and read (see names()):
+a statement depends on the statements defining the names it reads (see
+Graph). After an edit, the statements to run are:
+- the new and changed statements, found by diffing the structural hashes
+  of the statements of the last run and of the new ones (see Snapshot and
+  plan(), positions are ignored)
+- the statements defining or reading a name defined by a removed statement
+- everything downstream of them, in the order of the file
+The other statements keep their results in the module namespace.
+
+The analysis is syntactic and errs on the side of running too much:
+- a function depends on the global names read in its body, since they are
+  read when it is called (and a call of the function depends on it)
+- assigning an attribute or an item of a name (x.a = 1, x[0] = 1) counts as
+  defining the name
+Mutations through method calls (x.append(1)) are not seen, and running a
+mutating statement again mutates the current value again.
+"""
+
+import ast
+import difflib
+
+from untext import hashes as structural_hashes
+
+
+# (names defined, names read) by a top-level statement
+def names(statement: ast.stmt) -> tuple:
+    defined = set()
+    read = set()
+    # (node, True if its names are bound in the module namespace)
+    stack = [(statement, True)]
+    while stack:
+        node, top_level = stack.pop()
+        local = top_level
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if top_level:
+                defined.add(node.name)
+            local = False
+        elif isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            local = False
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            if top_level:
+                defined.update(imported_names(node))
+        elif isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                read.add(node.id)
+            elif top_level:
+                defined.add(node.id)
+        elif isinstance(node, (ast.Attribute, ast.Subscript)):
+            if top_level and not isinstance(node.ctx, ast.Load):
+                base = base_name(node)
+                if base is not None:
+                    defined.add(base)
+        stack.extend([(child, local) for child in ast.iter_child_nodes(node)])
+    return defined, read
+
+
+def imported_names(node: ast.Import | ast.ImportFrom) -> list:
+    found = []
+    for alias in node.names:
+        if alias.asname is not None:
+            found.append(alias.asname)
+        elif alias.name != "*":
+            found.append(alias.name.split(".")[0])
+    return found
+
+
+# "x" for x.a.b or x[0].a, None for f().a
+def base_name(node: ast.expr):
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+class Graph:
+    def __init__(self, body: list):
+        # (defined, read) of each statement
+        self.names = [names(statement) for statement in body]
+        # name -> indices of the statements defining it, in order
+        self.definitions = {}
+        for index, (defined, read) in enumerate(self.names):
+            for name in defined:
+                self.definitions.setdefault(name, []).append(index)
+        # dependents[i]: statements reading a name defined by statement i
+        self.dependents = [[] for statement in body]
+        for index, (defined, read) in enumerate(self.names):
+            for name in read:
+                for definition in self.definers(name, index):
+                    self.dependents[definition].append(index)
+
+    # statements providing the value of a name read by a statement:
+    # the last definition before it, or the definitions after it (read by a
+    # function body, when the function is called)
+    def definers(self, name: str, index: int) -> list:
+        indices = self.definitions.get(name, [])
+        before = [definition for definition in indices if definition < index]
+        if before:
+            return before[-1:]
+        return [definition for definition in indices if definition > index]
+
+    # statements using a name, as a definition or a read
+    def users(self, name: str) -> list:
+        return [index for index, (defined, read) in enumerate(self.names) if name in defined or name in read]
+
+    # roots and the statements downstream of them, in order
+    def downstream(self, roots: list) -> list:
+        found = set(roots)
+        stack = list(roots)
+        while stack:
+            for dependent in self.dependents[stack.pop()]:
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return sorted(found)
+
+
+# statements of the last run
+# (hashes: structural hashes of the module, see hashes.py)
+# a run of a whole file only keeps its source: it is parsed and hashed by
+# the first rerun, and a run of a module from the code cache never parses it
+class Snapshot:
+    def __init__(self, body=None, hashes=None, source=None):
+        self.source = source
+        self._keys = None
+        self._defined = None
+        if body is not None:
+            self.load(body, hashes)
+
+    def load(self, body: list, hashes: dict):
+        # no positions in the hashes: moved code is not a change
+        self._keys = [hashes[statement] for statement in body]
+        self._defined = [names(statement)[0] for statement in body]
+
+    def parse(self):
+        if self._keys is None:
+            tree = ast.parse(self.source)
+            self.load(tree.body, structural_hashes.compute(tree))
+
+    @property
+    def keys(self) -> list:
+        self.parse()
+        return self._keys
+
+    @property
+    def defined(self) -> list:
+        self.parse()
+        return self._defined
+
+
+# statements of body to run after the statements of snapshot ran
+# return (indices of the statements, names only defined by removed statements)
+def plan(snapshot: Snapshot, body: list, hashes: dict) -> tuple:
+    graph = Graph(body)
+    keys = [hashes[statement] for statement in body]
+    matcher = difflib.SequenceMatcher(None, snapshot.keys, keys, autojunk=False)
+    kept_old = set()
+    kept_new = set()
+    for block in matcher.get_matching_blocks():
+        kept_old.update(range(block.a, block.a + block.size))
+        kept_new.update(range(block.b, block.b + block.size))
+    roots = [index for index in range(len(body)) if index not in kept_new]
+    removed = set()
+    for index, defined in enumerate(snapshot.defined):
+        if index not in kept_old:
+            removed.update(defined)
+    for name in removed:
+        roots.extend(graph.users(name))
+    stale = sorted([name for name in removed if name not in graph.definitions])
+    return graph.downstream(roots), stale
@@ -0,0 +1,59 @@
+"""
+table-driven renderer dispatch
+
+Each renderer module (static and dynamic, statements and expressions)
+owns a Dispatcher, which maps AST node classes to their renderer function.
+Finding the renderer of a node is a single dict lookup on type(node),
+instead of a chain of type(node) == ... comparisons.
+
+Renderers are added with a decorator:
+
+    renderers = Dispatcher("statement", ast.stmt)
+
+    @renderers.register(ast.Pass)
+    def render_pass(node: ast.Pass):
+        ...
+
+The same decorator can be used outside of untext to add renderers for
+node types that are not supported yet (ast.TryStar, ast.Lambda,...), or to
+replace an existing renderer:
+
+    from untext.rendering import static
+
+    @static.statement.renderers.register(ast.TryStar)
+    def render_trystar(node: ast.TryStar):
+        ...
+"""
+
+import ast
+
+
+class Dispatcher:
+    def __init__(self, name: str, base: type):
+        # used in error messages ("statement", "expression",...)
+        self.name = name
+        # AST base class of the dispatched nodes (ast.stmt, ast.expr,...)
+        # used to tell unsupported nodes apart from invalid ones
+        self.base = base
+        self.renderers = {}
+
+    # decorator to add a renderer for one or more node types
+    def register(self, *node_types: type):
+        def decorator(renderer):
+            for node_type in node_types:
+                self.renderers[node_type] = renderer
+            return renderer
+        return decorator
+
+    def lookup(self, node: ast.AST):
+        renderer = self.renderers.get(type(node))
+        if renderer is not None:
+            return renderer
+        # error path
+        if isinstance(node, self.base):
+            raise NotImplementedError(f"{self.name}.render() not implemented for {type(node)}")
+        # future python versions may add new things
+        raise ValueError(f"Unexpected ast {self.name} type: {type(node)}")
+
+    def __contains__(self, node_type: type):
+        return node_type in self.renderers
@@ -2,36 +2,197 @@
 general DOM manipulation utilities
 """
 
-from webview.dom.element import Element
 from ast import AST
+import json
+import time
 
 """
-(bidirectional) AST-DOM linking
+DOM operation queue
+
+pywebview elements run a JS call through the bridge for every change
+(append, classes, text, id,...), which made the dynamic renderer very slow
+on longer files: thousands of round trips for a few hundred lines.
+
+The renderers work on Element stand-ins instead, which record compact
+operations in the Batch of the rendering:
+    ["q", ref, selector]           existing element (Batch.root())
+    ["e", parent ref, ref, tag]    create an element and append it
+    ["c", ref, "class names"]      set the classes
+    ["a", ref, name, value]        set an attribute
+    ["t", ref, text]               set the text
+    ["i", ref, id]                 set the id (registered AST node)
+refs are numbers local to the batch. The operations are sent as JSON in one
+evaluate_js call (applyDomOps(), see APPLY_JS) when the batch is flushed:
+- every Batch.limit operations
+- between two subtrees, once a frame passed since the last flush (tick())
+- at the end of the rendering (with Batch(...) as batch: ...)
+
+batch = dom.Batch(window.evaluate_js)
+with batch, mapping.use(window.registry):
+    statement.render_module(batch.root("#root"), tree)
+"""
 
-AST nodes are linked to DOM elements with a shared unique id
+# seconds (60 fps)
+FRAME_INTERVAL = 0.016
+
+# operations per evaluate_js call at most
+BATCH_LIMIT = 4096
+
+# installed once per window, before the first batch
+APPLY_JS = """
+window.domBatches = {}
+window.applyDomOps = (batch, ops) => {
+  const refs = domBatches[batch] || (domBatches[batch] = [])
+  for (const op of ops) {
+    switch (op[0]) {
+      case "q": refs[op[1]] = document.querySelector(op[2]); break
+      case "e": refs[op[2]] = refs[op[1]].appendChild(document.createElement(op[3])); break
+      case "c": refs[op[1]].className = op[2]; break
+      case "a": refs[op[1]].setAttribute(op[2], op[3]); break
+      case "t": refs[op[1]].textContent = op[2]; break
+      case "i": refs[op[1]].id = op[2]; break
+    }
+  }
+}
+window.releaseDomOps = (batch) => {
+  delete domBatches[batch]
+}
 """
 
 
-dom_mapping = {}
-ast_mapping = {}
+class Batch:
+    # number of batches ever created (ids of the batches on the JS side)
+    created = 0
+
+    # send(js): evaluate_js of the rendered window
+    def __init__(self, send, limit=BATCH_LIMIT, interval=FRAME_INTERVAL):
+        Batch.created += 1
+        self.id = Batch.created
+        self.send = send
+        self.limit = limit
+        self.interval = interval
+        self.ops = []
+        # last ref given to an element
+        self.count = 0
+        self.last_flush = time.perf_counter()
+
+    def record(self, op: list):
+        self.ops.append(op)
+        if len(self.ops) >= self.limit:
+            self.flush()
+
+    def ref(self) -> int:
+        self.count += 1
+        return self.count
+
+    # element already in the page, to render into
+    def root(self, selector: str) -> "Element":
+        elt = Element(self, self.ref())
+        self.record(["q", elt.ref, selector])
+        return elt
+
+    def flush(self):
+        self.last_flush = time.perf_counter()
+        if not self.ops:
+            return
+        ops = self.ops
+        self.ops = []
+        self.send(f"applyDomOps({self.id}, {json.dumps(ops)})")
+
+    # flush if a frame passed since the last flush
+    # (called between subtrees, like the statements of a module)
+    def tick(self):
+        if time.perf_counter() - self.last_flush >= self.interval:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    # the elements of the batch cannot be changed after that
+    def __exit__(self, *exc_info):
+        self.flush()
+        self.send(f"releaseDomOps({self.id})")
+
+
+# classes of an Element, recorded when they change
+class ClassList(list):
+    def __init__(self, element: "Element", classes: list):
+        super().__init__(classes)
+        self.element = element
+
+    def append(self, cls: str):
+        super().append(cls)
+        self.element.batch.record(["c", self.element.ref, " ".join(self)])
+
+
+class Attributes(dict):
+    def __init__(self, element: "Element"):
+        super().__init__()
+        self.element = element
+
+    def __setitem__(self, name: str, value: str):
+        super().__setitem__(name, value)
+        self.element.batch.record(["a", self.element.ref, name, value])
+
+
+# stand-in for a DOM element, used like a pywebview Element
+class Element:
+    def __init__(self, batch: Batch, ref: int):
+        self.batch = batch
+        self.ref = ref
+        self._classes = ClassList(self, [])
+        self.attributes = Attributes(self)
+        self._text = None
+        self._id = None
+
+    # create a child element, return it
+    def append(self, tag: str) -> "Element":
+        elt = Element(self.batch, self.batch.ref())
+        self.batch.record(["e", self.ref, elt.ref, tag])
+        return elt
+
+    @property
+    def classes(self) -> ClassList:
+        return self._classes
+
+    @classes.setter
+    def classes(self, classes: list):
+        self._classes = ClassList(self, classes)
+        self.batch.record(["c", self.ref, " ".join(classes)])
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @text.setter
+    def text(self, text: str):
+        self._text = text
+        self.batch.record(["t", self.ref, text])
+
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, id):
+        self._id = id
+        self.batch.record(["i", self.ref, str(id)])
+
+
+"""
+(bidirectional) AST-DOM linking
 
-def make_counter():
-    counter = 0
-    def count():
-        nonlocal counter
-        counter += 1
-        return counter
-    return count
+AST nodes are linked to DOM elements with a shared unique id,
+kept in the registry of the rendered window (see mapping.use)
+"""
 
-genid = make_counter()
+from .. import mapping
 
 def register(ast_node: AST, dom_element: Element):
-    n = genid()
+    registry = mapping.current.registry
+    n = registry.register(ast_node)
     dom_element.id = n
-    # .id is used by some node types
-    ast_node.node_id = n
-    dom_mapping[n] = dom_element
-    ast_mapping[n] = ast_node
+    registry.elements[n] = dom_element
 
 """
 basic wrappers for html string formatting
@@ -52,9 +213,9 @@ def block(html=""):
     return f"<div class='block'>{html}</div>"
 
 # TODO: add an easy wrapper for elt = dom.create_element(div, parent=parent); elt.classes = [...]; register(elt)
-# wrappers for Element creation, AST node registering and html class setup
+# wrappers for Element creation, AST node registering and html class setup
 def add(parent: Element, cls: str | list = None, text: str = None):
-    elt = parent.append(div())
+    elt = parent.append("div")
     if cls:
         elt.classes = cls.split(" ") if isinstance(cls, str) else cls
     if text:
@@ -62,7 +223,7 @@ def add(parent: Element, cls: str | list = None, text: str = None):
     return elt
 
 def add_pre(parent: Element, text: str):
-    elt = parent.append(pre())
+    elt = parent.append("pre")
     elt.text = text
     return elt
 
@@ -91,4 +252,3 @@ def add_node(parent: Element, node: AST, cls: str | list = None, text: str = Non
 
 #def row():
 #    return "<div class='row'></div>"
-
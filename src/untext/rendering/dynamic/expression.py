@@ -2,80 +2,26 @@
 expression rendering
 """
 
-from webview.dom.element import Element
 import ast
 
 import html
 import json
 
 #from untext.rendering.dom import register, div, block, add_node, add, add_text, add_pre
-from .dom import register, div, block, add_node, add, add_text, add_pre
+from .dom import Element, register, div, block, add_node, add, add_text, add_pre
+from ..dispatch import Dispatcher
 
 
-def render(parent: Element, node: ast.expr):
-    #match type(node):
-    if type(node) == ast.BoolOp:
-        return render_boolop(parent, node)
-    elif type(node) == ast.NamedExpr:
-        raise NotImplementedError('expression.render() not implemented for ast.NamedExpr')
-    elif type(node) == ast.BinOp:
-        return render_binop(parent, node)
-    elif type(node) == ast.UnaryOp:
-        return render_unaryop(parent, node)
-    elif type(node) == ast.Lambda:
-        raise NotImplementedError('expression.render() not implemented for ast.Lambda')
-    elif type(node) == ast.IfExp:
-        return render_ifexp(parent, node)
-    elif type(node) == ast.Dict:
-        return render_dict(parent, node)
-    elif type(node) == ast.Set:
-        raise NotImplementedError('expression.render() not implemented for ast.Set')
-    elif type(node) == ast.ListComp:
-        return render_list_comprehension(parent, node)
-    elif type(node) == ast.SetComp:
-        raise NotImplementedError('expression.render() not implemented for ast.SetComp')
-    elif type(node) == ast.DictComp:
-        raise NotImplementedError('expression.render() not implemented for ast.DictComp')
-    elif type(node) == ast.GeneratorExp:
-        raise NotImplementedError('expression.render() not implemented for ast.GeneratorExp')
-    elif type(node) == ast.Await:
-        raise NotImplementedError('expression.render() not implemented for ast.Await')
-    elif type(node) == ast.Yield:
-        raise NotImplementedError('expression.render() not implemented for ast.Yield')
-    elif type(node) == ast.YieldFrom:
-        raise NotImplementedError('expression.render() not implemented for ast.YieldFrom')
-    elif type(node) == ast.Compare:
-        return render_compare(parent, node)
-    elif type(node) == ast.Call:
-        return render_call(parent, node)
-    elif type(node) == ast.FormattedValue:
-        return render_formatted_value(parent, node)
-    # case ast.Interpolation:
-    #     raise NotImplementedError('expression.render() not implemented for ast.Interpolation')
-    elif type(node) == ast.JoinedStr:
-        return render_joinedstr(parent, node)
-    # case ast.TemplateStr:
-    #     raise NotImplementedError('expression.render() not implemented for ast.TemplateStr')
-    elif type(node) == ast.Constant:
-        return render_constant(parent, node)
-    elif type(node) == ast.Attribute:
-        return render_attribute(parent, node)
-    elif type(node) == ast.Subscript:
-        return render_subscript(parent, node)
-    elif type(node) == ast.Starred:
-        return render_starred(parent, node)
-    elif type(node) == ast.Name:
-        return render_name(parent, node)
-    elif type(node) == ast.List:
-        return render_list(parent, node)
-    elif type(node) == ast.Tuple:
-        return render_tuple(parent, node)
-    elif type(node) == ast.Slice:
-        return render_slice(parent, node)
-    else:
-        raise ValueError(f"Unexpected ast expression type: {type(node)}")
+# the table is filled by the @renderers.register() decorators below
+# unsupported expressions are missing from it:
+# NamedExpr, Lambda, Set, SetComp, DictComp, GeneratorExp, Await, Yield,
+# YieldFrom, Interpolation and TemplateStr (3.14+ features)
+renderers = Dispatcher("expression", ast.expr)
 
 
+def render(parent: Element, node: ast.expr):
+    return renderers.lookup(node)(parent, node)
+
 
 
 #BoolOp(boolop op, expr* values)
@@ -117,6 +63,7 @@ def render(parent: Element, node: ast.expr):
 #
 #
 
+@renderers.register(ast.BoolOp)
 def render_boolop(parent: Element, node: ast.BoolOp) -> Element:
     elt = add_node(parent, node, "row gap")
     elt.classes.append(f"{read_boolop(node.op)}-sep")
@@ -141,6 +88,7 @@ in practice, css support is lacking, so we need this:
   <div class="operand">b</div>
 </div>
 """
+@renderers.register(ast.BinOp)
 def render_binop(parent: Element, node: ast.BinOp) -> Element:
     elt = add_node(parent, node, "operation row gap")
     elt.attributes["data-operator"] = read_binaryop(node.op)
@@ -178,31 +126,32 @@ def read_binaryop(op: ast.operator):
     elif isinstance(op, ast.Mult):
         return "*"
     elif isinstance(op, ast.Div):
-        pass
+        return "/"
     elif isinstance(op, ast.FloorDiv):
-        pass
+        return "//"
     elif isinstance(op, ast.Mod):
-        pass
+        return "%"
     elif isinstance(op, ast.Pow):
-        pass
+        return "**"
     elif isinstance(op, ast.LShift):
-        pass
+        return "<<"
     elif isinstance(op, ast.RShift):
-        pass
+        return ">>"
     elif isinstance(op, ast.BitOr):
         return "|"
     elif isinstance(op, ast.BitXor):
-        pass
+        return "^"
     elif isinstance(op, ast.BitAnd):
-        pass
+        return "&"
     elif isinstance(op, ast.MatMult):
-        pass
+        return "@"
     raise NotImplementedError(f"unknown binary operator: {op}")
 
 
 # TODO: go back to previous "operator separators" and replace them by DOM nodes
 # (operators have semantic meaning, they are not just syntax)
 # (keep the css for infix inlining if needed)
+@renderers.register(ast.UnaryOp)
 def render_unaryop(parent: Element, node: ast.UnaryOp) -> Element:
     elt = add_node(parent, node, "row")
     op = add(elt, text=read_unaryop(node.op))
@@ -235,6 +184,7 @@ def read_boolop(op: ast.boolop):
         raise NotImplementedError(f"unknown boolean operator: {op}")
 
 
+@renderers.register(ast.IfExp)
 def render_ifexp(parent: Element, node: ast.IfExp) -> Element:
     elt = add_node(parent, node, "row gap")
     condition = add(elt)
@@ -249,6 +199,7 @@ def render_ifexp(parent: Element, node: ast.IfExp) -> Element:
 
 # TODO: test with more kinds of literals
 # (currently only tested for empty dictionaries)
+@renderers.register(ast.Dict)
 def render_dict(parent: Element, node: ast.Dict):
     # TODO: multi-line rendering:
     # ... {
@@ -269,6 +220,7 @@ def render_dict(parent: Element, node: ast.Dict):
         render(value, v)
 
 
+@renderers.register(ast.ListComp)
 def render_list_comprehension(parent: Element, node: ast.ListComp) -> Element:
     elt = add_node(parent, node, "brackets row")
     spaced_content = add(elt, "row gap")
@@ -297,6 +249,7 @@ def render_comprehension_generator(parent: Element, node: ast.comprehension) ->
     return elt
 
 
+@renderers.register(ast.Compare)
 def render_compare(parent: Element, node: ast.Compare) -> Element:
     # in python, comparisons can be complex sequences, like:
     # 1 < x < y < 6
@@ -338,6 +291,7 @@ def read_op(op: ast.operator):
 
 
 # TODO: add more DOM encoding
+@renderers.register(ast.Call)
 def render_call(parent: Element, node: ast.Call) -> Element:
     elt = add_node(parent, node, "call row")
     func = render(elt, node.func)
@@ -366,6 +320,7 @@ def render_keyword_arg(parent: Element, node: ast.keyword) -> Element:
     render(val, node.value)
     return elt
 
+@renderers.register(ast.FormattedValue)
 def render_formatted_value(parent: Element, node: ast.FormattedValue) -> Element:
     # TODO: support other conversion types:
     # -1: unspecified (default is str())
@@ -383,6 +338,7 @@ def render_formatted_value(parent: Element, node: ast.FormattedValue) -> Element
 
 # f"{x}<text>{y}"
 # f-"-({(<x>)}-(<json-encoded text>)-({<y>}))-"
+@renderers.register(ast.JoinedStr)
 def render_joinedstr(parent: Element, node: ast.JoinedStr) -> Element:
     elt = add_node(parent, node, "row f-prefix")
     quoted = add(elt, "quotes row")
@@ -393,11 +349,10 @@ def render_joinedstr(parent: Element, node: ast.JoinedStr) -> Element:
         else:
             assert isinstance(e, ast.Constant)
             assert isinstance(e.value, str)
-            # quotes are replaced because pywebview runs f"elt.textContent = '{text}'"
-            # which breaks if there is a single quote in the string
-            # and needs a second layer of escaping for everything that is escaped
+            # the text is sent as JSON (see dom.Batch), without the second
+            # layer of escaping that pywebview needed ("elt.textContent = '{text}'")
             # TODO: merge with literal string formatting
-            text = json.dumps(e.value).replace("\\", "\\\\").replace("'", "\\'")
+            text = json.dumps(e.value)
             # remove quotes (and let the css quotes surround the whole f-string)
             text = text[1:-1]
             #add(quoted, text=text)
@@ -406,29 +361,20 @@ def render_joinedstr(parent: Element, node: ast.JoinedStr) -> Element:
     return elt
 
 
+@renderers.register(ast.Constant)
 def render_constant(parent: Element, node: ast.Constant) -> Element:
     assert node.kind is None
     elt = add_node(parent, node, "literal")
     # TODO: test very carefully
-    # string rendering is very fragile, due to pywebview doing a double eval with JS code execution
-    # also make sure to check html escaping
-    # and make sure that the code works in later versions with pypy
+    # the text is set with textContent from JSON-encoded operations (see dom.Batch):
+    # no html escaping, and no double escaping of the JS code anymore
     # TODO: centralize string escaping to prevent debugging the same bugs in other places (f-strings, comparisons,...)
 
-    # tools available:
-    # -html.escape(), already done by pywebview
-    # -json.dumps(), for JS quotes escaping (repr will not work)
-    # -double escaping for the rest: .replace("\\", "\\\\")
-
     if isinstance(node.value, str):
         # TODO: use the DOM to encode constant types
         # TODO: render multiline ("\n") strings with the multiline syntax if they are top-level in the module
 
-        # text = json.dumps(node.value)
-        # pywebview uses JS eval to do things, which seems to break newline and quote escaping
-        #text = json.dumps(node.value).replace("\\", "\\\\")
-        # new fix imported from f-string (JoinedStr) tests
-        text = json.dumps(node.value).replace("\\", "\\\\").replace("'", "\\'")
+        text = json.dumps(node.value)
         elt.text = text
         # TODO: format multiline strings differently (""" """)
         # does not work:
@@ -448,12 +394,14 @@ def render_constant(parent: Element, node: ast.Constant) -> Element:
         #print(elt.text)
     return elt
 
+@renderers.register(ast.Attribute)
 def render_attribute(parent: Element, node: ast.Attribute) -> Element:
     elt = add_node(parent, node, "attribute row dot-sep")
     render(elt, node.value)
     add(add(elt, "row"), text=node.attr)
     return elt
 
+@renderers.register(ast.Subscript)
 def render_subscript(parent: Element, node: ast.Subscript) -> Element:
     # node.ctx is either ast.Load or ast.Store
     # Store if the subscript is in a left side of an assignment
@@ -465,17 +413,20 @@ def render_subscript(parent: Element, node: ast.Subscript) -> Element:
     return elt
 
 
+@renderers.register(ast.Starred)
 def render_starred(parent: Element, node: ast.Starred) -> Element:
     #print(node.ctx)
     elt = add_node(parent, node, "star-prefix row")
     render(elt, node.value)
     return elt
 
+@renderers.register(ast.Name)
 def render_name(parent: Element, node: ast.Name) -> Element:
     elt = add_node(parent, node, "symbol")
     elt.text = node.id
     return elt
 
+@renderers.register(ast.List)
 def render_list(parent: Element, node: ast.List) -> Element:
     assert isinstance(node.ctx, ast.Load)
     elt = add_node(parent, node, "brackets row")
@@ -486,6 +437,7 @@ def render_list(parent: Element, node: ast.List) -> Element:
     return elt
 
 
+@renderers.register(ast.Tuple)
 def render_tuple(parent: Element, node: ast.Tuple) -> Element:
     #print(node.ctx)
     elt = add_node(parent, node, "parens row")
@@ -504,6 +456,7 @@ def render_tuple(parent: Element, node: ast.Tuple) -> Element:
     return elt
 
 
+@renderers.register(ast.Slice)
 def render_slice(parent: Element, node: ast.Slice):
     elt = add_node(parent, node)
     colon_split = add(elt, "row colon-sep")
@@ -2,84 +2,22 @@
 statement rendering
 """
 
-# types
-from webview.dom.dom import DOM
-from webview.dom.element import Element
 import ast
 
-from .dom import register, div, block, add_node, add, add_text
+from .dom import Element, register, div, block, add_node, add, add_text
 from . import expression
+from ..dispatch import Dispatcher
 
 
-def render(parent: Element, node: ast.stmt):
-    #match type(node):
-    if type(node) == ast.FunctionDef:
-        return render_funcdef(parent, node)
-    elif type(node) == ast.AsyncFunctionDef:
-        raise NotImplementedError("statement.render() not implemented for ast.AsyncFunctionDef")
-    elif type(node) == ast.ClassDef:
-        return render_classdef(parent, node)
-    elif type(node) == ast.Return:
-        return render_return(parent, node)
-
-    elif type(node) == ast.Delete:
-        return render_delete(parent, node)
-    elif type(node) == ast.Assign:
-        return render_assign(parent, node)
-    # 3.12+ feature
-    # TODO: ignore it until pypy reaches 3.12 or stop supporting pypy
-    # case ast.TypeAlias:
-    #     raise NotImplementedError("statement.render() not implemented for ast.TypeAlias")
-    elif type(node) == ast.AugAssign:
-        return render_augassign(parent, node)
-    elif type(node) == ast.AnnAssign:
-        raise NotImplementedError("statement.render() not implemented for ast.AnnAssign")
-
-    elif type(node) == ast.For:
-        return render_for(parent, node)
-    elif type(node) == ast.AsyncFor:
-        raise NotImplementedError("statement.render() not implemented for ast.AsyncFor")
-    elif type(node) == ast.While:
-        return render_while(parent, node)
-    elif type(node) == ast.If:
-        return render_if(parent, node)
-    elif type(node) == ast.With:
-        return render_with(parent, node)
-    elif type(node) == ast.AsyncWith:
-        raise NotImplementedError("statement.render() not implemented for ast.AsyncWith")
-
-    elif type(node) == ast.Match:
-        return render_match(parent, node)
-
-    elif type(node) == ast.Raise:
-        return render_raise(parent, node)
-    elif type(node) == ast.Try:
-        raise NotImplementedError("statement.render() not implemented for ast.Try")
-    elif type(node) == ast.TryStar:
-        raise NotImplementedError("statement.render() not implemented for ast.TryStar")
-    elif type(node) == ast.Assert:
-        return render_assert(parent, node)
-
-    elif type(node) == ast.Import:
-        return render_import(parent, node)
-    elif type(node) == ast.ImportFrom:
-        return render_importfrom(parent, node)
-
-    elif type(node) == ast.Global:
-        raise NotImplementedError("statement.render() not implemented for ast.Global")
-    elif type(node) == ast.Nonlocal:
-        return render_nonlocal(parent, node)
-    elif type(node) == ast.Expr:
-        return expression.render(parent, node.value)
-    elif type(node) == ast.Pass:
-        return render_pass(parent, node)
-    elif type(node) == ast.Break:
-        raise NotImplementedError("statement.render() not implemented for ast.Break")
-    elif type(node) == ast.Continue:
-        raise NotImplementedError("statement.render() not implemented for ast.Continue")
+# the table is filled by the @renderers.register() decorators below
+# unsupported statements are missing from it:
+# AsyncFunctionDef, TypeAlias (3.12+ feature, ignored until pypy reaches 3.12),
+# AnnAssign, AsyncFor, AsyncWith, Try, TryStar, Global, Break, Continue
+renderers = Dispatcher("statement", ast.stmt)
 
-    else:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
+
+def render(parent: Element, node: ast.stmt):
+    return renderers.lookup(node)(parent, node)
 
 
 
@@ -89,6 +27,8 @@ def render_module(parent: Element, node: ast.Module) -> Element:
     elt = add_node(parent, node)
     for stmt in node.body:
         render(elt, stmt)
+        # send the rendered statements once per frame
+        elt.batch.tick()
     return elt
 
 
@@ -96,6 +36,7 @@ def render_module(parent: Element, node: ast.Module) -> Element:
 AST statement node rendering
 """
 
+@renderers.register(ast.Match)
 def render_match(parent: Element, node: ast.Match):
     elt = add_node(parent, node)
     header = add(elt)
@@ -125,41 +66,19 @@ def render_case(parent: Element, node: ast.match_case):
         render(body, stmt)
 
 # TODO: implement missing cases
-def render_pattern(parent: Element, node: ast.pattern):
-    #match type(node):
-    if type(node) == ast.MatchValue:
-        return render_match_value(parent, node)
-    elif type(node) == ast.MatchSingleton:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #return render_match_singleton(parent, node)
-    elif type(node) == ast.MatchSequence:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #return render_match_sequence(parent, node)
-    elif type(node) == ast.MatchMapping:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #return render_match_mapping(parent, node)
-    elif type(node) == ast.MatchClass:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #return render_match_class(parent, node)
-
-    elif type(node) == ast.MatchStar:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #return render_match_star(parent, node)
-
-    elif type(node) == ast.MatchAs:
-        return render_match_as(parent, node)
-    elif type(node) == ast.MatchOr:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #return render_match_or(parent, node)
+# (MatchSingleton, MatchSequence, MatchMapping, MatchClass, MatchStar, MatchOr)
+patterns = Dispatcher("match pattern", ast.pattern)
 
-    else:
-        raise ValueError(f"Unexpected match pattern type: {type(node)}")
+def render_pattern(parent: Element, node: ast.pattern):
+    return patterns.lookup(node)(parent, node)
 
 
+@patterns.register(ast.MatchValue)
 def render_match_value(parent: Element, node: ast.MatchValue):
     elt = add_node(parent, node)
     expression.render(elt, node.value)
 
+@patterns.register(ast.MatchAs)
 def render_match_as(parent: Element, node: ast.MatchAs):
     # TODO: support other cases
     # case [x] as y:
@@ -176,6 +95,7 @@ def render_match_as(parent: Element, node: ast.MatchAs):
 
 
 
+@renderers.register(ast.Raise)
 def render_raise(parent: Element, node: ast.Raise) -> Element:
     # TODO: check if support for this attribute is needed
     assert node.cause is None
@@ -184,6 +104,7 @@ def render_raise(parent: Element, node: ast.Raise) -> Element:
     return elt
 
 
+@renderers.register(ast.Assert)
 def render_assert(parent: Element, node: ast.Assert) -> Element:
     # TODO: support assertion messages
     assert node.msg is None
@@ -191,6 +112,7 @@ def render_assert(parent: Element, node: ast.Assert) -> Element:
     expression.render(elt, node.test)
     return elt
 
+@renderers.register(ast.Import)
 def render_import(parent: Element, node: ast.Import) -> Element:
     elt = add_node(parent, node, "import import-prefix row")
     aliases = add(elt, "aliases row comma-sep")
@@ -214,6 +136,7 @@ def render_alias(parent: Element, node: ast.alias) -> Element:
     return elt
 
 
+@renderers.register(ast.ImportFrom)
 def render_importfrom(parent: Element, node: ast.ImportFrom) -> Element:
     elt = add_node(parent, node, "importfrom row gap")
 
@@ -231,6 +154,7 @@ def render_importfrom(parent: Element, node: ast.ImportFrom) -> Element:
     return elt
 
 
+@renderers.register(ast.FunctionDef)
 def render_funcdef(parent: Element, node: ast.FunctionDef) -> Element:
     # 3.12+ feature
     # instead, see: type_comment
@@ -302,6 +226,7 @@ def render_param(parent: Element, node: ast.arg) -> Element:
         expression.render(typed_group, node.annotation)
     return elt
 
+@renderers.register(ast.ClassDef)
 def render_classdef(parent: Element, node: ast.ClassDef) -> Element:
     # TODO: support decorators
     # TODO: support type_params
@@ -325,6 +250,7 @@ def render_classdef(parent: Element, node: ast.ClassDef) -> Element:
         render(body, stmt)
     return elt
 
+@renderers.register(ast.Return)
 def render_return(parent: Element, node: ast.Return) -> Element:
     elt = add_node(parent, node, "return-prefix row gap")
     if node.value is not None:
@@ -332,6 +258,7 @@ def render_return(parent: Element, node: ast.Return) -> Element:
     return elt
 
 
+@renderers.register(ast.Delete)
 def render_delete(parent: Element, node: ast.Delete):
     elt = add_node(parent, node)
     del_prefixed = add(elt, "del-prefix row gap")
@@ -341,6 +268,7 @@ def render_delete(parent: Element, node: ast.Delete):
         expression.render(item, target)
 
 
+@renderers.register(ast.Assign)
 def render_assign(parent: Element, node: ast.Assign) -> Element:
     assert node.type_comment is None
     # TODO: support multiple targets
@@ -366,6 +294,7 @@ def render_assign(parent: Element, node: ast.Assign) -> Element:
 # format: <node> <op>= <node>
 # <node><gap><op>=<gap><node>
 # (<node> (<op>=) <node>)
+@renderers.register(ast.AugAssign)
 def render_augassign(parent: Element, node: ast.AugAssign) -> Element:
     elt = add_node(parent, node, "row gap")
     target = expression.render(add(elt), node.target)
@@ -381,6 +310,7 @@ def render_augassign(parent: Element, node: ast.AugAssign) -> Element:
 
 
 
+@renderers.register(ast.For)
 def render_for(parent: Element, node: ast.For) -> Element:
     assert node.type_comment is None
     elt = add_node(parent, node)
@@ -414,6 +344,7 @@ def render_for(parent: Element, node: ast.For) -> Element:
 
 
 
+@renderers.register(ast.While)
 def render_while(parent: Element, node: ast.While) -> Element:
     elt = add_node(parent, node)
     header = add(elt, "colon-suffix row")
@@ -427,6 +358,7 @@ def render_while(parent: Element, node: ast.While) -> Element:
     #else_body = [render_statement(statement) for statement in node.orelse]
     return elt
 
+@renderers.register(ast.If)
 def render_if(parent: Element, node: ast.If) -> Element:
     elt = add_node(parent, node)
     if is_elif(node):
@@ -521,6 +453,7 @@ def render_elifs(elt: Element, if_node: ast.If):
 
 
 
+@renderers.register(ast.With)
 def render_with(parent: Element, node: ast.With) -> Element:
     assert node.type_comment is None
     elt = add_node(parent, node)
@@ -551,6 +484,7 @@ def render_withitem(parent: Element, node: ast.withitem) -> Element:
     return elt
 
 
+@renderers.register(ast.Nonlocal)
 def render_nonlocal(parent: Element, node: ast.Nonlocal):
     elt = add_node(parent, node, "row gap nonlocal-prefix")
     names = add(elt, "row comma-sep")
@@ -558,6 +492,13 @@ def render_nonlocal(parent: Element, node: ast.Nonlocal):
         add(names, "row gap", name)
 
 
+# expressions used as statements (function calls, docstrings,...)
+@renderers.register(ast.Expr)
+def render_expr_statement(parent: Element, node: ast.Expr):
+    return expression.render(parent, node.value)
+
+
+@renderers.register(ast.Pass)
 def render_pass(parent: Element, node: ast.Pass) -> Element:
     elt = add_node(parent, node, text="pass")
     return elt
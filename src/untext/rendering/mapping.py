@@ -0,0 +1,119 @@
+"""
+(bidirectional) AST-DOM linking
+
+AST nodes are linked to DOM elements with a unique id.
+The links of a window are kept in its own Registry (not on the AST nodes),
+and are released with it: re-rendering a file starts a new registry with
+only the nodes that are still displayed, closing a window drops it.
+
+This module is shared by the static and dynamic renderers,
+and does not depend on pywebview (the static renderer can run headless).
+"""
+
+import ast
+import threading
+
+
+class Registry:
+    def __init__(self, first_id=1):
+        # last generated id
+        self.count = first_id - 1
+        # id -> AST node
+        self.nodes = {}
+        # AST node -> id
+        # (AST nodes are hashed by identity)
+        self.ids = {}
+        # top-level statement -> id of its wrapper div
+        self.toplevel_ids = {}
+        # id -> DOM Element (dynamic renderer only)
+        self.elements = {}
+        # AST node -> id of a node of the previous version of the file, given
+        # to the node when it is rendered (see static/diff.py)
+        self.reused = {}
+        # same for the wrappers of top-level statements
+        self.reused_toplevel = {}
+
+    def genid(self) -> int:
+        self.count += 1
+        return self.count
+
+    # reserve n consecutive ids (used for cached html), return the first one
+    def reserve(self, n: int) -> int:
+        first = self.count + 1
+        self.count += n
+        return first
+
+    # give a new id to an AST node (or the id it kept from the previous version)
+    def register(self, node: ast.AST) -> int:
+        id = self.reused.pop(node, None)
+        if id is None:
+            id = self.genid()
+        self.add(node, id)
+        return id
+
+    # give an id to the wrapper of a top-level statement
+    def register_toplevel(self, node: ast.stmt) -> int:
+        id = self.reused_toplevel.pop(node, None)
+        if id is None:
+            id = self.genid()
+        self.toplevel_ids[node] = id
+        return id
+
+    def add(self, node: ast.AST, id: int):
+        self.nodes[id] = node
+        self.ids[node] = id
+
+    # registry for a new version of the same file
+    # ids keep growing, so that they never collide with the ids of the
+    # elements still in the DOM
+    def successor(self) -> "Registry":
+        return Registry(first_id=self.count + 1)
+
+    # give the ids of a subtree rendered with another registry (previous
+    # version of the file) to an identical (re-parsed) subtree,
+    # so that its DOM elements can be kept instead of being rendered again
+    # both trees must have the same structure (only positions can differ)
+    def transfer(self, previous: "Registry", old: ast.AST, new: ast.AST):
+        for old_node, new_node in zip(ast.walk(old), ast.walk(new)):
+            id = previous.ids.get(old_node)
+            if id is not None:
+                self.add(new_node, id)
+        toplevel_id = previous.toplevel_ids.get(old)
+        if toplevel_id is not None:
+            self.toplevel_ids[new] = toplevel_id
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+"""
+dynamic rendering
+
+Dynamic renderers create DOM elements one by one through pywebview,
+and find the registry of the rendered window here:
+
+with mapping.use(window.registry):
+    statement.render(parent, node)
+
+pywebview calls the window APIs from several threads,
+so the current registry is thread-local
+"""
+
+class Current(threading.local):
+    registry = None
+
+current = Current()
+
+
+class use:
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = current.registry
+        current.registry = self.registry
+        return self.registry
+
+    def __exit__(self, *exc_info):
+        current.registry = self.previous
@@ -0,0 +1,220 @@
+"""
+node matching
+
+Finds the nodes of the previous version of a file that are still in the new
+version: unchanged, moved or changed in place. It is a simpler version of
+the GumTree matching (Falleri et al., "Fine-grained and accurate source
+code differencing"), in three phases:
+- anchors: the subtrees with a structural hash (see hashes.py) found once
+  in each tree are matched with all their nodes, the biggest first
+  (subtrees smaller than MIN_SIZE, like names and constants, are too
+  common and are left to the other phases)
+- containers: bottom-up, an unmatched node is matched with the unmatched
+  old node of the same type containing the most of its matched descendants,
+  if they are at least MIN_DICE of both subtrees
+- recovery: the unmatched children of two matched nodes are matched when
+  they have the same hash (with their subtrees), then when they have the
+  same type, in order
+The roots of the two trees are matched like the children of two matched
+nodes.
+
+The diff of the DOM (see static/diff.py) gives the ids of the removed and
+replaced elements to the nodes matched with their nodes, so that a moved
+statement or a re-rendered expression keeps the ids of its elements (and
+the state attached to them) instead of getting new ones. Only these
+subtrees are matched (the trees are forests, with several roots): the rest
+of the file is already matched by the diff, and the matching is
+proportional to the size of the change.
+
+Contexts and operators (Load, Store, Add,...) are shared by the nodes of a
+tree, and are not matched.
+"""
+
+import bisect
+
+# smallest subtree matched as an anchor (in nodes, without contexts and operators)
+MIN_SIZE = 3
+
+# smallest share of matched descendants to match two containers
+MIN_DICE = 0.5
+
+
+# array-backed forest of the matched nodes, in pre-order
+class Tree:
+    def __init__(self, roots: list, hashes: dict):
+        self.hashes = hashes
+        # indices of the roots
+        self.roots = []
+        self.nodes = []
+        self.parent = []
+        self.children = []
+        # number of nodes in the subtree of each node
+        # (the subtree of index is [index, index + size[index]))
+        self.size = []
+        # (node, parent index), the next one last
+        stack = [(root, -1) for root in reversed(roots)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(self.nodes)
+            self.nodes.append(node)
+            self.parent.append(parent)
+            self.children.append([])
+            self.size.append(1)
+            if parent == -1:
+                self.roots.append(index)
+            else:
+                self.children[parent].append(index)
+            children = [child for child in iter_children(node) if child._fields]
+            children.reverse()
+            stack.extend([(child, index) for child in children])
+        # children come after their parent: one backward pass is enough
+        for index in range(len(self.nodes) - 1, -1, -1):
+            if self.parent[index] != -1:
+                self.size[self.parent[index]] += self.size[index]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def hash(self, index: int) -> bytes:
+        return self.hashes[self.nodes[index]]
+
+    def type(self, index: int) -> type:
+        return type(self.nodes[index])
+
+
+# child nodes, in the order of the fields
+def iter_children(node) -> list:
+    children = []
+    for name in node._fields:
+        value = getattr(node, name, None)
+        if isinstance(value, list):
+            children.extend([item for item in value if hasattr(item, "_fields")])
+        elif hasattr(value, "_fields"):
+            children.append(value)
+    return children
+
+
+# pairs of items of old and new with the same key, in the same order
+# (greedy: each item of new takes the first item of old after the last pair)
+def in_order(old: list, new: list, old_key, new_key) -> list:
+    positions = {}
+    for position, item in enumerate(old):
+        positions.setdefault(old_key(item), []).append(position)
+    pairs = []
+    last = -1
+    for item in new:
+        candidates = positions.get(new_key(item), [])
+        k = bisect.bisect_right(candidates, last)
+        if k < len(candidates):
+            last = candidates[k]
+            pairs.append((old[last], item))
+    return pairs
+
+
+class Matching:
+    def __init__(self, old_roots: list, new_roots: list, old_hashes: dict, new_hashes: dict):
+        self.old = Tree(old_roots, old_hashes)
+        self.new = Tree(new_roots, new_hashes)
+        # indices of the matched nodes, both ways
+        self.old_of = {}
+        self.new_of = {}
+        self.anchors()
+        self.containers()
+        self.recover_lists(self.old.roots, self.new.roots)
+
+    def match(self, old: int, new: int):
+        self.old_of[new] = old
+        self.new_of[old] = new
+
+    # match two subtrees with the same hash (and the same shape)
+    def subtree(self, old: int, new: int):
+        for k in range(self.new.size[new]):
+            if new + k not in self.old_of and old + k not in self.new_of:
+                self.match(old + k, new + k)
+
+    def anchors(self):
+        old_by_hash = {}
+        for index in range(len(self.old)):
+            old_by_hash.setdefault(self.old.hash(index), []).append(index)
+        new_by_hash = {}
+        for index in range(len(self.new)):
+            new_by_hash.setdefault(self.new.hash(index), []).append(index)
+        unique = []
+        for digest, indices in new_by_hash.items():
+            if len(indices) == 1 and len(old_by_hash.get(digest, [])) == 1 and self.new.size[indices[0]] >= MIN_SIZE:
+                unique.append(indices[0])
+        # the biggest first: the anchors inside them are matched with them
+        unique.sort(key=self.new.size.__getitem__, reverse=True)
+        for new in unique:
+            old = old_by_hash[self.new.hash(new)][0]
+            if new not in self.old_of and old not in self.new_of:
+                self.subtree(old, new)
+
+    def containers(self):
+        # nearest matched descendants of the visited nodes
+        frontiers = {}
+        for new in range(len(self.new) - 1, -1, -1):
+            frontier = []
+            for child in self.new.children[new]:
+                frontier.extend(frontiers.pop(child))
+            if new in self.old_of:
+                frontiers[new] = [new]
+                continue
+            old = self.container(new, frontier)
+            if old == -1:
+                frontiers[new] = frontier
+                continue
+            self.match(old, new)
+            self.recover(old, new)
+            frontiers[new] = [new]
+
+    # best unmatched old node for new, from its matched descendants
+    # -1 if none
+    def container(self, new: int, frontier: list) -> int:
+        kind = self.new.type(new)
+        # old candidate -> size of the matched descendants it contains
+        common = {}
+        for descendant in frontier:
+            old = self.old.parent[self.old_of[descendant]]
+            while old != -1 and old not in self.new_of:
+                if self.old.type(old) is kind:
+                    common[old] = common.get(old, 0) + self.new.size[descendant]
+                old = self.old.parent[old]
+        best = -1
+        best_dice = MIN_DICE
+        for old, size in common.items():
+            dice = 2 * size / (self.old.size[old] + self.new.size[new])
+            if dice >= best_dice:
+                best = old
+                best_dice = dice
+        return best
+
+    # match the children of two matched nodes
+    def recover(self, old: int, new: int):
+        self.recover_lists(self.old.children[old], self.new.children[new])
+
+    def recover_lists(self, old_children: list, new_children: list):
+        old_children = [child for child in old_children if child not in self.new_of]
+        new_children = [child for child in new_children if child not in self.old_of]
+        for old_child, new_child in in_order(old_children, new_children, self.old.hash, self.new.hash):
+            self.subtree(old_child, new_child)
+        old_children = [child for child in old_children if child not in self.new_of]
+        new_children = [child for child in new_children if child not in self.old_of]
+        for old_child, new_child in in_order(old_children, new_children, self.old.type, self.new.type):
+            self.match(old_child, new_child)
+            self.recover(old_child, new_child)
+
+    # {new node: old node}
+    def result(self) -> dict:
+        matches = {}
+        for new, old in self.old_of.items():
+            matches[self.new.nodes[new]] = self.old.nodes[old]
+        return matches
+
+
+# {new node: matched old node} for the nodes of the subtrees of two versions
+# of a tree (old_roots, new_roots: roots of the subtrees, [old], [new] for
+# the whole trees)
+# (hashes: structural hashes of the trees, see hashes.py)
+def match(old_roots: list, new_roots: list, old_hashes: dict, new_hashes: dict) -> dict:
+    return Matching(old_roots, new_roots, old_hashes, new_hashes).result()
@@ -1 +1 @@
-from . import statement, expression, html
+from . import statement, expression, html, diff
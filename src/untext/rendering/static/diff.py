@@ -0,0 +1,414 @@
+"""
+tree diff patches
+
+Re-rendering a file after an edit only changes the DOM where the tree
+changed: the old and the new trees are compared field by field, and the
+differences become a patch of DOM operations on the elements that are
+already displayed, keyed by their ids:
+    ["replace", id, html]          replace the element of a node
+    ["insert", id, where, html]    insert statements "before" or "after"
+                                   the element of a statement (or "append"
+                                   them to the module element, id None)
+    ["remove", id]
+    ["text", id, selector, text]   set the text of an element of a node
+The patch is applied in one evaluate_js call (applyPatch(), see CodeWindow).
+
+Comparison (see Diff.node()):
+- nodes of different types are replaced
+- text fields (names, constants of the same type,...) are updated in place
+  (see TEXT_FIELDS)
+- child nodes are compared recursively
+- statement lists are matched with a longest common subsequence of their
+  structural hashes (see hashes.py, statements only moved keep their
+  elements), the statements between
+  two matches are compared one to one, and the extra ones are removed or
+  inserted
+- other lists (arguments, elements,...) are compared one to one when they
+  have the same length
+When a difference cannot be patched where it is (a node without element, a
+field without text update, a different number of arguments,...), the
+closest enclosing node that can be rendered alone is replaced instead.
+
+A one-character change in a big module is then a text update or the
+replacement of a small expression, instead of a whole top-level statement.
+
+Unchanged and updated nodes keep their ids in the new registry. The nodes
+of the replaced and inserted html keep the ids of the nodes matched with
+them in the old tree (see rendering/matching.py) when the elements of these
+nodes are removed by the patch: a moved statement is removed and inserted
+again with the same ids, and only the new nodes get new ids.
+The removed and replaced elements leave the document before the new html
+is inserted (see applyPatch()), so that an id is never displayed twice.
+"""
+
+import ast
+import difflib
+import json
+
+from . import html, statement, expression
+from .. import matching
+from untext import hashes
+
+
+# (node type, field) -> selector of the element displaying the field,
+# in the element of the node
+TEXT_FIELDS = {
+    (ast.Name, "id"): ".symbol",
+    (ast.FunctionDef, "name"): ".def-prefix",
+    (ast.AsyncFunctionDef, "name"): ".async-def-prefix",
+    (ast.arg, "arg"): ".parameter-name",
+}
+
+# above (statements before * statements after), the statements between the
+# common prefix and suffix are matched with difflib instead (not minimal)
+LCS_LIMIT = 250000
+
+
+"""
+statement list matching
+"""
+
+# index pairs (i, j) of a longest common subsequence of a and b
+def common_subsequence(a: list, b: list) -> list:
+    # edits are local: skip the common prefix and suffix first
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[len(a) - 1 - end] == b[len(b) - 1 - end]:
+        end += 1
+    middle_a = a[start:len(a) - end]
+    middle_b = b[start:len(b) - end]
+    if len(middle_a) * len(middle_b) > LCS_LIMIT:
+        middle = matching_blocks(middle_a, middle_b)
+    else:
+        middle = lcs(middle_a, middle_b)
+    pairs = [(i, i) for i in range(start)]
+    pairs.extend([(i + start, j + start) for i, j in middle])
+    pairs.extend([(len(a) - end + k, len(b) - end + k) for k in range(end)])
+    return pairs
+
+
+def lcs(a: list, b: list) -> list:
+    n = len(a)
+    m = len(b)
+    # lengths[i][j]: length of a longest common subsequence of a[i:] and b[j:]
+    lengths = [[0] * (m + 1) for i in range(n + 1)]
+    for i in range(n - 1, -1, -1):
+        row = lengths[i]
+        below = lengths[i + 1]
+        for j in range(m - 1, -1, -1):
+            if a[i] == b[j]:
+                row[j] = below[j + 1] + 1
+            else:
+                row[j] = max(below[j], row[j + 1])
+    pairs = []
+    i = 0
+    j = 0
+    while i < n and j < m:
+        if a[i] == b[j]:
+            pairs.append((i, j))
+            i += 1
+            j += 1
+        elif lengths[i + 1][j] >= lengths[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+    return pairs
+
+
+def matching_blocks(a: list, b: list) -> list:
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    pairs = []
+    for block in matcher.get_matching_blocks():
+        pairs.extend([(block.a + k, block.b + k) for k in range(block.size)])
+    return pairs
+
+
+"""
+tree comparison
+"""
+
+# nodes that can be rendered alone (and replaced)
+def renderable(node: ast.AST) -> bool:
+    if isinstance(node, ast.stmt):
+        return type(node) in statement.renderers
+    if isinstance(node, ast.expr):
+        return type(node) in expression.renderers
+    return False
+
+
+class Diff:
+    def __init__(self, registry, old_hashes: dict, new_hashes: dict):
+        # registry of the old tree
+        self.registry = registry
+        # structural hashes of the nodes of both trees
+        self.old_hashes = old_hashes
+        self.new_hashes = new_hashes
+        # (old, new) nodes updated in place: the new node takes the id of the old one
+        self.pairs = []
+        # (old, new) unchanged statements
+        self.kept = []
+        # operations on AST nodes, turned into html by patch()
+        # ("replace", id, new node, top-level, old node)
+        # ("insert", new anchor or None, where, [new statements], top-level)
+        # ("remove", id, old statement, top-level)
+        # ("text", id, selector, text)
+        self.ops = []
+
+    # id of the element of a statement
+    # (top-level statements are wrapped in their own element)
+    def element(self, node: ast.AST, toplevel=False):
+        if toplevel:
+            return self.registry.toplevel_ids.get(node)
+        # expression statements are displayed as their expression
+        if isinstance(node, ast.Expr):
+            return self.registry.ids.get(node.value)
+        return self.registry.ids.get(node)
+
+    # whether the element of a paired statement is still displayed, with
+    # an id, after the changes recorded since ops[start]
+    # (a replaced element is rendered again, and only the top-level
+    # wrappers are sure to get an id)
+    def displayed(self, old: ast.stmt, toplevel: bool, start: int) -> bool:
+        id = self.element(old, toplevel)
+        if id is None:
+            return False
+        if toplevel:
+            return True
+        for op in self.ops[start:]:
+            if op[0] == "replace" and op[1] == id:
+                return False
+        return True
+
+    def mark(self) -> tuple:
+        return len(self.pairs), len(self.kept), len(self.ops)
+
+    # forget the changes recorded since mark()
+    def rollback(self, mark: tuple):
+        del self.pairs[mark[0]:]
+        del self.kept[mark[1]:]
+        del self.ops[mark[2]:]
+
+    # record the changes from old to new, in place or with a replacement
+    # return False if the enclosing node must be replaced instead
+    def node(self, old: ast.AST, new: ast.AST, toplevel=False) -> bool:
+        mark = self.mark()
+        if self.update(old, new):
+            self.pairs.append((old, new))
+            return True
+        self.rollback(mark)
+        id = self.element(old, toplevel)
+        if id is None or not renderable(new):
+            return False
+        self.ops.append(("replace", id, new, toplevel, old))
+        return True
+
+    # record the changes from old to new, keeping the element of old
+    def update(self, old: ast.AST, new: ast.AST) -> bool:
+        if type(old) is not type(new):
+            return False
+        # if/else and if/elif/else chains have different layouts
+        if isinstance(old, ast.If) and statement.is_elif(old) != statement.is_elif(new):
+            return False
+        for name in old._fields:
+            if not self.field(old, name, getattr(old, name, None), getattr(new, name, None)):
+                return False
+        return True
+
+    def field(self, parent: ast.AST, name: str, old, new) -> bool:
+        if isinstance(old, ast.AST) and isinstance(new, ast.AST):
+            return self.node(old, new)
+        if isinstance(old, list) and isinstance(new, list):
+            # (else: blocks appear and disappear with their header)
+            if old and new and isinstance(old[0], ast.stmt):
+                return self.body(parent, old, new)
+            if len(old) != len(new):
+                return False
+            for old_item, new_item in zip(old, new):
+                if not self.field(parent, name, old_item, new_item):
+                    return False
+            return True
+        if type(old) is type(new) and old == new:
+            return True
+        return self.text(parent, name, new)
+
+    # a scalar field changed: update its text if possible
+    def text(self, node: ast.AST, name: str, value) -> bool:
+        id = self.registry.ids.get(node)
+        if id is None:
+            return False
+        if isinstance(node, ast.Constant) and name == "value":
+            if type(node.value) is not type(value):
+                return False
+            if isinstance(value, str):
+                # like expression.html_serialize_str(), without the html escaping
+                self.ops.append(("text", id, ".string-literal", json.dumps(value)))
+            else:
+                self.ops.append(("text", id, ".literal", repr(value)))
+            return True
+        selector = TEXT_FIELDS.get((type(node), name))
+        if selector is None or not isinstance(value, str):
+            return False
+        self.ops.append(("text", id, selector, value))
+        return True
+
+    def body(self, parent: ast.AST, old: list, new: list) -> bool:
+        # lazy body not displayed yet: it is rendered from the new tree
+        # when it is (the definition keeps its id)
+        if isinstance(parent, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and not self.rendered(old):
+            return True
+        return self.statements(old, new)
+
+    # whether a body was rendered: some of its nodes have an element
+    # (the first statement may not have one, like an augmented assignment)
+    def rendered(self, body: list) -> bool:
+        for stmt in body:
+            for node in ast.walk(stmt):
+                if node in self.registry.ids:
+                    return True
+        return False
+
+    # compare two statement lists (see the module docstring)
+    def statements(self, old: list, new: list, toplevel=False) -> bool:
+        matches = common_subsequence([self.old_hashes[stmt] for stmt in old], [self.new_hashes[stmt] for stmt in new])
+        # end of both lists
+        matches.append((len(old), len(new)))
+        # last statement displayed before the current one (in the new order)
+        previous = None
+        # False when a statement without its own element (augmented
+        # assignments, comparisons,...) is displayed after previous:
+        # statements inserted "after" previous would land before it
+        anchored = True
+        i = 0
+        j = 0
+        for match_i, match_j in matches:
+            old_gap = old[i:match_i]
+            new_gap = new[j:match_j]
+            paired = min(len(old_gap), len(new_gap))
+            for k in range(paired):
+                start = len(self.ops)
+                if not self.node(old_gap[k], new_gap[k], toplevel):
+                    return False
+                anchored = self.displayed(old_gap[k], toplevel, start)
+                if anchored:
+                    previous = new_gap[k]
+            for old_stmt in old_gap[paired:]:
+                id = self.element(old_stmt, toplevel)
+                if id is None:
+                    return False
+                self.ops.append(("remove", id, old_stmt, toplevel))
+            inserted = new_gap[paired:]
+            if inserted:
+                # the enclosing node is replaced instead
+                if not anchored:
+                    return False
+                if previous is not None:
+                    self.ops.append(("insert", previous, "after", inserted, toplevel))
+                elif match_j < len(new):
+                    if self.element(old[match_i], toplevel) is None:
+                        return False
+                    self.ops.append(("insert", new[match_j], "before", inserted, toplevel))
+                elif toplevel:
+                    self.ops.append(("insert", None, "append", inserted, toplevel))
+                else:
+                    return False
+            if match_i < len(old):
+                self.kept.append((old[match_i], new[match_j]))
+                anchored = self.element(old[match_i], toplevel) is not None
+                if anchored:
+                    previous = new[match_j]
+            i = match_i + 1
+            j = match_j + 1
+        return True
+
+
+"""
+patches
+"""
+
+# compare two versions of a module rendered with registry
+# (the new one rendered with the current html.settings)
+# the structural hashes of the trees are computed if they are not given
+# return the registry of the new tree (the previous registry can be
+# released with the old tree) and the patch of the DOM (see module docstring)
+def patch(registry, old: ast.Module, new: ast.Module, old_hashes=None, new_hashes=None) -> tuple:
+    if old_hashes is None:
+        old_hashes = hashes.compute(old)
+    if new_hashes is None:
+        new_hashes = hashes.compute(new)
+    diff = Diff(registry, old_hashes, new_hashes)
+    diff.statements(old.body, new.body, toplevel=True)
+
+    new_registry = registry.successor()
+    for old_node, new_node in diff.kept:
+        new_registry.transfer(registry, old_node, new_node)
+    for old_node, new_node in diff.pairs:
+        id = registry.ids.get(old_node)
+        if id is not None:
+            new_registry.add(new_node, id)
+        toplevel_id = registry.toplevel_ids.get(old_node)
+        if toplevel_id is not None:
+            new_registry.toplevel_ids[new_node] = toplevel_id
+    reuse_ids(diff.ops, registry, new_registry, old_hashes, new_hashes)
+
+    # the new elements are rendered in order: insertions after a replaced
+    # statement find the id of its new element
+    ops = []
+    for op in diff.ops:
+        if op[0] == "replace":
+            ops.append(["replace", op[1], render(op[2], op[3], new_registry)])
+        elif op[0] == "insert":
+            anchor = None
+            if op[1] is not None:
+                anchor = element_id(op[1], op[4], new_registry)
+            chunks = [render(stmt, op[4], new_registry) for stmt in op[3]]
+            ops.append(["insert", anchor, op[2], "".join(chunks)])
+        elif op[0] == "remove":
+            ops.append(["remove", op[1]])
+        else:
+            ops.append(list(op))
+    return new_registry, ops
+
+
+# give the ids of the elements removed by the patch to the new nodes
+# matched with their nodes, when they are rendered
+def reuse_ids(ops: list, registry, new_registry, old_hashes: dict, new_hashes: dict):
+    # nodes of the removed elements, and of the new html
+    removed = []
+    rendered = []
+    for op in ops:
+        if op[0] == "replace":
+            removed.append(op[4])
+            rendered.append(op[2])
+        elif op[0] == "remove":
+            removed.append(op[2])
+        elif op[0] == "insert":
+            rendered.extend(op[3])
+    if not removed or not rendered:
+        return
+    matches = matching.match(removed, rendered, old_hashes, new_hashes)
+    for new_node, old_node in matches.items():
+        id = registry.ids.get(old_node)
+        if id is not None:
+            new_registry.reused[new_node] = id
+        toplevel_id = registry.toplevel_ids.get(old_node)
+        if toplevel_id is not None:
+            new_registry.reused_toplevel[new_node] = toplevel_id
+
+
+def render(node: ast.AST, toplevel: bool, registry) -> str:
+    if toplevel:
+        return html.render(statement.render_toplevel(node), registry)
+    if isinstance(node, ast.stmt):
+        return html.render(statement.render(node), registry)
+    return html.render(expression.render(node), registry)
+
+
+# id of the element of a new statement, in the new registry
+def element_id(node: ast.stmt, toplevel: bool, registry) -> int:
+    if toplevel:
+        return registry.toplevel_ids[node]
+    if isinstance(node, ast.Expr):
+        return registry.ids[node.value]
+    return registry.ids[node]
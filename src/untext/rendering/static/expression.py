@@ -48,7 +48,6 @@ expr = BoolOp(boolop op, expr* values)
 """
 
 
-from webview.dom.element import Element
 import ast
 
 import html as pyhtml
@@ -58,69 +57,18 @@ import json
 from .html import text, element, debug, register_node, div
 from . import html
 
+from ..dispatch import Dispatcher
+
+
+# the table is filled by the @renderers.register() decorators below
+# unsupported expressions are missing from it:
+# NamedExpr, Lambda, Set, SetComp, DictComp, GeneratorExp,
+# Interpolation and TemplateStr (3.14+ features)
+renderers = Dispatcher("expression", ast.expr)
+
 
 def render(node: ast.expr):
-    #match type(node):
-    if type(node) == ast.BoolOp:
-        yield from render_boolop(node)
-    elif type(node) == ast.NamedExpr:
-        raise NotImplementedError('expression.render() not implemented for ast.NamedExpr')
-    elif type(node) == ast.BinOp:
-        yield from render_binop(node)
-    elif type(node) == ast.UnaryOp:
-        yield from render_unaryop(node)
-    elif type(node) == ast.Lambda:
-        raise NotImplementedError('expression.render() not implemented for ast.Lambda')
-    elif type(node) == ast.IfExp:
-        yield from render_ifexp(node)
-    elif type(node) == ast.Dict:
-        yield from render_dict(node)
-    elif type(node) == ast.Set:
-        raise NotImplementedError('expression.render() not implemented for ast.Set')
-    elif type(node) == ast.ListComp:
-        yield from render_list_comprehension(node)
-    elif type(node) == ast.SetComp:
-        raise NotImplementedError('expression.render() not implemented for ast.SetComp')
-    elif type(node) == ast.DictComp:
-        raise NotImplementedError('expression.render() not implemented for ast.DictComp')
-    elif type(node) == ast.GeneratorExp:
-        raise NotImplementedError('expression.render() not implemented for ast.GeneratorExp')
-    elif type(node) == ast.Await:
-        raise NotImplementedError('expression.render() not implemented for ast.Await')
-    elif type(node) == ast.Yield:
-        yield from render_yield(node)
-    elif type(node) == ast.YieldFrom:
-        yield from render_yieldfrom(node)
-    elif type(node) == ast.Compare:
-        yield from render_compare(node)
-    elif type(node) == ast.Call:
-        yield from render_call(node)
-    elif type(node) == ast.FormattedValue:
-        yield from render_formatted_value(node)
-    # case ast.Interpolation:
-    #     raise NotImplementedError('expression.render() not implemented for ast.Interpolation')
-    elif type(node) == ast.JoinedStr:
-        yield from render_joinedstr(node)
-    # case ast.TemplateStr:
-    #     raise NotImplementedError('expression.render() not implemented for ast.TemplateStr')
-    elif type(node) == ast.Constant:
-        yield from render_constant(node)
-    elif type(node) == ast.Attribute:
-        yield from render_attribute(node)
-    elif type(node) == ast.Subscript:
-        yield from render_subscript(node)
-    elif type(node) == ast.Starred:
-        yield from render_starred(node)
-    elif type(node) == ast.Name:
-        yield from render_name(node)
-    elif type(node) == ast.List:
-        yield from render_list(node)
-    elif type(node) == ast.Tuple:
-        yield from render_tuple(node)
-    elif type(node) == ast.Slice:
-        yield from render_slice(node)
-    else:
-        raise ValueError(f"Unexpected ast expression type: {type(node)}")
+    return renderers.lookup(node)(node)
 
 
 """
@@ -130,11 +78,12 @@ AST expression rendering
 """
 
 
+@renderers.register(ast.BoolOp)
 @register_node
 def render_boolop(node: ast.BoolOp):
     values = [render(v) for v in node.values]
     result = html.items(f"row gap {read_boolop(node.op)}-sep", "row gap", values)
-    yield from result
+    return result
 
 
 # part of render_boolop
@@ -162,6 +111,7 @@ in practice, css support is lacking, so we need this:
   <div class="operand">b</div>
 </div>
 """
+@renderers.register(ast.BinOp)
 @register_node
 def render_binop(node: ast.BinOp):
     left = render(node.left)
@@ -173,7 +123,7 @@ def render_binop(node: ast.BinOp):
                 attr={"operator": read_binaryop(node.op)})
 
     result = element("operation row gap", left, right)
-    yield from result
+    return result
 
 
 def read_binaryop(op: ast.operator):
@@ -185,35 +135,36 @@ def read_binaryop(op: ast.operator):
     elif isinstance(op, ast.Mult):
         return "*"
     elif isinstance(op, ast.Div):
-        pass
+        return "/"
     elif isinstance(op, ast.FloorDiv):
-        pass
+        return "//"
     elif isinstance(op, ast.Mod):
-        pass
+        return "%"
     elif isinstance(op, ast.Pow):
-        pass
+        return "**"
     elif isinstance(op, ast.LShift):
-        pass
+        return "<<"
     elif isinstance(op, ast.RShift):
-        pass
+        return ">>"
     elif isinstance(op, ast.BitOr):
         return "|"
     elif isinstance(op, ast.BitXor):
-        pass
+        return "^"
     elif isinstance(op, ast.BitAnd):
-        pass
+        return "&"
     elif isinstance(op, ast.MatMult):
-        pass
+        return "@"
     raise NotImplementedError(f"unknown binary operator: {op}")
 
 
 # TODO: go back to previous "operator separators" and replace them by DOM nodes
 # (operators have semantic meaning, they are not just syntax)
 # (keep the css for infix inlining if needed)
+@renderers.register(ast.UnaryOp)
 def render_unaryop(node: ast.UnaryOp):
     value = render(node.operand)
     op = read_unaryop(node.op)
-    yield from div(value,
+    return div(value,
                    classes="unary-operation row gap",
                    attr={"operator": op})
 
@@ -231,6 +182,7 @@ def read_unaryop(op: ast.unaryop):
         raise NotImplementedError("unknown unary operator")
 
 
+@renderers.register(ast.IfExp)
 @register_node
 def render_ifexp(node: ast.IfExp):
     test = render(node.test)
@@ -242,10 +194,11 @@ def render_ifexp(node: ast.IfExp):
     else_part = element("else-prefix row gap", else_expr)
 
     if_expr = element("row gap", test, if_part, else_part)
-    yield from element("if-expression", if_expr)
+    return element("if-expression", if_expr)
 
 
 # TODO: test with more kinds of literals than "{}"
+@renderers.register(ast.Dict)
 def render_dict(node: ast.Dict):
     # TODO: multi-line rendering:
     # ... {
@@ -269,9 +222,10 @@ def render_dict(node: ast.Dict):
 
     items = html.items("comma-sep", "", rows)
     result = element("row braces", items)
-    yield from element("dict", result)
+    return element("dict", result)
 
 
+@renderers.register(ast.ListComp)
 @register_node
 def render_list_comprehension(node: ast.ListComp):
     # TODO: test with more than 1 generator
@@ -281,7 +235,7 @@ def render_list_comprehension(node: ast.ListComp):
     elt = render(node.elt)
     generators = element("row gap", *generators)
     content = element("row gap", elt, generators)
-    yield from element("list-comprehension brackets row", content)
+    return element("list-comprehension brackets row", content)
 
 
 @register_node
@@ -298,22 +252,32 @@ def render_comprehension_generator(node: ast.comprehension):
     target = render(node.target)
     iterated = render(node.iter)
     generator = html.items("in-sep row gap", "row gap", [target, iterated])
-    yield from element("comprehension-generator for-prefix row gap", generator)
+    return element("comprehension-generator for-prefix row gap", generator)
 
 
 
+@renderers.register(ast.Yield)
 @register_node
 def render_yield(node):
     expr = render(node.value)
-    yield from element("yield yield-prefix row gap", expr)
+    return element("yield yield-prefix row gap", expr)
 
 
+@renderers.register(ast.YieldFrom)
 @register_node
 def render_yieldfrom(node):
     expr = render(node.value)
-    yield from element("yield-from yield-from-prefix row gap", expr)
+    return element("yield-from yield-from-prefix row gap", expr)
+
+
+@renderers.register(ast.Await)
+@register_node
+def render_await(node: ast.Await):
+    expr = render(node.value)
+    return element("await await-prefix row gap", expr)
 
 
+@renderers.register(ast.Compare)
 def render_compare(node: ast.Compare):
     # in python, comparisons can be complex sequences, like:
     # 1 < x < y < 6
@@ -327,7 +291,7 @@ def render_compare(node: ast.Compare):
         cmp = render(cmp)
         elts.append(op)
         elts.append(cmp)
-    yield from element("compare row gap", *elts)
+    return element("compare row gap", *elts)
 
 
 def read_op(op: ast.operator):
@@ -358,6 +322,7 @@ def read_op(op: ast.operator):
 
 
 # TODO: add more DOM encoding
+@renderers.register(ast.Call)
 @register_node
 def render_call(node: ast.Call):
     func = render(node.func)
@@ -365,7 +330,7 @@ def render_call(node: ast.Call):
     kwargs = [render_keyword_arg(kwarg) for kwarg in node.keywords]
     args = html.items("comma-sep row", "row gap", args + kwargs)
     args = element("parens row", args)
-    yield from element("call row", func, args)
+    return element("call row", func, args)
 
 
 # part of render_call(), also used by statement.render_class()
@@ -373,9 +338,10 @@ def render_call(node: ast.Call):
 def render_keyword_arg(node: ast.keyword):
     kw = text(node.arg)
     val = render(node.value)
-    yield from html.items("keyword-argument equal-sep row", "row", [kw, val])
+    return html.items("keyword-argument equal-sep row", "row", [kw, val])
 
 
+@renderers.register(ast.FormattedValue)
 @register_node
 def render_formatted_value(node: ast.FormattedValue):
     # TODO: support other conversion types:
@@ -388,12 +354,13 @@ def render_formatted_value(node: ast.FormattedValue):
     # TODO: support this attribute
     assert node.format_spec is None
     expr = render(node.value)
-    yield from element("f-value", expr)
+    return element("f-value", expr)
 
 
 # f"{x}<text>{y}"
 # f-"-({(<x>)}-(<json-encoded text>)-({<y>}))-"
 # TODO: remove unneeded .string-literal classes
+@renderers.register(ast.JoinedStr)
 @register_node
 def render_joinedstr(node: ast.JoinedStr):
     parts = []
@@ -417,9 +384,10 @@ def render_joinedstr(node: ast.JoinedStr):
 
     quoted = element("quotes row", *parts)
     string_styled = element("string-literal", quoted)
-    yield from element("row f-prefix", string_styled)
+    return element("row f-prefix", string_styled)
 
 
+@renderers.register(ast.Constant)
 @register_node
 def render_constant(node: ast.Constant):
     assert node.kind is None
@@ -433,11 +401,12 @@ def render_constant(node: ast.Constant):
         const = div(txt, classes="literal", attr={"const-type": "str"})
     else:
         typename = type(node.value).__name__
-        value_text = text(repr(node.value))
+        # (bytes can contain html)
+        value_text = text(pyhtml.escape(repr(node.value)))
         const = div(value_text,
                   classes="literal",
                   attr={"const-type": typename})
-    yield from element("constant", const)
+    return element("constant", const)
 
 
 # used by render_constant and render_joinedstr
@@ -445,14 +414,16 @@ def html_serialize_str(txt: str) -> str:
     return pyhtml.escape(json.dumps(txt))
 
 
+@renderers.register(ast.Attribute)
 @register_node
 def render_attribute(node: ast.Attribute):
     obj = render(node.value)
     attr = text(node.attr)
     row = html.items("attribute row dot-sep", "row", [obj, attr])
-    yield from row
+    return row
 
 
+@renderers.register(ast.Subscript)
 @register_node
 def render_subscript(node: ast.Subscript):
     # node.ctx is either ast.Load or ast.Store
@@ -461,50 +432,52 @@ def render_subscript(node: ast.Subscript):
     index = render(node.slice)
     bracketed = element("brackets row", index)
     indexed = render(node.value)
-    yield from element("subscript row", indexed, bracketed)
+    return element("subscript row", indexed, bracketed)
 
 
+@renderers.register(ast.Starred)
 @register_node
 def render_starred(node: ast.Starred):
     expr = render(node.value)
-    yield from element("starred star-prefix row", expr)
+    return element("starred star-prefix row", expr)
 
 
+@renderers.register(ast.Name)
 @register_node
 def render_name(node: ast.Name):
-    yield from element("symbol", text(node.id))
+    return element("symbol", text(node.id))
 
 
+@renderers.register(ast.List)
 @register_node
 def render_list(node: ast.List):
     assert isinstance(node.ctx, ast.Load)
     elts = [render(x) for x in node.elts]
     elts = html.items("comma-sep row", "row gap", elts)
-    yield from element("list brackets row", elts)
+    return element("list brackets row", elts)
 
 
+@renderers.register(ast.Tuple)
 @register_node
 def render_tuple(node: ast.Tuple):
     #print(node.ctx)
     # TODO: cleanup this branching
     if len(node.elts) == 0:
-        yield from element("tuple parens row")
-        return
+        return element("tuple parens row")
     if len(node.elts) == 1:
         # display a single item with a comma after it
         expr = render(node.elts[0])
         # empty element for the comma
         empty_elt = element()
         comma_separated = html.items("comma-sep row", "row", [expr, empty_elt])
-        yield from element("tuple parens row", comma_separated)
-        return
+        return element("tuple parens row", comma_separated)
     else:
         elts = [render(e) for e in node.elts]
         elts = html.items("comma-sep row", "row gap", elts)
-        yield from element("tuple parens row", elts)
-        return
+        return element("tuple parens row", elts)
 
 
+@renderers.register(ast.Slice)
 @register_node
 def render_slice(node: ast.Slice):
     # a slice must have a left and right part separated by :, even if they are implicit
@@ -515,5 +488,5 @@ def render_slice(node: ast.Slice):
         parts[1] = render(node.upper)
     if node.step is not None:
         parts.append(render(node.step))
-    yield from html.items("slice row colon-sep", "row", parts)
+    return html.items("slice row colon-sep", "row", parts)
 
@@ -4,35 +4,73 @@ general HTML generation utilities
 
 # types
 from ast import AST
-from typing  import Tuple, Generator, List
+import html as pyhtml
+from typing  import Generator, List
+import threading
 
 HTMLGenerator = Generator[str, None, None] # yield str, receive None from send(), return None
 
-HTML = Tuple[HTMLGenerator]
+# str, list or tuple of fragments, Node or Deferred (see below)
+HTMLFragment = str | list | tuple
 Classes = str | List[str]
 
 
-# decorator for HTML generators
+# decorator for html renderers
 # usage:
 # @debug
 # def render_...
 def debug(f):
     def g(node):
-        for x in f(node):
-            print(x)
-            yield x
+        fragment = f(node)
+        print(fragment)
+        return fragment
     return g
 
 
 
 
+"""
+rendering settings
+
+pywebview calls the window APIs from several threads,
+so the settings are thread-local
+"""
+
+class Settings(threading.local):
+    # render function and class bodies as placeholders,
+    # which are rendered later with statement.render_body()
+    lazy_bodies = False
+
+settings = Settings()
+
+
+# change the settings of the current thread for a rendering:
+# with html.render_settings(lazy_bodies=True):
+#     page = html.render(statement.render_module(tree), registry)
+# (deferred fragments only run when written, which must happen inside the with block)
+class render_settings:
+    def __init__(self, lazy_bodies=False):
+        self.values = {"lazy_bodies": lazy_bodies}
+        self.previous = {}
+
+    def __enter__(self):
+        for key, value in self.values.items():
+            self.previous[key] = getattr(settings, key)
+            setattr(settings, key, value)
+
+    def __exit__(self, *exc_info):
+        for key, value in self.previous.items():
+            setattr(settings, key, value)
+
+
+
 """
 (bidirectional) AST-DOM linking
 
-AST nodes are linked to DOM elements with a shared unique id
+AST nodes are linked to DOM elements with a shared unique id,
+kept in the registry of the window (see mapping.Registry)
 """
-# TODO: centralize IDs
-from untext.rendering.dynamic.dom import genid, register, ast_mapping
+from ..mapping import Registry
 
 #def register(ast_node: AST, dom_element: Element):
 #    n = genid()
@@ -43,73 +81,173 @@ from untext.rendering.dynamic.dom import genid, register, ast_mapping
 #    ast_mapping[n] = ast_node
 
 """
-basic wrappers for html string formatting
+html fragments
+
+Renderers do not build strings: they return html fragments, which are
+turned into html by a backend (see below). A fragment is either:
+- a str
+- a list or tuple of fragments
+- a Node: <div> of an AST node, with the id of the node
+- a Deferred: function called when the html is written, returning a fragment
+
+Ids are generated by the registry given to the backend when the html is
+written, in document order, so both backends produce the same html
+(with the same ids).
+"""
+
+class Node:
+    __slots__ = ("node", "items")
+
+    def __init__(self, node: AST, items: tuple):
+        self.node = node
+        self.items = items
+
+    # link the AST node to a new id, return the opening tag of its div
+    def open_tag(self, registry: Registry) -> str:
+        # no Element in the registry: it does not exist yet and will have an id anyway
+        id = registry.register(self.node)
+        return f"<div id='{id}'>"
+
+
+# for html depending on what is written before it (ids)
+# function(registry, *args) is called when the html is written
+class Deferred:
+    __slots__ = ("function", "args")
 
-HTML output is generated in ~O(n) where n is the size of the html code.
-This is possible because of generators.
-Expect lots of yield statements.
+    def __init__(self, function, args: tuple):
+        self.function = function
+        self.args = args
+
+    def __call__(self, registry: Registry) -> HTMLFragment:
+        return self.function(registry, *self.args)
+
+
+"""
+backends
+
+write() appends html strings to a shared buffer, with an explicit stack:
+each string is handled once, whatever its depth in the fragment tree.
+
+generate() is a recursive generator: each string goes through one
+generator frame per nesting level (slower, but it can be consumed lazily).
+"""
+
+def write(fragment: HTMLFragment, out: list, registry: Registry):
+    append = out.append
+    # fragments left to write, the next one last
+    stack = [fragment]
+    push = stack.append
+    extend = stack.extend
+    pop = stack.pop
+    while stack:
+        item = pop()
+        kind = type(item)
+        if kind is str:
+            append(item)
+        elif kind is list or kind is tuple:
+            extend(reversed(item))
+        elif kind is Node:
+            append(item.open_tag(registry))
+            push("</div>")
+            extend(reversed(item.items))
+        elif kind is Deferred:
+            push(item(registry))
+        else:
+            raise TypeError(f"not an html fragment: {repr(item)}")
+
+
+# usage: html.render(statement.render_module(tree), registry)
+def render(fragment: HTMLFragment, registry: Registry) -> str:
+    out = []
+    write(fragment, out, registry)
+    return "".join(out)
+
+
+def generate(fragment: HTMLFragment, registry: Registry) -> HTMLGenerator:
+    kind = type(fragment)
+    if kind is str:
+        yield fragment
+    elif kind is list or kind is tuple:
+        for item in fragment:
+            yield from generate(item, registry)
+    elif kind is Node:
+        yield fragment.open_tag(registry)
+        for item in fragment.items:
+            yield from generate(item, registry)
+        yield "</div>"
+    elif kind is Deferred:
+        yield from generate(fragment(registry), registry)
+    else:
+        raise TypeError(f"not an html fragment: {repr(fragment)}")
+
+
+"""
+basic wrappers for html string formatting
 """
 
 # helpers
-def id_attr(id) -> HTMLGenerator:
+def id_attr(id) -> str:
     # " id='{id}'"
-    yield " id='"
-    yield str(id)
-    yield "'"
+    return f" id='{id}'"
 
-def class_attr(classes: Classes) -> HTMLGenerator:
+def class_attr(classes: Classes) -> str:
     # " class='{...classes}'"
-    yield " class='"
     if isinstance(classes, str):
-        yield classes
-    else:
-        yield " ".join(classes)
-    yield "'"
+        return f" class='{classes}'"
+    return f" class='{' '.join(classes)}'"
 
-def data_attr(attr: dict) -> HTMLGenerator:
+def data_attr(attr: dict) -> str:
     # " data-...='...'"
-    for key, val in attr.items():
-        yield " data-"
-        yield key
-        yield "='"
-        yield val
-        yield "'"
+    # (operators like & and << are escaped)
+    return "".join([f" data-{key}='{pyhtml.escape(val)}'" for key, val in attr.items()])
 
 
 # main way of generating html
 # we use a div soup because writing wrappers for every
 # html tag adds complexity for no benefit
-def div(*items: HTML, id=None, classes: Classes = [], attr: dict = {}) -> HTMLGenerator:
+def div(*items: HTMLFragment, id=None, classes: Classes = [], attr: dict = {}) -> HTMLFragment:
     # <div {id} {class}>{items}</div>
-    yield "<div"
+    if id is None and not attr and isinstance(classes, str):
+        return (class_tag(classes), items, "</div>")
+    tag = "<div"
     if id is not None:
-        yield from id_attr(id)
+        tag += id_attr(id)
     if classes:
-        yield from class_attr(classes)
-    if data_attr:
-        yield from data_attr(attr)
-    yield ">"
-    for x in items:
-        yield from x
-    yield "</div>"
+        tag += class_attr(classes)
+    if attr:
+        tag += data_attr(attr)
+    return (tag + ">", items, "</div>")
+
+
+# the opening tags of class-only divs are shared
+# (the same few tags are repeated in the whole rendering)
+class_tags = {}
+
+def class_tag(classes: str) -> str:
+    tag = class_tags.get(classes)
+    if tag is None:
+        tag = "<div" + class_attr(classes) + ">" if classes else "<div>"
+        class_tags[classes] = tag
+    return tag
+
+
+def node(n: AST, *items: HTMLFragment) -> Node:
+    return Node(n, items)
 
 
-def node(n: AST, *items: HTML) -> HTMLGenerator:
-    id = genid()
-    n.node_id = id
-    # dom_mapping is useless because the Element does not exist yet and will have an id anyway
-    ast_mapping[id] = n
-    yield from div(*items, id=id)
+# call function(registry, *args) when the html is written
+def deferred(function, *args) -> Deferred:
+    return Deferred(function, args)
 
 
 # usage: div(text("hello"))
-def text(x: str) -> HTMLGenerator:
-    yield x
+def text(x: str) -> str:
+    return x
 
 
 # TODO: name
-def element(classes: Classes, *items: HTML) -> HTMLGenerator:
-    yield from div(classes=classes, *items)
+def element(classes: Classes, *items: HTMLFragment) -> HTMLFragment:
+    return div(classes=classes, *items)
 
 
 # def block(html=""):
@@ -140,10 +278,10 @@ def element(classes: Classes, *items: HTML) -> HTMLGenerator:
 high level helpers
 """
 
-# decorator for (node: AST) -> HTMLGenerator html renderers
+# decorator for (node: AST) -> HTMLFragment html renderers
 def register_node(f):
     def renderer(n: AST):
-        yield from node(n, f(n))
+        return node(n, f(n))
     return renderer
 
 def items(parent_style, item_style, items):
@@ -61,11 +61,14 @@ stmt = FunctionDef(identifier name, arguments args,
 #from webview.dom.dom import DOM
 #from webview.dom.element import Element
 import ast
+import html as pyhtml
 
 # html generation wrappers
 from .html import node, text, element, debug, register_node
 from . import html
 
+from ..dispatch import Dispatcher
+
 # expressions can be found inside statements, but not the opposite
 # (statement.py imports expression.py, but not the opposite)
 from . import expression
@@ -82,110 +85,56 @@ AST module rendering
 def render_module(node: ast.Module):
     # unknown value
     assert len(node.type_ignores) == 0
-    items = []
-    for elt in node.body:
-        # top-level strings are usually multiline
-        # TODO: refactor to make the logic more explicit
-        if isinstance(elt, ast.Expr) and isinstance(elt.value, ast.Constant) and isinstance(elt.value.value, str):
-            lines = elt.value.value.split("\n")
-            lines[0] = '"""' + lines[0]
-            lines[-1] += '"""'
-            lines = [line if line else "<br>" for line in lines]
-            lines = [f"<div>{line}</div>" for line in lines]
-            #items.append("".join(lines))
-            items.append(html.text("".join(lines)))
-            # failed implementation
-            #rendered_text = elt.value.value.replace("\n", "</div><div>")
-            #print(rendered_text)
-            #print("\n" in rendered_text)
-            #children.append(f'<div>"""</div><div>{elt.value.value}</div><div>"""</div>')
-        else:
-            items.append(render(elt))
-    yield from element("module", *items)
+    items = [render_toplevel(elt) for elt in node.body]
+    return element("module", *items)
+
+
+# top-level statements are wrapped in a div with their own id,
+# so that they can be re-rendered and replaced one by one
+# (see diff.py)
+def render_toplevel(node: ast.stmt):
+    # top-level strings are usually multiline
+    # TODO: refactor to make the logic more explicit
+    if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+        # (escaped: the text is not html, and cached html is rebased
+        # with a regex on its ids, see cache.rebase())
+        lines = [pyhtml.escape(line) for line in node.value.value.split("\n")]
+        lines[0] = '"""' + lines[0]
+        lines[-1] += '"""'
+        lines = [line if line else "<br>" for line in lines]
+        lines = [f"<div>{line}</div>" for line in lines]
+        item = html.text("".join(lines))
+        # failed implementation
+        #rendered_text = node.value.value.replace("\n", "</div><div>")
+        #print(rendered_text)
+        #print("\n" in rendered_text)
+        #children.append(f'<div>"""</div><div>{node.value.value}</div><div>"""</div>')
+    else:
+        item = render(node)
+    # the id is generated when the html is written, like node ids
+    return html.deferred(wrap_toplevel, node, item)
 
+def wrap_toplevel(registry, node: ast.stmt, item):
+    id = registry.register_toplevel(node)
+    return html.div(item, id=id, classes="top-level")
 
 
 """
 AST statement rendering
 
-(the big switch)
+(the big switch, as a table)
 """
 
 
+# the table is filled by the @renderers.register() decorators below
+# unsupported statements are missing from it:
+# TypeAlias (3.12+ feature, ignored until pypy reaches 3.12),
+# AnnAssign, TryStar, Global, Break
+renderers = Dispatcher("statement", ast.stmt)
+
+
 def render(node: ast.stmt):
-    #match type(node):
-    if type(node) == ast.FunctionDef:
-        yield from render_funcdef(node)
-    elif type(node) == ast.AsyncFunctionDef:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-
-    elif type(node) == ast.ClassDef:
-        yield from render_classdef(node)
-    elif type(node) == ast.Return:
-        yield from render_return(node)
-
-    elif type(node) == ast.Delete:
-        yield from render_delete(node)
-    elif type(node) == ast.Assign:
-        yield from render_assign(node)
-    # 3.12+ feature
-    # TODO: ignore it until pypy reaches 3.12 or stop supporting pypy
-    #case ast.TypeAlias:
-    #    raise ValueError(f"Unexpected ast statement type: {type(node)}")
-    elif type(node) == ast.AugAssign:
-        yield from render_augassign(node)
-    elif type(node) == ast.AnnAssign:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-
-    elif type(node) == ast.For:
-        yield from render_for(node)
-    elif type(node) == ast.AsyncFor:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-    elif type(node) == ast.While:
-        yield from render_while(node)
-    elif type(node) == ast.If:
-        yield from render_if(node)
-    elif type(node) == ast.With:
-        yield from render_with(node)
-    elif type(node) == ast.AsyncWith:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-
-    elif type(node) == ast.Match:
-        yield from render_match(node)
-
-    elif type(node) == ast.Raise:
-        yield from render_raise(node)
-    elif type(node) == ast.Try:
-        # TODO: implement
-        #yield from render_try(node)
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-    elif type(node) == ast.TryStar:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-    elif type(node) == ast.Assert:
-        yield from render_assert(node)
-
-    elif type(node) == ast.Import:
-        yield from render_import(node)
-    elif type(node) == ast.ImportFrom:
-        yield from render_importfrom(node)
-
-    elif type(node) == ast.Global:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-    elif type(node) == ast.Nonlocal:
-        yield from render_nonlocal(node)
-    elif type(node) == ast.Expr:
-        # TODO: add a wrapper div, to type as a "expr in a statement"
-        yield from expression.render(node.value)
-    elif type(node) == ast.Pass:
-        yield from render_pass(node)
-    elif type(node) == ast.Break:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
-    elif type(node) == ast.Continue:
-        yield from render_continue(node)
-
-    # future python versions may add new things
-    else:
-        raise ValueError(f"Unexpected ast statement type: {type(node)}")
+    return renderers.lookup(node)(node)
 
 
 
@@ -196,8 +145,9 @@ AST statement rendering
 """
 
 
+@renderers.register(ast.FunctionDef, ast.AsyncFunctionDef)
 @register_node
-def render_funcdef(node: ast.FunctionDef):
+def render_funcdef(node: ast.FunctionDef | ast.AsyncFunctionDef):
     # supported features checks
     #assert len(node.decorator_list) == 0
     assert node.type_comment is None
@@ -215,7 +165,10 @@ def render_funcdef(node: ast.FunctionDef):
 
     # header
     name = text(node.name)
-    funcname = element("row def-prefix gap", name)
+    if isinstance(node, ast.AsyncFunctionDef):
+        funcname = element("row async-def-prefix gap", name)
+    else:
+        funcname = element("row def-prefix gap", name)
     params = render_parameters(node.args)
     funcparams = element("parens row", params)
     head = element("row", funcname, funcparams)
@@ -227,10 +180,9 @@ def render_funcdef(node: ast.FunctionDef):
     header = element("row colon-suffix", head)
 
     # body
-    body = [render(stmt) for stmt in node.body]
-    body_block = element("block", *body)
+    body_block = render_block(node)
 
-    yield from element("def", decorators, header, body_block)
+    return element("def", decorators, header, body_block)
 
 
 # sub-part of render_funcdef
@@ -288,7 +240,7 @@ def render_parameters(node: ast.arguments):
         params.append(param)
 
 
-    yield from html.items("parameters comma-sep row", "row gap", params)
+    return html.items("parameters comma-sep row", "row gap", params)
 
 
 # sub-part of render_parameters
@@ -301,15 +253,16 @@ def render_param(node: ast.arg):
     param_name = element("parameter-name", param_name)
     if node.annotation is None:
         #param_name = element("bg-red", param_name)
-        yield from param_name
-        return
+        return param_name
 
     annotation = expression.render(node.annotation)
     name = element("row colon-suffix", param_name)
     param = element("parameter row gap", name, annotation)
-    yield from param
+    return param
 
 
+@renderers.register(ast.ClassDef)
+@register_node
 def render_classdef(node: ast.ClassDef):
     # TODO: support decorators
     # TODO: support type_params
@@ -333,29 +286,50 @@ def render_classdef(node: ast.ClassDef):
     header = element("row colon-suffix", header)
 
     # body
-    body = [render(stmt) for stmt in node.body]
-    body = element("block", *body)
+    body = render_block(node)
 
-    yield from element("class", decorators, header, body)
+    return element("class", decorators, header, body)
 
 
+# body of function and class definitions
+# with html.settings.lazy_bodies, the body is an empty placeholder with the id
+# of the definition, to be filled with render_body() once it is displayed
+def render_block(node: ast.FunctionDef | ast.ClassDef):
+    if html.settings.lazy_bodies:
+        # the id of the definition is only known once its div is written
+        return html.deferred(render_placeholder, node)
+    return element("block", render_body(node))
+
+def render_placeholder(registry, node: ast.FunctionDef | ast.ClassDef):
+    # used to give the placeholder the size of the body
+    lines = node.end_lineno - node.body[0].lineno + 1
+    return html.div(classes="block lazy-body",
+                    attr={"node": str(registry.ids[node]), "lines": str(lines)})
+
+def render_body(node: ast.FunctionDef | ast.ClassDef):
+    return [render(stmt) for stmt in node.body]
+
+
+@renderers.register(ast.Return)
 @register_node
 def render_return(node: ast.Return):
     if node.value is not None:
         value = expression.render(node.value)
     else:
         value = text("")
-    yield from element("return return-prefix row gap", value)
+    return element("return return-prefix row gap", value)
 
 
+@renderers.register(ast.Delete)
 @register_node
 def render_delete(node: ast.Delete):
     # example: del a, b, c
     items = [expression.render(target) for target in node.targets]
     items = html.items("comma-sep row", "row gap bg-red", items)
-    yield from element("delete del-prefix row gap bg-red", items)
+    return element("delete del-prefix row gap bg-red", items)
 
 
+@renderers.register(ast.Assign)
 @register_node
 def render_assign(node: ast.Assign):
     assert node.type_comment is None
@@ -365,7 +339,7 @@ def render_assign(node: ast.Assign):
     # display the value as the last (equal-separated) target
     targets.append(value)
     formatted = html.items("assign equal-sep row gap", "row gap", targets)
-    yield from formatted
+    return formatted
 
 
 
@@ -379,19 +353,21 @@ def render_assign(node: ast.Assign):
 # format: <node> <op>= <node>
 # <node><gap><op>=<gap><node>
 # (<node> (<op>=) <node>)
+@renderers.register(ast.AugAssign)
 def render_augassign(node: ast.AugAssign):
     target = expression.render(node.target)
-    operator = text(expression.read_binaryop(node.op))
+    operator = text(pyhtml.escape(expression.read_binaryop(node.op)))
     # hack: add an empty div to force the = separator to render
     # TODO?: add a .equal-suffix css class
     empty = element("")
     operator = html.items("equal-sep row", "row", [operator, empty])
     val = expression.render(node.value)
-    yield from element("row gap", target, operator, val)
+    return element("row gap", target, operator, val)
 
 
+@renderers.register(ast.For, ast.AsyncFor)
 @register_node
-def render_for(node: ast.For):
+def render_for(node: ast.For | ast.AsyncFor):
     assert node.type_comment is None
 
     # header
@@ -403,7 +379,10 @@ def render_for(node: ast.For):
     header = html.items("in-sep row gap", "row gap",
                                 [variable, iterator])
     # "for x in lst"
-    header = element("for-prefix row gap", header)
+    if isinstance(node, ast.AsyncFor):
+        header = element("async-for-prefix row gap", header)
+    else:
+        header = element("for-prefix row gap", header)
     # "for x in lst:"
     header = element("colon-suffix row", header)
 
@@ -425,10 +404,11 @@ def render_for(node: ast.For):
     #result = "".join(parts)
     #return div(result)
 
-    yield from element("for", header, body)
+    return element("for", header, body)
 
 
 
+@renderers.register(ast.While)
 @register_node
 def render_while(node: ast.While):
     test = expression.render(node.test)
@@ -441,14 +421,14 @@ def render_while(node: ast.While):
     assert not node.orelse
     # if node.orelse:
     #else_body = [render(stmt) for stmt in node.orelse]
-    yield from element("while", header, body)
+    return element("while", header, body)
 
 
+@renderers.register(ast.If)
 @register_node
 def render_if(node: ast.If):
     if is_elif(node):
-        yield from render_elifs(node)
-        return
+        return render_elifs(node)
 
     test = expression.render(node.test)
     header = element("row gap if-prefix", test)
@@ -465,7 +445,7 @@ def render_if(node: ast.If):
         else_block = element("block", *else_body)
         parts.append(else_header)
         parts.append(else_block)
-    yield from element("if", *parts)
+    return element("if", *parts)
 
 
 # helpers for elifs
@@ -546,19 +526,23 @@ def render_elifs(if_node: ast.If):
 
     # TODO: see if render_if() and render_elif() can return the same html layou
     # if possible, use the same .if class for both
-    yield from element("elif", *blocks)
+    return element("elif", *blocks)
 
 
+@renderers.register(ast.With, ast.AsyncWith)
 @register_node
-def render_with(node: ast.With):
+def render_with(node: ast.With | ast.AsyncWith):
     assert node.type_comment is None
     assert len(node.items) == 1  # TODO: test with more cases
     items = [render_withitem(item) for item in node.items]
     body = [render(stmt) for stmt in node.body]
     block = element("block", *body)
-    header = element("with-prefix row gap", *items)
+    if isinstance(node, ast.AsyncWith):
+        header = element("async-with-prefix row gap", *items)
+    else:
+        header = element("with-prefix row gap", *items)
     header = element("row colon-suffix", header)
-    yield from element("with", header, block)
+    return element("with", header, block)
 
 
 @register_node
@@ -571,11 +555,12 @@ def render_withitem(node: ast.withitem):
     else:
         # just "<expr>"
         item = expression.render(node.context_expr)
-    yield from element("with-item", item)
+    return element("with-item", item)
 
 
 # TODO: write tests to make sure the feature does not bitrot
 # (cython prevents the untext codebase to use match blocks)
+@renderers.register(ast.Match)
 @register_node
 def render_match(node: ast.Match):
     matched = expression.render(node.subject)
@@ -585,7 +570,7 @@ def render_match(node: ast.Match):
     cases = [render_case(case) for case in node.cases]
     cases = element("block", *cases)
 
-    yield from element("match", header, cases)
+    return element("match", header, cases)
 
 
 # part of render_match
@@ -600,48 +585,26 @@ def render_case(node: ast.match_case):
     pattern = render_pattern(node.pattern)
     pattern = element("row gap case-prefix", pattern)
     pattern = element("row colon-suffix", pattern)
-    yield from element("case", pattern, body)
+    return element("case", pattern, body)
 
 
 # TODO: implement missing cases
-@register_node
-def render_pattern(node: ast.pattern):
-    #match type(node):
-    if type(node) == ast.MatchValue:
-        yield from render_match_value(node)
-    elif type(node) == ast.MatchSingleton:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #yield from render_match_singleton(node)
-    elif type(node) == ast.MatchSequence:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #yield from render_match_sequence(node)
-    elif type(node) == ast.MatchMapping:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #yield from render_match_mapping(node)
-    elif type(node) == ast.MatchClass:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #yield from render_match_class(node)
-
-    elif type(node) == ast.MatchStar:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #yield from render_match_star(node)
-
-    elif type(node) == ast.MatchAs:
-        yield from render_match_as(node)
-    elif type(node) == ast.MatchOr:
-        raise NotImplementedError(f"Unknown match pattern type: {type(node)}")
-        #yield from render_match_or(node)
+# (MatchSingleton, MatchSequence, MatchMapping, MatchClass, MatchStar, MatchOr)
+patterns = Dispatcher("match pattern", ast.pattern)
 
-    else:
-        raise ValueError(f"Unexpected match pattern type: {type(node)}")
+# each pattern renderer registers its node
+def render_pattern(node: ast.pattern):
+    return patterns.lookup(node)(node)
 
 
+@patterns.register(ast.MatchValue)
 @register_node
 def render_match_value(node: ast.MatchValue):
     expr = expression.render(node.value)
-    yield from element("match-value", expr)
+    return element("match-value", expr)
 
 
+@patterns.register(ast.MatchAs)
 @register_node
 def render_match_as(node: ast.MatchAs):
     # TODO: support other cases
@@ -652,26 +615,71 @@ def render_match_as(node: ast.MatchAs):
     assert node.pattern is None
     assert node.name == "default"
     txt = text(node.name)
-    yield from element("match-as", txt)
+    return element("match-as", txt)
 
 
+@renderers.register(ast.Raise)
 @register_node
 def render_raise(node: ast.Raise):
     # TODO: check if support for this attribute is needed
     assert node.cause is None
+    # re-raise (in an except: block)
+    if node.exc is None:
+        return element("raise raise-prefix row")
     raised = expression.render(node.exc)
-    yield from element("raise raise-prefix row gap", raised)
+    return element("raise raise-prefix row gap", raised)
 
 
+@renderers.register(ast.Try)
+@register_node
+def render_try(node: ast.Try):
+    header = element("row colon-suffix try-prefix")
+    body = [render(stmt) for stmt in node.body]
+    parts = [header, element("block", *body)]
+
+    parts.extend([render_excepthandler(handler) for handler in node.handlers])
+
+    if node.orelse:
+        else_header = element("row colon-suffix else-prefix")
+        else_body = [render(stmt) for stmt in node.orelse]
+        parts.append(else_header)
+        parts.append(element("block", *else_body))
+
+    if node.finalbody:
+        finally_header = element("row colon-suffix finally-prefix")
+        finally_body = [render(stmt) for stmt in node.finalbody]
+        parts.append(finally_header)
+        parts.append(element("block", *finally_body))
+    return element("try", *parts)
+
+
+@register_node
+def render_excepthandler(node: ast.ExceptHandler):
+    # "except:", "except <type>:" or "except <type> as <name>:"
+    if node.type is None:
+        header = element("row colon-suffix except-prefix")
+    else:
+        caught = expression.render(node.type)
+        if node.name:
+            caught = html.items("as-sep row gap", "row gap", [caught, text(node.name)])
+        header = element("row gap except-prefix", caught)
+        header = element("row colon-suffix", header)
+    body = [render(stmt) for stmt in node.body]
+    block = element("block", *body)
+    return element("except", header, block)
+
+
+@renderers.register(ast.Assert)
 @register_node
 def render_assert(node: ast.Assert):
     # TODO: support assertion messages
     assert node.msg is None
     asserted = expression.render(node.test)
-    yield from element("assert assert-prefix row gap", asserted)
+    return element("assert assert-prefix row gap", asserted)
 
 
 # TODO: rewrite
+@renderers.register(ast.Import)
 def render_import(node: ast.Import):
     aliases = []
     for name in node.names:
@@ -682,7 +690,7 @@ def render_import(node: ast.Import):
                 render_alias(name)
             )
         )
-    yield from html.node(
+    return html.node(
         node,
         element(
             "import import-prefix row",
@@ -708,7 +716,7 @@ def render_alias(node: ast.alias):
             "unnamed-alias",
             html.text(node.name)
         )
-    yield from html.node(
+    return html.node(
         node,
         html.element(
             "alias row",
@@ -717,6 +725,7 @@ def render_alias(node: ast.alias):
     )
 
 
+@renderers.register(ast.ImportFrom)
 def render_importfrom(node: ast.ImportFrom):
     # build the html bottom-up
     # example: from ..a import b, c as d
@@ -741,23 +750,33 @@ def render_importfrom(node: ast.ImportFrom):
     from_part = html.element("from-prefix row gap", from_field)
 
     import_statement = html.element("importfrom row gap", from_part, import_part)
-    yield from html.node(node, import_statement)
+    return html.node(node, import_statement)
 
 
 
 
+@renderers.register(ast.Nonlocal)
 @register_node
 def render_nonlocal(node: ast.Nonlocal):
     # TODO: test on multiple names (ex: nonlocal a, b, c)
     names = [text(name) for name in node.names]
     names = html.items("row comma-sep", "row gap", names)
-    yield from element("row gap nonlocal-prefix", names)
+    return element("row gap nonlocal-prefix", names)
+
+
+# expressions used as statements (function calls, docstrings,...)
+@renderers.register(ast.Expr)
+def render_expr_statement(node: ast.Expr):
+    # TODO: add a wrapper div, to type as a "expr in a statement"
+    return expression.render(node.value)
 
 
+@renderers.register(ast.Pass)
 def render_pass(node: ast.Pass):
-    yield from html.node(node, text("pass"))
+    return html.node(node, text("pass"))
 
 
+@renderers.register(ast.Continue)
 def render_continue(node: ast.Continue):
-    yield from html.node(node, text("continue"))
+    return html.node(node, text("continue"))
 
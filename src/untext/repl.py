@@ -0,0 +1,122 @@
+"""
+REPL sessions
+
+Interactive sessions in the namespace of a module, displayed in a panel of
+its window (see CodeWindow.open_repl), instead of a blocking
+code.InteractiveConsole on the terminal:
+- lines typed in the panel are queued by push(), which returns at once
+  (the webview API thread is not blocked)
+- a worker thread per session evaluates them, so sessions of the same
+  project run concurrently
+- the output (echoed input, printed values, tracebacks) is sent to the window
+  in batches: at most once every FLUSH_INTERVAL seconds while the code runs,
+  and once at the end of each line
+
+Lines can await at the top level, like in "python -m asyncio": they run in
+the asyncio loop of the project (see eventloop.py) while the worker waits.
+
+This module does not import pywebview: the session gets a callback
+on_output(text, prompt) which updates the panel.
+"""
+
+import code
+import queue
+import threading
+import traceback
+
+from untext import eventloop, output
+
+
+# seconds between two output updates of a running evaluation
+FLUSH_INTERVAL = 0.05
+
+PS1 = ">>> "
+PS2 = "... "
+
+
+class Console(code.InteractiveConsole):
+    def __init__(self, namespace: dict, filename: str, loop: eventloop.EventLoop | None):
+        super().__init__(namespace, filename)
+        self.loop = loop
+        if loop is not None:
+            self.compile.compiler.flags |= eventloop.COMPILE_FLAGS
+
+    # lines with top-level await run in the loop
+    def runcode(self, code):
+        if not eventloop.is_coroutine(code):
+            return super().runcode(code)
+        error = eventloop.run(self.loop, code, self.locals)
+        if error is not None:
+            traceback.print_exception(error)
+
+
+class Session:
+    # loop: asyncio loop of the project (no top-level await without it)
+    def __init__(self, namespace: dict, on_output, filename="<repl>", interval=FLUSH_INTERVAL, loop=None):
+        self.console = Console(namespace, filename, loop)
+        # on_output(text, prompt)
+        self.on_output = on_output
+        self.interval = interval
+        # prompt of the next line (PS2 for unfinished statements)
+        self.prompt = PS1
+        # lines to evaluate, None to stop the worker
+        self.inputs = queue.SimpleQueue()
+        # output not sent yet
+        self.pending = []
+        self.lock = threading.Lock()
+        # flush() of the worker and of the timer, in order
+        self.flushing = threading.Lock()
+        # started by the first write after a flush
+        self.timer = None
+        self.worker = threading.Thread(target=self.work, daemon=True, name=f"repl {filename}")
+        self.worker.start()
+
+    # queue a line typed in the panel
+    def push(self, line: str):
+        self.inputs.put(line)
+
+    # stop the worker after the queued lines
+    def close(self):
+        self.inputs.put(None)
+
+    def work(self):
+        with output.capture(self.write):
+            line = self.inputs.get()
+            while line is not None:
+                self.write(self.prompt + line + "\n")
+                if self.evaluate(line):
+                    self.prompt = PS2
+                else:
+                    self.prompt = PS1
+                self.flush()
+                line = self.inputs.get()
+
+    # return True if the line needs more lines (like console.push())
+    def evaluate(self, line: str) -> bool:
+        try:
+            return self.console.push(line)
+        except BaseException as error:
+            # exit(), sys.exit(),... (runcode() raises SystemExit again):
+            # the session goes on, the panel closes with the window
+            self.console.resetbuffer()
+            self.write("".join(traceback.format_exception_only(error)))
+            return False
+
+    def write(self, text: str):
+        with self.lock:
+            self.pending.append(text)
+            if self.timer is None:
+                self.timer = threading.Timer(self.interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    # send the pending output (and the current prompt)
+    def flush(self):
+        with self.flushing:
+            with self.lock:
+                text = "".join(self.pending)
+                self.pending = []
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            self.on_output(text, self.prompt)
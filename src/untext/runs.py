@@ -0,0 +1,169 @@
+"""
+run handles
+
+Every run of a module (in the IDE process, in the kernel or in a clean
+process, see CodeWindow.run) is followed with a Run handle:
+- its state: running, then done, failed, cancelled or timed out
+- cancel(), which stops it (how depends on where it runs, see interrupt())
+- an optional wall-clock budget (in seconds), after which it is stopped
+- listeners, called when the state changes (the window displays it)
+
+Runs in a thread of the IDE are stopped with an exception raised in their
+thread (RunCancelled, not an Exception, so that user code does not catch it
+by mistake). The exception is only raised between two bytecodes: blocking
+calls (time.sleep(), I/O,...) finish first, and it needs the C API of
+CPython (runs cannot be cancelled on pypy).
+"""
+
+import ctypes
+import threading
+
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed out"
+
+# not on pypy
+pythonapi = getattr(ctypes, "pythonapi", None)
+
+
+class RunCancelled(BaseException):
+    pass
+
+
+# raise an exception in another thread, at its next bytecode
+# return False if it is not possible
+def inject(thread_id: int, exception: type) -> bool:
+    if pythonapi is None:
+        return False
+    count = pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), ctypes.py_object(exception))
+    return count == 1
+
+
+# forget the exception injected in a thread, if it was not raised yet
+def clear(thread_id: int):
+    if pythonapi is not None:
+        # (NULL instead of an exception)
+        pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), None)
+
+
+class Run:
+    def __init__(self, name: str, budget=None):
+        self.name = name
+        self.state = RUNNING
+        self.finished = threading.Event()
+        # seconds, None for no limit (see start_budget())
+        self.budget = budget
+        self.timer = None
+        # called with the run when its state changes
+        self.listeners = []
+        # CANCELLED or TIMED_OUT once stop() was called
+        self.stop_state = None
+        self.lock = threading.Lock()
+
+    @property
+    def failed(self) -> bool:
+        return self.state != DONE and self.state != RUNNING
+
+    def start_budget(self):
+        if self.budget is None:
+            return
+        self.timer = threading.Timer(self.budget, self.stop, [TIMED_OUT])
+        self.timer.daemon = True
+        self.timer.start()
+
+    def cancel(self):
+        self.stop(CANCELLED)
+
+    def stop(self, state: str):
+        with self.lock:
+            if self.finished.is_set() or self.stop_state is not None:
+                return
+            self.stop_state = state
+        self.interrupt()
+
+    # stop the code (overridden for each kind of run)
+    def interrupt(self):
+        pass
+
+    # called once the code stopped
+    def finish(self, failed: bool):
+        with self.lock:
+            if self.finished.is_set():
+                return
+            if self.stop_state is not None:
+                self.state = self.stop_state
+            elif failed:
+                self.state = FAILED
+            else:
+                self.state = DONE
+            if self.timer is not None:
+                self.timer.cancel()
+            self.finished.set()
+        self.notify()
+
+    def notify(self):
+        for listener in self.listeners:
+            listener(self)
+
+    def wait(self, timeout=None) -> bool:
+        return self.finished.wait(timeout)
+
+
+# function() runs in its own thread, and returns True if it failed
+class ThreadRun(Run):
+    def __init__(self, name: str, function, budget=None):
+        super().__init__(name, budget)
+        self.function = function
+        self.thread = threading.Thread(target=self.work, daemon=True, name=f"run {name}")
+        # True once function() returned: RunCancelled is not injected anymore
+        self.exited = False
+
+    def start(self):
+        self.thread.start()
+        self.start_budget()
+
+    # finish() always runs, even if the run is cancelled just as
+    # function() returns
+    def work(self):
+        failed = True
+        try:
+            try:
+                failed = self.function()
+            finally:
+                self.exit()
+        except RunCancelled:
+            # (raised in function(), or before exit() cleared it)
+            pass
+        finally:
+            self.finish(failed)
+
+    def exit(self):
+        with self.lock:
+            self.exited = True
+            clear(self.thread.ident)
+
+    def interrupt(self):
+        with self.lock:
+            if not self.exited:
+                inject(self.thread.ident, RunCancelled)
+
+
+# coroutine scheduled in an asyncio loop (see eventloop.py)
+class FutureRun(Run):
+    def __init__(self, name: str, future, budget=None):
+        super().__init__(name, budget)
+        self.future = future
+
+    def start(self):
+        self.future.add_done_callback(self.done)
+        self.start_budget()
+
+    def interrupt(self):
+        self.future.cancel()
+
+    def done(self, future):
+        failed = future.cancelled() or future.exception() is not None
+        self.finish(failed)
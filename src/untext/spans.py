@@ -0,0 +1,192 @@
+"""
+source span index
+
+The renderers drop the positions of the nodes, but tracebacks, copying the
+source of a node and jumping to a line need them, in both directions:
+- node -> source: the span of a row of the NodeTable is read from its
+  position columns, and sliced from the source with a LineTable (the offset
+  of each line start), without splitting the source again like
+  ast.get_source_segment() does on every call
+- source -> node: the spans of the rows are kept in an interval tree (see
+  SpanIndex), and the nodes at a position or a line are found in
+  O(log n + number of matches), instead of a walk over the tree
+
+Positions are (lineno, col_offset) like in the AST: lines start at 1 and
+columns are UTF-8 byte offsets, so the spans are byte offsets in the encoded
+source (see LineTable.offset).
+
+The index works on rows: the nodes of lazy bodies are indexed before they
+are rendered, and the DOM ids are read from the NodeTable when a query
+returns (see SpanIndex.element).
+"""
+
+import ast
+from array import array
+import re
+
+from untext.nodetable import NodeTable
+
+
+# like ast.get_source_segment() (form feeds are not line ends)
+NEWLINE = re.compile(rb"\r\n|\r|\n")
+
+
+class LineTable:
+    def __init__(self, source: str):
+        self.data = source.encode("utf-8")
+        # starts[n - 1]: offset of the first byte of line n
+        self.starts = array("i", [0])
+        for match in NEWLINE.finditer(self.data):
+            self.starts.append(match.end())
+
+    def __len__(self):
+        return len(self.starts)
+
+    # line numbers start at 1 (starts[-1] would be the last line)
+    def __contains__(self, lineno: int) -> bool:
+        return 1 <= lineno <= len(self.starts)
+
+    def offset(self, lineno: int, col_offset: int) -> int:
+        if lineno not in self:
+            raise IndexError(f"no line {lineno}")
+        return self.starts[lineno - 1] + col_offset
+
+    # (start, end) offsets of a line, with its line end
+    def line(self, lineno: int) -> tuple:
+        if lineno not in self:
+            raise IndexError(f"no line {lineno}")
+        if lineno < len(self.starts):
+            return self.starts[lineno - 1], self.starts[lineno]
+        return self.starts[lineno - 1], len(self.data)
+
+    def segment(self, lineno: int, col_offset: int, end_lineno: int, end_col_offset: int) -> str:
+        start = self.offset(lineno, col_offset)
+        end = self.offset(end_lineno, end_col_offset)
+        return self.data[start:end].decode("utf-8")
+
+
+"""
+interval tree
+
+The spans are sorted by start offset, and the sorted arrays are an implicit
+balanced search tree: the root of the range [lo, hi) is its middle, and
+max_end[middle] is the last end offset in the range. A query skips the
+ranges that end before it, and the right halves that start after it.
+"""
+
+class SpanIndex:
+    def __init__(self, table: NodeTable, lines: LineTable):
+        self.table = table
+        self.lines = lines
+        # rows with a position
+        rows = [row for row in range(len(table)) if table.lineno[row] != -1 and table.end_lineno[row] != -1]
+        starts = [lines.offset(table.lineno[row], table.col_offset[row]) for row in rows]
+        order = sorted(range(len(rows)), key=starts.__getitem__)
+        self.rows = array("i", [rows[k] for k in order])
+        self.starts = array("i", [starts[k] for k in order])
+        self.ends = array("i", [lines.offset(table.end_lineno[row], table.end_col_offset[row]) for row in self.rows])
+        self.max_end = array("i", self.ends)
+        self.build(0, len(self.rows))
+
+    # fill max_end for the range [lo, hi), return its last end offset
+    def build(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return -1
+        middle = (lo + hi) // 2
+        self.max_end[middle] = max(self.ends[middle], self.build(lo, middle), self.build(middle + 1, hi))
+        return self.max_end[middle]
+
+    # rows of the spans overlapping [start, end), by start offset
+    def overlapping(self, start: int, end: int) -> list:
+        found = []
+        self.search(0, len(self.rows), start, end, found)
+        return found
+
+    def search(self, lo: int, hi: int, start: int, end: int, found: list):
+        if lo >= hi:
+            return
+        middle = (lo + hi) // 2
+        if self.max_end[middle] <= start:
+            return
+        self.search(lo, middle, start, end, found)
+        if self.starts[middle] < end:
+            if self.ends[middle] > start:
+                found.append(self.rows[middle])
+            self.search(middle + 1, hi, start, end, found)
+
+    # length of the span of a row, to sort nested spans
+    # (the deepest row first when two spans are the same)
+    def size(self, row: int) -> tuple:
+        table = self.table
+        start = self.lines.offset(table.lineno[row], table.col_offset[row])
+        end = self.lines.offset(table.end_lineno[row], table.end_col_offset[row])
+        return end - start, -row
+
+
+    # source -> node
+
+    # rows of the nodes at a position, outermost first ([] out of the file)
+    def at(self, lineno: int, col_offset: int) -> list:
+        if lineno not in self.lines:
+            return []
+        offset = self.lines.offset(lineno, col_offset)
+        rows = self.overlapping(offset, offset + 1)
+        rows.sort(key=self.size, reverse=True)
+        return rows
+
+    # row of the innermost statement containing a line, -1 if none (or out
+    # of the file)
+    def statement(self, lineno: int) -> int:
+        if lineno not in self.lines:
+            return -1
+        start, end = self.lines.line(lineno)
+        rows = [row for row in self.overlapping(start, end) if issubclass(self.table.type_of(row), ast.stmt)]
+        if not rows:
+            return -1
+        return min(rows, key=self.size)
+
+    # DOM id of the closest element displaying a row (the row itself, or an
+    # ancestor if the row has no element or is in a body not rendered yet)
+    # 0 if none
+    def element(self, row: int) -> int:
+        table = self.table
+        # expression statements are displayed as their expression
+        if row != -1 and not table.id(row) and table.type_of(row) is ast.Expr:
+            value = table.first_child[row]
+            if value != -1:
+                row = value
+        while row != -1 and not table.id(row):
+            row = table.parent[row]
+        if row == -1:
+            return 0
+        return table.id(row)
+
+    # DOM id of the innermost element at a position
+    def element_at(self, lineno: int, col_offset: int) -> int:
+        rows = self.at(lineno, col_offset)
+        if not rows:
+            return 0
+        return self.element(rows[-1])
+
+    # DOM id of the element of the innermost statement containing a line
+    # (0 if none)
+    def statement_element(self, lineno: int) -> int:
+        return self.element(self.statement(lineno))
+
+
+    # node -> source
+
+    # (lineno, col_offset, end_lineno, end_col_offset) of a DOM id, None if
+    # the id is not in the table or its node has no position
+    def span(self, id: int):
+        row = self.table.row(id)
+        if row == -1 or self.table.lineno[row] == -1 or self.table.end_lineno[row] == -1:
+            return None
+        return self.table.span(row)
+
+    # source of the node of a DOM id, None if it has no position
+    def source(self, id: int):
+        span = self.span(id)
+        if span is None:
+            return None
+        return self.lines.segment(span[0], span[1], span[2], span[3])
@@ -0,0 +1,163 @@
+"""
+clean runs
+
+Runs a module from a clean state, like in a new interpreter, without paying
+for the start of the interpreter and the imports of the module every time:
+a zygote process imports the dependencies of the module once (its top-level
+import statements, see dependencies()), and forks a fresh child for each run.
+Heavy imports (numpy, pandas,...) are then already in memory when the
+module runs.
+
+The zygote talks with the IDE like the kernel (see kernel.py), with one
+more message: ("preload", module names).
+The children send their output on the connection of the zygote, which waits
+for the end of each child before reading the next message: clean runs of a
+project are sequential, and the zygote sends the end of the run when its
+child exits. Cancelled runs (see runs.py) are killed: the next run starts
+from a clean state anyway.
+
+os.fork() is not available on windows.
+"""
+
+import ast
+import contextlib
+import importlib
+import os
+import signal
+import sys
+import threading
+
+from untext import kernel
+
+
+"""
+zygote process
+"""
+
+def serve(connection, project_path: str):
+    lock = kernel.setup(connection, project_path)
+    with contextlib.suppress(EOFError, OSError):
+        while True:
+            message = connection.recv()
+            if message[0] == "preload":
+                preload(message[1])
+            elif message[0] == "run":
+                fork_run(connection, lock, *message[1:])
+
+
+def preload(names: list):
+    for name in names:
+        # the runs raise the errors again
+        with contextlib.suppress(Exception):
+            importlib.import_module(name)
+
+
+def fork_run(connection, lock: threading.Lock, run_id: int, module_name: str, filename: str, marshalled: bytes):
+    pid = os.fork()
+    if pid == 0:
+        run_child(connection, run_id, module_name, filename, marshalled)
+    pid, status = os.waitpid(pid, 0)
+    with lock:
+        connection.send(("done", run_id, os.waitstatus_to_exitcode(status) != 0))
+
+
+# in the forked child: run the module, and exit
+# (the child never returns to the loop of the zygote, whatever it raises)
+def run_child(connection, run_id: int, module_name: str, filename: str, marshalled: bytes):
+    code = 1
+    try:
+        code = child(connection, run_id, module_name, filename, marshalled)
+    finally:
+        os._exit(code)
+
+
+# return the exit code of the child
+def child(connection, run_id: int, module_name: str, filename: str, marshalled: bytes) -> int:
+    # the zygote only waits: the child has the connection for itself
+    lock = threading.Lock()
+    sys.stdout = kernel.Output(connection, "stdout", lock)
+    sys.stderr = kernel.Output(connection, "stderr", lock)
+    connection.send(("started", run_id, os.getpid()))
+    try:
+        code = int(kernel.execute(run_id, module_name, filename, marshalled))
+    except SystemExit as exit:
+        # sys.exit() in the module (runcode() raises it again)
+        code = exit_code(exit.code)
+    # wait for the threads started by the module, like at the end of a python process
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and not thread.daemon:
+            thread.join()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return code
+
+
+# exit code of a process exiting with sys.exit(value)
+def exit_code(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    # sys.exit("message")
+    print(value, file=sys.stderr)
+    return 1
+
+
+"""
+IDE side
+"""
+
+# absolute imports run by the top-level code of a module (outside of functions
+# and classes), except the modules of the project, which can change between runs
+def dependencies(tree: ast.Module, project_path: str) -> list:
+    names = []
+    stack = list(reversed(tree.body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Import):
+            names.extend([alias.name for alias in node.names])
+        elif isinstance(node, ast.ImportFrom):
+            if node.level == 0:
+                names.append(node.module)
+        elif not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            children = list(ast.iter_child_nodes(node))
+            children.reverse()
+            stack.extend(children)
+    return [name for name in dict.fromkeys(names) if not in_project(name, project_path)]
+
+
+def in_project(name: str, project_path: str) -> bool:
+    path = os.path.join(project_path, name.split(".")[0])
+    return os.path.isdir(path) or os.path.exists(path + ".py")
+
+
+class Zygote(kernel.Kernel):
+    def __init__(self, project_path: str, on_output=kernel.print_output):
+        super().__init__(project_path, on_output, target=serve)
+        # modules imported by the zygote
+        self.preloaded = set()
+
+    def start(self):
+        super().start()
+        self.preloaded = set()
+
+    def preload(self, names: list):
+        new = [name for name in names if name not in self.preloaded]
+        if not new:
+            return
+        with self.lock:
+            self.connection.send(("preload", new))
+        self.preloaded.update(new)
+
+    # imports: dependencies of the module, imported by the zygote before the fork
+    def run(self, module_name: str, filename: str, code_object, imports=[], budget=None, output=None) -> kernel.Run:
+        with self.lock:
+            if not self.alive:
+                self.restart()
+            self.preload(imports)
+            return super().run(module_name, filename, code_object, budget, output)
+
+    def interrupt(self, run: kernel.Run):
+        if run.pid is None:
+            return
+        os.kill(run.pid, signal.SIGKILL)
@@ -0,0 +1,47 @@
+import os
+from . import helpers
+
+def function_0(a, b=1, *args, flag=None):
+    total = a + b * 0
+    for x in args:
+        if x == 0:
+            total = total + helpers.compute(x, key="k0")
+        elif x > total:
+            total = total - x
+        else:
+            return [y for y in range(x) if y != a]
+    while total > 100:
+        total = total - 1
+    data = {"name": f"item {a}", "values": [a, b, total]}
+    assert total is not None
+    return data["values"][1:2]
+
+def function_1(a, b=1, *args, flag=None):
+    total = a + b * 1
+    for x in args:
+        if x == 1:
+            total = total + helpers.compute(x, key="k1")
+        elif x > total:
+            total = total - x
+        else:
+            return [y for y in range(x) if y != a]
+    while total > 100:
+        total = total - 2
+    data = {"name": f"item {a}", "values": [a, b, total]}
+    assert total is not None
+    return data["values"][1:2]
+
+def function_2(a, b=1, *args, flag=None):
+    total = a + b * 2
+    for x in args:
+        if x == 2:
+            total = total + helpers.compute(x, key="k2")
+        elif x > total:
+            total = total - x
+        else:
+            return [y for y in range(x) if y != a]
+    while total > 100:
+        total = total - 3
+    data = {"name": f"item {a}", "values": [a, b, total]}
+    assert total is not None
+    return data["values"][1:2]
@@ -0,0 +1,5 @@
+result_0 = f(v0 + v1 + v2 + v3 + v4 + v5 + v6 + v7 + v8 + v9, g(a.b.c[0]))
+result_1 = f(v0 + v1 + v2 + v3 + v4 + v5 + v6 + v7 + v8 + v9, g(a.b.c[1]))
+result_2 = f(v0 + v1 + v2 + v3 + v4 + v5 + v6 + v7 + v8 + v9, g(a.b.c[2]))
+result_3 = f(v0 + v1 + v2 + v3 + v4 + v5 + v6 + v7 + v8 + v9, g(a.b.c[3]))
+result_4 = f(v0 + v1 + v2 + v3 + v4 + v5 + v6 + v7 + v8 + v9, g(a.b.c[4]))
@@ -0,0 +1,53 @@
+"""
+module docstring
+"""
+
+import os
+import os.path as osp
+from collections import OrderedDict, defaultdict as dd
+from . import sibling
+
+
+GLOBAL = 1
+
+
+@decorator
+def function(a, b=2, *args, key=None):
+    "function docstring"
+    nonlocal_name = [a, b]
+    total = a + b * 3 - -a
+    for item in args:
+        if item == total and not key:
+            total = total + item
+        elif item > total or item < 0:
+            continue
+        else:
+            pass
+    while total > 100:
+        total = total - 1
+    with open("path") as f:
+        text = f.read()
+    values = {"name": f"item {a}", "values": (a, b, total)}
+    squares = [x * x for x in range(10) if x != a]
+    result = values["values"][1:2]
+    assert total is not None
+    del result[0]
+    return obj.attr.method(a, *args, key=key)
+
+
+class Example(Base):
+    attribute = "value"
+
+    def method(self):
+        def inner():
+            nonlocal self
+            yield self
+            yield from other()
+        return inner if self else None
+
+
+match command:
+    case "go":
+        pass
+    case default:
+        raise ValueError(command)
@@ -0,0 +1,53 @@
+"""
+render and code caches (cache.py)
+"""
+
+import ast
+import os
+
+from untext import cache
+from untext.rendering import mapping
+from untext.rendering.static import html, statement
+
+
+def rendered_entry(source: str) -> dict:
+    tree = ast.parse(source)
+    registry = mapping.Registry()
+    chunk = html.render(statement.render_module(tree), registry)
+    return cache.make_entry(tree, [chunk], registry)
+
+
+def test_corrupt_entry_is_a_miss(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = os.path.join(cache.cache_dir("render"), "key.json")
+    with open(path, "w") as f:
+        f.write('{"chunks": [')
+    assert cache.load("key", mapping.Registry()) is None
+    assert not os.path.exists(path)
+
+
+def test_unavailable_cache_is_a_miss(tmp_path, monkeypatch):
+    # the cache directory cannot be created under a file
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(blocker))
+    cache.store("key", rendered_entry("x = 1\n"))
+    cache.store_code("key", compile("x = 1\n", "x.py", "exec"))
+    assert cache.load("key", mapping.Registry()) is None
+    assert cache.load_code("key") is None
+
+
+# only the ids of the elements are rebased, not the text of the code
+def test_rebase_keeps_text(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    source = "\"\"\"doc id='1'\"\"\"\nx = b\"data-node='2'\"\n"
+    entry = rendered_entry(source)
+    cache.store("key", entry)
+    registry = mapping.Registry()
+    registry.reserve(100)
+    loaded = cache.load("key", registry)
+
+    tree = ast.parse(source)
+    fresh = mapping.Registry()
+    fresh.reserve(100)
+    assert loaded["chunks"] == [html.render(statement.render_module(tree), fresh)]
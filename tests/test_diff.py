@@ -0,0 +1,245 @@
+"""
+tree diff patches (rendering/static/diff.py)
+
+The patches are applied to a small simulation of the DOM (parsed from the
+rendered html, with the semantics of applyPatch() in main.py), and the
+patched document must be the fresh rendering of the new source, with the
+ids of the new registry.
+"""
+
+import ast
+import html as pyhtml
+import os
+from html.parser import HTMLParser
+
+import pytest
+
+from untext.rendering import mapping
+from untext.rendering.static import diff, html, statement
+
+
+"""
+DOM simulation
+"""
+
+class Element:
+    def __init__(self, tag: str, attrs: dict, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    def html(self, ids=True) -> str:
+        attrs = "".join(f' {key}="{value}"' for key, value in self.attrs.items() if ids or key != "id")
+        inner = []
+        for child in self.children:
+            if isinstance(child, Element):
+                inner.append(child.html(ids))
+            else:
+                inner.append(pyhtml.escape(child, quote=False))
+        return f"<{self.tag}{attrs}>{''.join(inner)}</{self.tag}>"
+
+    def classes(self) -> list:
+        return (self.attrs.get("class") or "").split()
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            if isinstance(child, Element):
+                yield from child.walk()
+
+    def by_id(self, id: int):
+        for element in self.walk():
+            if element.attrs.get("id") == str(id):
+                return element
+        raise KeyError(id)
+
+    def select(self, selector: str):
+        for element in list(self.walk())[1:]:
+            if selector[1:] in element.classes():
+                return element
+        raise KeyError(selector)
+
+    # replace self with nodes in its parent
+    def replace(self, nodes: list):
+        parent = self.parent
+        index = parent.children.index(self)
+        parent.insert(index, nodes)
+        parent.children.remove(self)
+
+    def insert(self, index: int, nodes: list):
+        for node in nodes:
+            if isinstance(node, Element):
+                node.parent = self
+        self.children[index:index] = nodes
+
+
+class Parser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("root", {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, dict(attrs), self.current)
+        self.current.children.append(element)
+        if tag != "br":
+            self.current = element
+
+    def handle_endtag(self, tag):
+        if tag != "br":
+            self.current = self.current.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse(text: str) -> Element:
+    parser = Parser()
+    parser.feed(text)
+    return parser.root
+
+
+def fragment(text: str) -> list:
+    return parse(text).children
+
+
+# like applyPatch(): the removed and replaced elements leave the document
+# first, then the new html is inserted
+def apply(root: Element, ops: list):
+    module = next(element for element in root.walk() if "module" in element.classes())
+    slots = {}
+    for op in ops:
+        if op[0] == "remove":
+            element = root.by_id(op[1])
+            element.parent.children.remove(element)
+        elif op[0] == "replace":
+            slot = Element("slot", {})
+            root.by_id(op[1]).replace([slot])
+            slots[op[1]] = slot
+    for op in ops:
+        if op[0] == "replace":
+            slots[op[1]].replace(fragment(op[2]))
+        elif op[0] == "insert":
+            if op[2] == "append":
+                module.insert(len(module.children), fragment(op[3]))
+                continue
+            anchor = root.by_id(op[1])
+            index = anchor.parent.children.index(anchor)
+            if op[2] == "after":
+                index += 1
+            anchor.parent.insert(index, fragment(op[3]))
+        elif op[0] == "text":
+            root.by_id(op[1]).select(op[2]).children = [op[3]]
+
+
+"""
+tests
+"""
+
+def render(tree: ast.Module, registry: mapping.Registry) -> str:
+    return html.render(statement.render_module(tree), registry)
+
+
+# patch the rendering of old_source into new_source, and compare with a fresh rendering
+def check_patch(old_source: str, new_source: str) -> list:
+    registry = mapping.Registry()
+    old = ast.parse(old_source)
+    document = parse(render(old, registry))
+    new = ast.parse(new_source)
+    new_registry, ops = diff.patch(registry, old, new)
+    apply(document, ops)
+
+    fresh = parse(render(new, mapping.Registry()))
+    assert document.html(ids=False) == fresh.html(ids=False)
+    # the ids of the document are the ids of the new registry, once each
+    ids = [element.attrs["id"] for element in document.walk() if "id" in element.attrs]
+    assert len(ids) == len(set(ids))
+    registered = {str(id) for id in new_registry.ids.values()}
+    registered.update([str(id) for id in new_registry.toplevel_ids.values()])
+    assert set(ids) == registered
+    return ops
+
+
+# statements without their own element (augmented assignments, expression
+# statements of comparisons, unary operations and dicts) cannot anchor an
+# insertion
+@pytest.mark.parametrize("old_source, new_source", [
+    ("def f(a):\n    x = 1\n    x += 1\n    return x\n",
+     "def f(a):\n    x = 1\n    x += 1\n    y = 2\n    return x\n"),
+    ("def f(a):\n    x = 1\n    a < x\n",
+     "def f(a):\n    x = 1\n    a < x\n    y = 2\n"),
+    ("def f(a):\n    x = 1\n    -a\n    {a: x}\n    return x\n",
+     "def f(a):\n    x = 1\n    -a\n    {a: x}\n    y = 2\n    return x\n"),
+    ("def f(a):\n    x += 1\n",
+     "def f(a):\n    y = 2\n    x += 1\n"),
+    ("def f(a):\n    a < x\n",
+     "def f(a):\n    a < x\n    y = 2\n"),
+    # the element of a replaced statement is rendered again, maybe without an id
+    ("def f(a):\n    x = 1\n",
+     "def f(a):\n    x += 1\n    y = 2\n"),
+    ("def f(a):\n    g(a)\n",
+     "def f(a):\n    a < 1\n    y = 2\n"),
+])
+def test_insert_after_statement_without_element(old_source, new_source):
+    check_patch(old_source, new_source)
+
+
+@pytest.mark.parametrize("old_source, new_source", [
+    ("x = 1\n", "x = 2\n"),
+    ("x = a\n", "x = b\n"),
+    ("x = 'a'\n", "x = 'b'\n"),
+    ("def f(a):\n    return a\n", "def g(a):\n    return a\n"),
+    ("def f(a):\n    return a\n", "def f(a, b=2):\n    return a\n"),
+    ("def f(a):\n    x = 1\n    return a\n", "def f(a):\n    x = 1\n    print(x)\n    return a\n"),
+    ("def f(a):\n    x = 1\n    return a\n", "def f(a):\n    return a\n"),
+    ("x = 1\n", "import os\nx = 1\ny = 2\n"),
+    ("", "x = 1\n"),
+    ("x = 1\n", ""),
+    ('"""doc"""\nx = 1\n', '"""doc2"""\nx = 1\n'),
+    ("f(1)\ng(2)\n", "g(2)\nf(1)\n"),
+    ("def f():\n    f(1)\n    x = 2\n", "def f():\n    x = 3\n    f(1)\n"),
+    ("if a:\n    b\nelif c:\n    d\nelse:\n    e\n", "if a:\n    b\nelse:\n    e\n"),
+    ("if a:\n    b\n", "if a:\n    b\nelse:\n    c\n"),
+    ("try:\n    a\nexcept E as e:\n    b\n", "try:\n    a\nexcept E as e:\n    b\n    c\nfinally:\n    d\n"),
+])
+def test_patch(old_source, new_source):
+    check_patch(old_source, new_source)
+
+
+MATCH = 'match command:\n    case "go":\n        pass\n    case default:\n        raise ValueError(command)\n'
+
+@pytest.mark.parametrize("old_source, new_source", [
+    (MATCH, MATCH.replace('"go"', '"stop"')),
+    (MATCH, MATCH.replace("pass", "x = 1")),
+    (MATCH, MATCH.replace("command:", "command :", 1)),
+    (MATCH, "x = 1\n" + MATCH),
+])
+def test_patch_match(old_source, new_source):
+    check_patch(old_source, new_source)
+
+
+# a whitespace-only edit keeps every node
+def test_patch_golden_whitespace():
+    with open(os.path.join(os.path.dirname(__file__), "golden", "sample.py"), encoding="utf-8") as f:
+        source = f.read()
+    assert check_patch(source, source.replace("\n\n", "\n\n\n")) == []
+
+
+# a body not displayed yet is rendered from the new tree when it is
+def test_lazy_body_is_not_patched():
+    old_source = "def f(a):\n    x += 1\n"
+    new_source = "def f(a):\n    x += 2\n"
+    registry = mapping.Registry()
+    old = ast.parse(old_source)
+    with html.render_settings(lazy_bodies=True):
+        render(old, registry)
+        new_registry, ops = diff.patch(registry, old, ast.parse(new_source))
+    assert ops == []
+
+
+def test_small_edit_is_a_text_update():
+    old_source = "def f(a):\n    total = a + 1\n    return total\n" * 20
+    new_source = old_source.replace("a + 1", "a + 2", 1)
+    ops = check_patch(old_source, new_source)
+    assert [op[0] for op in ops] == ["text"]
@@ -0,0 +1,28 @@
+"""
+REPL sessions (repl.py)
+"""
+
+from untext import repl
+
+
+def run_lines(lines: list) -> str:
+    outputs = []
+    session = repl.Session({}, lambda text, prompt: outputs.append(text), interval=0.01)
+    for line in lines:
+        session.push(line)
+    session.close()
+    session.worker.join(5)
+    assert not session.worker.is_alive()
+    return "".join(outputs)
+
+
+def test_lines():
+    assert "42" in run_lines(["x = 40", "print(x + 2)"])
+
+
+# runcode() raises SystemExit again: the session must go on
+def test_exit_does_not_stop_the_session():
+    text = run_lines(["raise SystemExit", "import sys", "sys.exit(3)", "print('still running')"])
+    assert "SystemExit" in text
+    assert "SystemExit: 3" in text
+    assert "still running" in text
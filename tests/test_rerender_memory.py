@@ -0,0 +1,80 @@
+"""
+memory of repeated re-renderings (like CodeWindow.rerender())
+
+Each re-rendering patches the DOM with a new registry (see
+rendering/static/diff.py), and the previous tree is released with its
+registry: the registry size and the memory must stay flat.
+(benchmarks/rerender_memory.py runs the same check on bigger modules)
+"""
+
+import ast
+import gc
+import tracemalloc
+
+from untext import hashes
+from untext.rendering import mapping
+from untext.rendering.static import diff, html, statement
+
+
+ITERATIONS = 1000
+# a module of about 180 lines (800 registered nodes): a node leaked by
+# each re-rendering would grow the memory by megabytes, and each patch
+# stays fast enough for 1000 of them (bigger modules: see the benchmark)
+FUNCTIONS = 25
+# allowed growth of the traced memory between the warm-up and the end
+# (less than one object per re-rendering)
+MAX_GROWTH = 64 * 1024
+
+
+def module(functions: int) -> str:
+    parts = ["import os\n"]
+    for i in range(functions):
+        parts.append(f'''
+def function_{i}(a, b=1):
+    total = a + b * {i}
+    for x in range(total):
+        if x == {i}:
+            total = total + os.getpid()
+    return [total, a, b]
+''')
+    return "".join(parts)
+
+
+# the source of the module, with an edited function
+def edit(source: str, iteration: int) -> str:
+    i = iteration % FUNCTIONS
+    return source.replace(f"total = a + b * {i}\n", f"total = a + b * {i} + {iteration}\n", 1)
+
+
+def traced_memory() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def test_rerender_memory_is_flat():
+    source = module(FUNCTIONS)
+    registry = mapping.Registry()
+    tree = ast.parse(source)
+    html.render(statement.render_module(tree), registry)
+    # the hashes of the new tree are the old hashes of the next patch
+    # (like CodeWindow.node_hashes)
+    node_hashes = hashes.compute(tree)
+
+    tracemalloc.start()
+    try:
+        for iteration in range(ITERATIONS):
+            new_tree = ast.parse(edit(source, iteration))
+            new_hashes = hashes.compute(new_tree)
+            registry, patch = diff.patch(registry, tree, new_tree, node_hashes, new_hashes)
+            tree, node_hashes = new_tree, new_hashes
+            del patch, new_tree, new_hashes
+            # the first iterations warm up caches (ast, html tags,...)
+            if iteration == 10:
+                baseline = traced_memory()
+                baseline_nodes = len(registry)
+        growth = traced_memory() - baseline
+    finally:
+        tracemalloc.stop()
+
+    assert len(registry) == baseline_nodes
+    assert growth < MAX_GROWTH
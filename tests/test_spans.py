@@ -0,0 +1,49 @@
+"""
+source spans (spans.py)
+"""
+
+import ast
+
+import pytest
+
+from untext.nodetable import NodeTable
+from untext.rendering import mapping
+from untext.rendering.static import html, statement
+from untext.spans import LineTable, SpanIndex
+
+
+SOURCE = "x = 1\ndef f(a):\n    return a\ny = 2"
+
+
+@pytest.fixture
+def index() -> SpanIndex:
+    tree = ast.parse(SOURCE)
+    registry = mapping.Registry()
+    html.render(statement.render_module(tree), registry)
+    return SpanIndex(NodeTable(tree, registry), LineTable(SOURCE))
+
+
+def test_first_and_last_lines(index):
+    first = index.statement_element(1)
+    last = index.statement_element(4)
+    assert first and last and first != last
+    assert index.source(first) == "x = 1"
+    assert index.source(last) == "y = 2"
+
+
+# line numbers start at 1: 0 is not the last line
+@pytest.mark.parametrize("lineno", [0, -1, 5, 100])
+def test_lines_out_of_the_file(index, lineno):
+    assert index.statement_element(lineno) == 0
+    assert index.element_at(lineno, 0) == 0
+    assert index.at(lineno, 0) == []
+
+
+def test_line_table():
+    lines = LineTable(SOURCE)
+    assert len(lines) == 4
+    assert lines.line(4) == (len(SOURCE) - 5, len(SOURCE))
+    with pytest.raises(IndexError):
+        lines.line(0)
+    with pytest.raises(IndexError):
+        lines.offset(5, 0)
@@ -0,0 +1,46 @@
+"""
+html backends (rendering/static/html.py)
+
+The golden files (tests/golden/<name>.html) are the renderings of
+tests/golden/<name>.py by the generator-based renderer that html.write()
+replaced (before the fragment trees): both backends must still produce
+exactly the same html.
+(except the match patterns of sample.py: that renderer gave them two
+nested ids, see render_pattern())
+
+Regenerate them only for intended changes of the html.
+"""
+
+import ast
+import os
+
+import pytest
+
+from untext.rendering import mapping
+from untext.rendering.static import html, statement
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+NAMES = sorted(name[:-3] for name in os.listdir(GOLDEN_DIR) if name.endswith(".py"))
+
+
+def golden(name: str) -> tuple:
+    with open(os.path.join(GOLDEN_DIR, f"{name}.py"), encoding="utf-8") as f:
+        source = f.read()
+    with open(os.path.join(GOLDEN_DIR, f"{name}.html"), encoding="utf-8") as f:
+        expected = f.read()
+    return source, expected
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_write(name):
+    source, expected = golden(name)
+    fragment = statement.render_module(ast.parse(source))
+    assert html.render(fragment, mapping.Registry()) == expected
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_generate(name):
+    source, expected = golden(name)
+    fragment = statement.render_module(ast.parse(source))
+    assert "".join(html.generate(fragment, mapping.Registry())) == expected